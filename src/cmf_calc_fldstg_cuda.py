@@ -35,7 +35,11 @@ def _fortran_passed_flood_levels(psto_f, fldstomax_f, nlfp):
 def CMF_CALC_FLDSTG_CUDA(CM_NMLIST, CC_NMLIST, CC_VARS, device, Datatype):
     if torch.device(device).type != "cuda":
         raise RuntimeError("CMF_CALC_FLDSTG_CUDA requires a CUDA device.")
+    return CMF_CALC_FLDSTG_TORCH(CM_NMLIST, CC_NMLIST, CC_VARS, device, Datatype)
 
+
+def CMF_CALC_FLDSTG_TORCH(CM_NMLIST, CC_NMLIST, CC_VARS, device, Datatype):
+    """Tensor body of the CUDA backend; device-agnostic, so it can be checked against the CPU kernel."""
     nseq = int(CM_NMLIST.NSEQALL)
     nlfp = int(CC_NMLIST.NLFP)
 
@@ -66,6 +70,13 @@ def CMF_CALC_FLDSTG_CUDA(CM_NMLIST, CC_NMLIST, CC_VARS, device, Datatype):
     bankfull_threshold = rivstomax.to(dtype=pstoall.dtype, device=pstoall.device)
     has_flood = pstoall > bankfull_threshold
     no_flood = ~has_flood
+    if CC_NMLIST.RSTGTOL > 0.0:
+        # !! incremental: only cells whose storage moved by more than RSTGTOL since their last evaluation
+        stgref = CC_VARS.D2STGREF.raw()[:nseq, 0]
+        changed = torch.abs(pstoall - stgref) > CC_NMLIST.RSTGTOL * stgref
+        has_flood &= changed
+        no_flood &= changed
+        stgref[changed] = pstoall[changed]
 
     rivsto[no_flood] = pstoall[no_flood]
     fldsto[no_flood] = zero_d
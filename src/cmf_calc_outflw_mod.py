@@ -11,6 +11,7 @@ Licensed under the Apache License, Version 2.0.
 !* CONTAINS:
 ! -- CMF_CALC_OUTFLW
 ! -- CMF_CALC_INFLOW
+! -- CMF_CALC_INFLOW_GATHER : scatter-free, fixed-order inflow (CINFLOW = "gather" / "csr")
 ! --
 """
 import  os
@@ -20,181 +21,370 @@ import torch
 from fortran_tensor_3D import Ftensor_3D
 from fortran_tensor_2D import Ftensor_2D
 from fortran_tensor_1D import Ftensor_1D
+from cmf_calc_fldstg_cpu import _require_contiguous_cpu_numpy
+from cmf_topology_utils import build_gather_matrix_torch, build_gather_slots_torch
+from cmf_calc_pthout_mod import CMF_PTH_ENGINE
+
+try:
+    import numba
+except Exception:  # pragma: no cover - handled explicitly at runtime.
+    numba = None
 
 os.environ['PYTHONWARNINGS']='ignore::FutureWarning'
 os.environ['PYTHONWARNINGS']='ignore::RuntimeWarning'
 
 
-def CMF_CALC_OUTFLW_CPU(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
-    """
-    To compute river (D2RIVOUT) and floodplain (D2FLDOUT) discharge based on water surface slope, storage,
-    and physical river/floodplain properties.
-    """
-    #   1. Preprocessing Water Surface Elevation
-    CC_VARS.D2SFCELV[:CM_NMLIST.NSEQALL + 1, 1] \
-                                        =           CM_NMLIST.D2RIVELV[:CM_NMLIST.NSEQALL + 1, 1] + CC_VARS.D2RIVDPH[:CM_NMLIST.NSEQALL + 1, 1]
-    #   !! water surface elevation (t-1) [m]
-    CC_VARS.D2SFCELV_PRE[:CM_NMLIST.NSEQALL + 1, 1]\
-                                        =           CM_NMLIST.D2RIVELV[:CM_NMLIST.NSEQALL + 1, 1] + CC_VARS.D2RIVDPH_PRE[:CM_NMLIST.NSEQALL + 1, 1]
-    #   !! floodplain depth (t-1)        [m]
-    CC_VARS.D2FLDDPH_PRE[:CM_NMLIST.NSEQALL + 1, 1] \
-                                        =           torch.maximum(CC_VARS.D2RIVDPH_PRE[:CM_NMLIST.NSEQALL + 1, 1] - CM_NMLIST.D2RIVHGT[:CM_NMLIST.NSEQALL + 1, 1],
-                                                              torch.tensor(0.0, dtype=Datatype.JPRB, device=device))
-    #   2. Loop Over River Cells
-        # !Update downstream elevation
-    RC_Index                            =           torch.arange(1, CM_NMLIST.NSEQRIV + 1,device=device)
-    JSEQ                                =           CM_NMLIST.I1NEXT[RC_Index]      # ! next cell's pixel
-    CM_NMLIST.D2DWNELV[RC_Index,1]      =           CC_VARS.D2SFCELV[JSEQ,1]
-    CC_VARS.D2DWNELV_PRE[RC_Index,1]    =           CC_VARS.D2SFCELV_PRE[JSEQ,1]
-
-    #   !! for normal cells
-    DSFC                                =           torch.maximum(CC_VARS.D2SFCELV[RC_Index, 1],    CM_NMLIST.D2DWNELV[RC_Index, 1])
-    DSLP                                =           ((CC_VARS.D2SFCELV[RC_Index, 1] - CM_NMLIST.D2DWNELV[RC_Index, 1]) *
-                                                     CM_NMLIST.D2NXTDST[RC_Index, 1] ** (-1))
-    #   !=== River Flow ===
-    DFLW                                =           DSFC    -   CM_NMLIST.D2RIVELV[RC_Index, 1]             #   !!  flow cross-section depth
-    DARE                                =           torch.maximum(CM_NMLIST.D2RIVWTH[RC_Index, 1] * DFLW,   #   !!  flow cross-section area
-                                                                  torch.tensor(1e-10,dtype=Datatype.JPRB,device=device))
-
-    DSFC_pr                             =           torch.maximum(CC_VARS.D2SFCELV_PRE[RC_Index, 1],    CC_VARS.D2DWNELV_PRE[RC_Index, 1])
-    DFLW_pr                             =           DSFC_pr   -   CM_NMLIST.D2RIVELV[RC_Index, 1]
-    DFLW_im                             =           torch.maximum((DFLW * DFLW_pr) ** 0.5,
-                                                                  torch.tensor(1e-6,dtype=Datatype.JPRB,device=device))     #   !! semi implicit flow depth
-
-    DOUT_pr                             =           CC_VARS.D2RIVOUT_PRE[RC_Index,1] * CM_NMLIST.D2RIVWTH[RC_Index, 1] ** (-1)  #   !! outflow (t-1) [m2/s] (unit width)
-    DOUT                                =           (CM_NMLIST.D2RIVWTH[RC_Index, 1] * (DOUT_pr + CC_NMLIST.PGRV * CC_NMLIST.DT * DFLW_im * DSLP) *
-                                                     (1 + CC_NMLIST.PGRV * CC_NMLIST.DT * CM_NMLIST.D2RIVMAN[RC_Index, 1] ** 2 * torch.abs(DOUT_pr) *
-                                                     DFLW_im ** (-7/3)) ** (-1))
-    DVEL                                =           CC_VARS.D2RIVOUT[RC_Index,1] * DARE ** (-1)
-
-
-    Mask                                =           (DFLW_im > 1e-5) & (DARE > 1e-5)
-    CC_VARS.D2RIVOUT[RC_Index, 1]       =           torch.where(Mask, DOUT, torch.tensor(0.0, dtype=Datatype.JPRB, device=device))
-    CC_VARS.D2RIVVEL[RC_Index, 1]       =           torch.where(Mask, DVEL, torch.tensor(0.0, dtype=Datatype.JPRB, device=device))
-
-    #!=== Floodplain Flow ===
-    if CC_NMLIST.LFLDOUT:
-        DFSTO                           =           CC_VARS.P2FLDSTO[RC_Index,1]
-        DSFC                            =           torch.maximum(CC_VARS.D2SFCELV[RC_Index, 1], CM_NMLIST.D2DWNELV[RC_Index, 1])
-        DSLP                            =           ((CC_VARS.D2SFCELV[RC_Index, 1] - CM_NMLIST.D2DWNELV[RC_Index, 1]) *
-                                                     CM_NMLIST.D2NXTDST[RC_Index, 1] ** (-1))
-        DSLP                            =           torch.maximum(-torch.tensor(0.005,dtype=Datatype.JPRB,device=device),
-                                                    torch.minimum( torch.tensor(0.005,dtype=Datatype.JPRB,device=device), DSLP))    #   !! set max&min [instead of using weir equation for efficiency]
-
-
-        DFLW                            =           torch.maximum(DSFC - CM_NMLIST.D2ELEVTN[RC_Index, 1],
-                                                                  torch.tensor(0,dtype=Datatype.JPRB,device=device))
-        DARE                            =           DFSTO * CM_NMLIST.D2RIVLEN[RC_Index,1] ** (-1)
-        DARE                            =           torch.maximum(DARE -  CC_VARS.D2FLDDPH[RC_Index,1] * CM_NMLIST.D2RIVWTH[RC_Index,1],
-                                                                  torch.tensor(0.0, dtype=Datatype.JPRB, device=device))    #   !! remove above river channel area
-
+if numba is not None:
+    @numba.njit(cache=True, fastmath=False)
+    def _outflw_pre_cell_numba(i, rivelv, rivhgt, rivdph, rivdph_pre, sfcelv, sfcelv_pre, flddph_pre):
+        sfcelv[i, 0] = rivelv[i, 0] + rivdph[i, 0]
+        sfcelv_pre[i, 0] = rivelv[i, 0] + rivdph_pre[i, 0]
+        flddph_pre[i, 0] = max(rivdph_pre[i, 0] - rivhgt[i, 0], 0.0)
+
+    @numba.njit(cache=True, fastmath=False)
+    def _outflw_cell_numba(
+        i, nriv, next0,
+        rivelv, rivwth, rivman, rivlen, elevtn, nxtdst, dwnelv,
+        rivdph, rivdph_pre, sfcelv, sfcelv_pre, flddph, flddph_pre, dwnelv_pre,
+        rivout, fldout, rivout_pre, fldout_pre, rivvel,
+        fldsto, fldsto_pre, storge,
+        dt, gdt, pmanfld, pdstmth, lfldout,
+    ):
+        dsfc = 0.0
+        dsfc_pr = 0.0
+        if i < nriv:
+            j = next0[i]
+            dwnelv[i, 0] = sfcelv[j, 0]
+            dwnelv_pre[i, 0] = sfcelv_pre[j, 0]
+            dsfc = max(sfcelv[i, 0], dwnelv[i, 0])
+            dslp = (sfcelv[i, 0] - dwnelv[i, 0]) * (1.0 / nxtdst[i, 0])
+            dflw = dsfc - rivelv[i, 0]
+            dsfc_pr = max(sfcelv_pre[i, 0], dwnelv_pre[i, 0])
+            dflw_pr = dsfc_pr - rivelv[i, 0]
+        else:                                                   # !=== river mouth flow ===
+            dslp = (sfcelv[i, 0] - dwnelv[i, 0]) * (1.0 / pdstmth)
+            dflw = rivdph[i, 0]
+            dflw_pr = rivdph_pre[i, 0]
+
+        # !=== River Flow ===
+        dare = max(rivwth[i, 0] * dflw, 1.0e-10)               # !! flow cross-section area
+        dflw_im = np.sqrt(dflw * dflw_pr)                       # !! semi implicit flow depth (NaN kept as in torch)
+        if dflw_im < 1.0e-6:
+            dflw_im = 1.0e-6
+        dvel = rivout[i, 0] / dare
+        if dflw_im > 1.0e-5 and dare > 1.0e-5:
+            dout_pr = rivout_pre[i, 0] / rivwth[i, 0]           # !! outflow (t-1) [m2/s] (unit width)
+            rivout[i, 0] = (
+                rivwth[i, 0] * (dout_pr + gdt * dflw_im * dslp)
+                / (1.0 + gdt * rivman[i, 0] ** 2 * abs(dout_pr) * dflw_im ** (-7.0 / 3.0))
+            )
+            rivvel[i, 0] = dvel
+        else:
+            rivout[i, 0] = 0.0
+            rivvel[i, 0] = 0.0
+
+        # !=== Floodplain Flow ===
+        if lfldout:
+            dslp = min(max(dslp, -0.005), 0.005)                # !! set max&min [instead of using weir equation for efficiency]
+            if i < nriv:
+                dflw = max(dsfc - elevtn[i, 0], 0.0)
+                dflw_pr = dsfc_pr - elevtn[i, 0]
+            else:
+                dflw = sfcelv[i, 0] - elevtn[i, 0]
+                dflw_pr = sfcelv_pre[i, 0] - elevtn[i, 0]
+            dare = max(fldsto[i, 0] / rivlen[i, 0] - flddph[i, 0] * rivwth[i, 0], 0.0)     # !! remove above river channel area
+            dflw_im = max(np.sqrt(max(dflw * dflw_pr, 0.0)), 1.0e-6)
+            dare_pr = max(fldsto_pre[i, 0] / rivlen[i, 0] - flddph_pre[i, 0] * rivwth[i, 0], 1.0e-6)
+            dare_im = max(np.sqrt(dare * dare_pr), 1.0e-6)
+            dout = 0.0
+            if dflw_im > 1.0e-5 and dare > 1.0e-5:              # !! replace small depth location with zero
+                dout_pr = fldout_pre[i, 0]
+                dout = (
+                    (dout_pr + gdt * dare_im * dslp)
+                    / (1.0 + gdt * pmanfld ** 2 * abs(dout_pr) * dflw_im ** (-4.0 / 3.0) / dare_im)
+                )
+            if dout * rivout[i, 0] > 0.0:                       # !! river and floodplain different direction
+                fldout[i, 0] = dout
+            else:
+                fldout[i, 0] = 0.0
+
+        # !! Storage change limiter to prevent sudden increase of upstream water level during backward flow (v4.23)
+        if i < nriv:
+            dout = max((-rivout[i, 0] - fldout[i, 0]) * dt, 1.0e-10)
+            rate = min(0.05 * storge[i, 0] / dout, 1.0)
+            rivout[i, 0] = rivout[i, 0] * rate
+            fldout[i, 0] = fldout[i, 0] * rate
+
+    @numba.njit(cache=True, fastmath=False, parallel=True)
+    def outflw_numba_cpu(
+        nseq, nriv, next0,
+        rivelv, rivwth, rivhgt, rivman, rivlen, elevtn, nxtdst, dwnelv,
+        rivdph, rivdph_pre, sfcelv, sfcelv_pre, flddph, flddph_pre, dwnelv_pre,
+        rivout, fldout, rivout_pre, fldout_pre, rivvel,
+        fldsto, fldsto_pre, storge,
+        dt, pgrv, pmanfld, pdstmth, lfldout,
+    ):
+        """
+        Per-cell OUTFLW: river, floodplain and mouth discharge plus the v4.23 limiter.
+        Arrays are 0-based (NSEQMAX, 1) views; next0 holds 0-based downstream IDs.
+        """
+        for i in numba.prange(nseq):
+            _outflw_pre_cell_numba(i, rivelv, rivhgt, rivdph, rivdph_pre, sfcelv, sfcelv_pre, flddph_pre)
+
+        gdt = pgrv * dt
+        for i in numba.prange(nseq):
+            _outflw_cell_numba(
+                i, nriv, next0,
+                rivelv, rivwth, rivman, rivlen, elevtn, nxtdst, dwnelv,
+                rivdph, rivdph_pre, sfcelv, sfcelv_pre, flddph, flddph_pre, dwnelv_pre,
+                rivout, fldout, rivout_pre, fldout_pre, rivvel,
+                fldsto, fldsto_pre, storge,
+                dt, gdt, pmanfld, pdstmth, lfldout,
+            )
 
-        DSFC_pr                         =           torch.maximum(CC_VARS.D2SFCELV_PRE[RC_Index, 1], CC_VARS.D2DWNELV_PRE[RC_Index, 1])
-        DFLW_pr                         =           DSFC_pr -  CM_NMLIST.D2ELEVTN[RC_Index, 1]
-        DFLW_im                         =           torch.maximum(
-                                                        torch.maximum(  (DFLW * DFLW_pr),   torch.tensor(0, dtype=Datatype.JPRB, device=device)) ** 0.5,
-                                                        torch.tensor(1e-6, dtype=Datatype.JPRB, device=device))
+    @numba.njit(cache=True, fastmath=False, parallel=True)
+    def outflw_chunks_numba_cpu(
+        cells, cell_ptr, nriv, next0,
+        rivelv, rivwth, rivhgt, rivman, rivlen, elevtn, nxtdst, dwnelv,
+        rivdph, rivdph_pre, sfcelv, sfcelv_pre, flddph, flddph_pre, dwnelv_pre,
+        rivout, fldout, rivout_pre, fldout_pre, rivvel,
+        fldsto, fldsto_pre, storge,
+        dt, pgrv, pmanfld, pdstmth, lfldout,
+    ):
+        """
+        OUTFLW on a subset of cells given as chunks of whole basins (cells[cell_ptr[c]:cell_ptr[c+1]]).
+        Downstream cells are in the same chunk, so each chunk runs its surface pass then its flow pass.
+        """
+        gdt = pgrv * dt
+        for c in numba.prange(cell_ptr.shape[0] - 1):
+            for ii in range(cell_ptr[c], cell_ptr[c + 1]):
+                _outflw_pre_cell_numba(cells[ii], rivelv, rivhgt, rivdph, rivdph_pre, sfcelv, sfcelv_pre, flddph_pre)
+            for ii in range(cell_ptr[c], cell_ptr[c + 1]):
+                _outflw_cell_numba(
+                    cells[ii], nriv, next0,
+                    rivelv, rivwth, rivman, rivlen, elevtn, nxtdst, dwnelv,
+                    rivdph, rivdph_pre, sfcelv, sfcelv_pre, flddph, flddph_pre, dwnelv_pre,
+                    rivout, fldout, rivout_pre, fldout_pre, rivvel,
+                    fldsto, fldsto_pre, storge,
+                    dt, gdt, pmanfld, pdstmth, lfldout,
+                )
+else:
+    outflw_numba_cpu = None
+    outflw_chunks_numba_cpu = None
+
+
+def _get_outflw_cpu_cache(CC_NMLIST, CM_NMLIST, CC_VARS, device):
+    if torch.device(device).type != "cpu":
+        raise RuntimeError("CMF_CALC_OUTFLW_CPU requires a CPU device.")
 
+    nseq = int(CM_NMLIST.NSEQALL)
+    nriv = int(CM_NMLIST.NSEQRIV)
+    key = (
+        id(CM_NMLIST),
+        nriv,
+        nseq,
+        bool(getattr(CC_NMLIST, "LFLDOUT", False)),
+        bool(getattr(CC_NMLIST, "LSLOPEMOUTH", False)),
+    )
+    cache = getattr(CC_NMLIST, "_OUTFLW_CPU_CACHE", None)
+    if cache is not None and cache.get("key") == key:
+        return cache
 
-        DARE_pr                         =           CC_VARS.D2FLDSTO_PRE[RC_Index, 1] * CM_NMLIST.D2RIVLEN[RC_Index,1] ** (-1)
-        DARE_pr                         =           torch.maximum(  DARE_pr -  CC_VARS.D2FLDDPH_PRE[RC_Index, 1] * CM_NMLIST.D2RIVWTH[RC_Index,1]
-                                                                    ,torch.tensor(1e-6, dtype=Datatype.JPRB, device=device) )       #   !! remove above river channel area
-        DARE_im                         =           torch.maximum( (DARE * DARE_pr) ** 0.5,   torch.tensor(1e-6, dtype=Datatype.JPRB, device=device) )
+    next0 = np.ascontiguousarray(CM_NMLIST.I1NEXT.raw()[:nriv].detach().cpu().numpy().astype(np.int64) - 1)
 
+    cache = {
+        "key": key,
+        "nseq": nseq,
+        "nriv": nriv,
+        "next0": next0,
+        "next0_t": torch.from_numpy(next0),
+        "all_next_valid": bool(np.all((next0 >= 0) & (next0 < nseq))),
+        "rivelv": CM_NMLIST.D2RIVELV.raw()[:nseq, 0],
+        "rivwth": CM_NMLIST.D2RIVWTH.raw()[:nseq, 0],
+        "rivhgt": CM_NMLIST.D2RIVHGT.raw()[:nseq, 0],
+        "rivman": CM_NMLIST.D2RIVMAN.raw()[:nseq, 0],
+        "rivlen": CM_NMLIST.D2RIVLEN.raw()[:nseq, 0],
+        "elevtn": CM_NMLIST.D2ELEVTN.raw()[:nseq, 0],
+        "nxtdst": CM_NMLIST.D2NXTDST.raw()[:nseq, 0],
+        "param_views": None,
+        "state_key": None,
+        "state_views": None,
+    }
+    CC_NMLIST._OUTFLW_CPU_CACHE = cache
+    return cache
 
-        DOUT_pr                         =           CC_VARS.D2FLDOUT_PRE [RC_Index, 1]
-        DOUT                            =           ((DOUT_pr + CC_NMLIST.PGRV * CC_NMLIST.DT * DARE_im * DSLP) *
-                                                     (1 + CC_NMLIST.PGRV * CC_NMLIST.DT * CC_NMLIST.PMANFLD ** 2 *
-                                                      torch.abs(DOUT_pr) * DFLW_im ** (-4 / 3) * DARE_im ** (-1))
-                                                     ** (-1))
 
-        Mask                            =           (DFLW_im > 1e-5) & (DARE > 1e-5)    #   !! replace small depth location with zero
-        CC_VARS.D2FLDOUT[RC_Index, 1]   =           torch.where(Mask, DOUT, torch.tensor(0.0, dtype=Datatype.JPRB, device=device))
+def _outflw_cpu_rivflw(ws, tag, dtype, gdt, dslp, dflw, dflw_pr, rivwth, rivman, rivout, rivout_pre, rivvel):
+    """
+    ! river momentum equation on one cell range (rivers or mouths); results go straight into rivout / rivvel
+    """
+    n = dslp.numel()
+    eps_area = ws.const(1e-10, dtype)
+    eps_depth = ws.const(1e-6, dtype)
+    t = ws.buffer(f"outflw_{tag}_t", n, dtype)
+    t2 = ws.buffer(f"outflw_{tag}_t2", n, dtype)
+
+    dare = torch.mul(rivwth, dflw, out=ws.buffer(f"outflw_{tag}_dare", n, dtype))
+    torch.maximum(dare, eps_area, out=dare)                                 #   !!  flow cross-section area
+    dflw_im = torch.mul(dflw, dflw_pr, out=ws.buffer(f"outflw_{tag}_dflw_im", n, dtype)).pow_(0.5)
+    torch.maximum(dflw_im, eps_depth, out=dflw_im)                          #   !! semi implicit flow depth
+    dout_pr = torch.mul(rivout_pre, torch.pow(rivwth, -1, out=t),
+                        out=ws.buffer(f"outflw_{tag}_dout_pr", n, dtype))   #   !! outflow (t-1) [m2/s] (unit width)
+    dout = torch.mul(dflw_im, gdt, out=ws.buffer(f"outflw_{tag}_dout", n, dtype)).mul_(dslp).add_(dout_pr).mul_(rivwth)
+    torch.pow(rivman, 2, out=t).mul_(gdt).mul_(torch.abs(dout_pr, out=t2))
+    t.mul_(torch.pow(dflw_im, -7/3, out=t2)).add_(1).pow_(-1)
+    dout.mul_(t)
+    dvel = torch.mul(rivout, torch.pow(dare, -1, out=t), out=ws.buffer(f"outflw_{tag}_dvel", n, dtype))
+
+    mask = torch.gt(dflw_im, 1e-5, out=ws.buffer(f"outflw_{tag}_mask", n, torch.bool))
+    mask.logical_and_(torch.gt(dare, 1e-5, out=ws.buffer(f"outflw_{tag}_mask2", n, torch.bool)))
+    torch.where(mask, dout, ws.const(0.0, dtype), out=rivout)
+    torch.where(mask, dvel, ws.const(0.0, dtype), out=rivvel)
+
+
+def _outflw_cpu_fldflw(ws, tag, dtype, gdt, pmanfld, dslp, dflw, dflw_pr,
+                       fldsto, fldsto_pre, flddph, flddph_pre, rivlen, rivwth, rivout, fldout, fldout_pre):
+    """
+    ! floodplain momentum equation on one cell range (rivers or mouths); dslp is clamped in place
+    """
+    n = dslp.numel()
+    zero = ws.const(0.0, dtype)
+    eps_depth = ws.const(1e-6, dtype)
+    t = ws.buffer(f"outflw_{tag}_t", n, dtype)
+    t2 = ws.buffer(f"outflw_{tag}_t2", n, dtype)
+
+    torch.minimum(dslp, ws.const(0.005, dtype), out=dslp)
+    torch.maximum(dslp, ws.const(-0.005, dtype), out=dslp)                  #   !! set max&min [instead of using weir equation for efficiency]
+    dare = torch.mul(fldsto, torch.pow(rivlen, -1, out=t), out=ws.buffer(f"outflw_{tag}_dare", n, dtype))
+    dare.sub_(torch.mul(flddph, rivwth, out=t2))
+    torch.maximum(dare, zero, out=dare)                                     #   !! remove above river channel area
+    dflw_im = torch.mul(dflw, dflw_pr, out=ws.buffer(f"outflw_{tag}_dflw_im", n, dtype))
+    torch.maximum(dflw_im, zero, out=dflw_im).pow_(0.5)
+    torch.maximum(dflw_im, eps_depth, out=dflw_im)
+    dare_im = torch.mul(fldsto_pre, torch.pow(rivlen, -1, out=t), out=ws.buffer(f"outflw_{tag}_dare_im", n, dtype))
+    dare_im.sub_(torch.mul(flddph_pre, rivwth, out=t2))
+    torch.maximum(dare_im, eps_depth, out=dare_im)                          #   !! DARE_pr (above river channel removed)
+    dare_im.mul_(dare).pow_(0.5)
+    torch.maximum(dare_im, eps_depth, out=dare_im)
+    dout = torch.mul(dare_im, gdt, out=ws.buffer(f"outflw_{tag}_dout", n, dtype)).mul_(dslp).add_(fldout_pre)
+    torch.abs(fldout_pre, out=t).mul_(gdt * pmanfld ** 2).mul_(torch.pow(dflw_im, -4 / 3, out=t2))
+    t.mul_(torch.pow(dare_im, -1, out=t2)).add_(1).pow_(-1)
+    dout.mul_(t)
+
+    mask = torch.gt(dflw_im, 1e-5, out=ws.buffer(f"outflw_{tag}_mask", n, torch.bool))
+    mask.logical_and_(torch.gt(dare, 1e-5, out=ws.buffer(f"outflw_{tag}_mask2", n, torch.bool)))
+    torch.where(mask, dout, zero, out=dout)                                 #   !! replace small depth location with zero
+    torch.gt(torch.mul(dout, rivout, out=t), 0, out=mask)
+    torch.where(mask, dout, zero, out=fldout)                               #   !! river and floodplain different direction
 
-        DOUT                            =           CC_VARS.D2FLDOUT[RC_Index, 1]
-        Mask                            =           (CC_VARS.D2FLDOUT[RC_Index, 1] * CC_VARS.D2RIVOUT[RC_Index, 1] > 0)   #   !! river and floodplain different direction
-        CC_VARS.D2FLDOUT[RC_Index, 1]   =           torch.where(Mask, DOUT, torch.tensor(0.0, dtype=Datatype.JPRB, device=device))
 
+def CMF_CALC_OUTFLW_CPU(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
+    """
+    To compute river (D2RIVOUT) and floodplain (D2FLDOUT) discharge based on water surface slope, storage,
+    and physical river/floodplain properties.
 
-    #   !=== river mouth flow ===
-    RMF_Index                           =           torch.arange(CM_NMLIST.NSEQRIV + 1, CM_NMLIST.NSEQALL + 1, device=device)
-    DSLP                                =           (CC_VARS.D2SFCELV[RMF_Index, 1] - CM_NMLIST.D2DWNELV[RMF_Index, 1]) * CC_NMLIST.PDSTMTH ** (-1)
+    Works on 0-based raw views: river cells are the contiguous range [0, NSEQRIV) and river mouths
+    [NSEQRIV, NSEQALL), so both are plain slices; the parameter views come from the per-topology cache.
+    All temporaries are CC_VARS.WORKSPACE buffers (out= / in-place ops only).
+    """
+    cache = _get_outflw_cpu_cache(CC_NMLIST, CM_NMLIST, CC_VARS, device)
+    if not cache["all_next_valid"]:
+        raise RuntimeError(
+            "CPU OUTFLW requires valid downstream sequence IDs for all river cells; "
+            "invalid topology was detected."
+        )
     if CC_NMLIST.LSLOPEMOUTH:
         raise RuntimeError("LSLOPEMOUTH is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
+    ws = CC_VARS.WORKSPACE
+    dtype = Datatype.JPRB
+    nseq = cache["nseq"]
+    nriv = cache["nriv"]
+    nmth = nseq - nriv
+    next0 = cache["next0_t"]
+    RC, RMF = slice(0, nriv), slice(nriv, nseq)
 
+    rivelv = cache["rivelv"]
+    rivwth = cache["rivwth"]
+    rivhgt = cache["rivhgt"]
+    rivman = cache["rivman"]
+    rivlen = cache["rivlen"]
+    elevtn = cache["elevtn"]
+    nxtdst = cache["nxtdst"]
 
-    DFLW                                =           CC_VARS.D2RIVDPH[RMF_Index, 1]
-    DARE                                =           CM_NMLIST.D2RIVWTH[RMF_Index, 1] * DFLW
-    DARE                                =           torch.maximum(DARE,     # !!  flow cross-section area (min value for stability)
-                                                              torch.tensor(1e-10, dtype=Datatype.JPRB, device=device))
-
-
-    DFLW_pr                             =           CC_VARS.D2RIVDPH_PRE[RMF_Index, 1]
-    DFLW_im                             =           torch.maximum( (DFLW * DFLW_pr) ** 0.5,
-                                                                   torch.tensor(1e-6, dtype=Datatype.JPRB, device=device) )     #   !! semi implicit flow depth
-
-
-    DOUT_pr                             =           CC_VARS.D2RIVOUT_PRE[RMF_Index,1] * CM_NMLIST.D2RIVWTH[RMF_Index, 1] ** (-1)
-    DOUT                                =           (CM_NMLIST.D2RIVWTH[RMF_Index, 1] * (DOUT_pr + CC_NMLIST.PGRV * CC_NMLIST.DT * DFLW_im * DSLP) *
-                                                     (1 + CC_NMLIST.PGRV * CC_NMLIST.DT * CM_NMLIST.D2RIVMAN[RMF_Index, 1] ** 2 * torch.abs(DOUT_pr) *
-                                                     DFLW_im ** (-7/3))** (-1))
-    DVEL                                =           CC_VARS.D2RIVOUT[RMF_Index, 1] * DARE ** (-1)
-
-
-    Mask                                =           (DFLW_im > 1e-5) & (DARE > 1e-5)    #   !! replace small depth location with zero
-    CC_VARS.D2RIVOUT[RMF_Index, 1]      =           torch.where(Mask, DOUT, torch.tensor(0.0, dtype=Datatype.JPRB, device=device))
-    CC_VARS.D2RIVVEL[RMF_Index, 1]      =           torch.where(Mask, DVEL, torch.tensor(0.0, dtype=Datatype.JPRB, device=device))
-
-    # !=== floodplain mouth flow ===
-    if CC_NMLIST.LFLDOUT:
-        DFSTO                           =           CC_VARS.P2FLDSTO[RMF_Index,1]
-        DSLP                            =           (CC_VARS.D2SFCELV[RMF_Index, 1] - CM_NMLIST.D2DWNELV[RMF_Index, 1]) * CC_NMLIST.PDSTMTH ** (-1)
-        DSLP                            =           torch.maximum(-torch.tensor(0.005, dtype=Datatype.JPRB, device=device),
-                                                    torch.minimum( torch.tensor(0.005, dtype=Datatype.JPRB, device=device),DSLP))  # !! set max&min [instead of using weir equation for efficiency]
-        if CC_NMLIST.LSLOPEMOUTH:
-            raise RuntimeError("LSLOPEMOUTH is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
-
-        DFLW                            =           CC_VARS.D2SFCELV[RMF_Index, 1] - CM_NMLIST.D2ELEVTN[RMF_Index, 1]
-        DARE                            =           (torch.maximum
-                                                     (DFSTO * CM_NMLIST.D2RIVLEN[RMF_Index, 1] ** (-1) -
-                                                            CC_VARS.D2FLDDPH[RMF_Index, 1] * CM_NMLIST.D2RIVWTH[RMF_Index, 1],  # !! remove above channel
-                                                     torch.tensor(0, dtype=Datatype.JPRB, device=device)))
-
-
-        DFLW_pr                         =           CC_VARS.D2SFCELV_PRE[RMF_Index, 1] - CM_NMLIST.D2ELEVTN[RMF_Index, 1]
-        DFLW_im                         =           torch.maximum(
-                                                        torch.maximum(DFLW * DFLW_pr, -torch.tensor(0, dtype=Datatype.JPRB, device=device)) ** 0.5,
-                                                        torch.tensor(1e-6, dtype=Datatype.JPRB, device=device))
-
-        DARE_pr                         =           torch.maximum(
-                                                        CC_VARS.D2FLDSTO_PRE[RMF_Index, 1] * CM_NMLIST.D2RIVLEN[RMF_Index, 1] ** (-1) -
-                                                        CC_VARS.D2FLDDPH_PRE[RMF_Index, 1] * CM_NMLIST.D2RIVWTH[RMF_Index, 1],
-                                                        torch.tensor(1e-6, dtype=Datatype.JPRB, device=device))
-        DARE_im                         =           torch.maximum((DARE * DARE_pr) ** 0.5 , torch.tensor(1e-6, dtype=Datatype.JPRB, device=device))
+    sfcelv = CC_VARS.D2SFCELV.raw()[:nseq, 0]
+    sfcelv_pre = CC_VARS.D2SFCELV_PRE.raw()[:nseq, 0]
+    rivdph = CC_VARS.D2RIVDPH.raw()[:nseq, 0]
+    rivdph_pre = CC_VARS.D2RIVDPH_PRE.raw()[:nseq, 0]
+    flddph = CC_VARS.D2FLDDPH.raw()[:nseq, 0]
+    flddph_pre = CC_VARS.D2FLDDPH_PRE.raw()[:nseq, 0]
+    rivout = CC_VARS.D2RIVOUT.raw()[:nseq, 0]
+    fldout = CC_VARS.D2FLDOUT.raw()[:nseq, 0]
+    rivout_pre = CC_VARS.D2RIVOUT_PRE.raw()[:nseq, 0]
+    fldout_pre = CC_VARS.D2FLDOUT_PRE.raw()[:nseq, 0]
+    rivvel = CC_VARS.D2RIVVEL.raw()[:nseq, 0]
+    dwnelv = CM_NMLIST.D2DWNELV.raw()[:nseq, 0]
+    dwnelv_pre = CC_VARS.D2DWNELV_PRE.raw()[:nseq, 0]
+    fldsto = CC_VARS.P2FLDSTO.raw()[:nseq, 0]
+    fldsto_pre = CC_VARS.D2FLDSTO_PRE.raw()[:nseq, 0]
+    storge = CC_VARS.D2STORGE.raw()[:nseq, 0]
 
+    zero = ws.const(0.0, dtype)
+    gdt = CC_NMLIST.PGRV * CC_NMLIST.DT
 
-        DOUT_pr                         =           CC_VARS.D2FLDOUT_PRE [RMF_Index, 1]
-        DOUT                            =           ((DOUT_pr + CC_NMLIST.PGRV * CC_NMLIST.DT * DARE_im * DSLP) *
-                                                     (1 + CC_NMLIST.PGRV * CC_NMLIST.DT * CC_NMLIST.PMANFLD ** 2 *
-                                                      torch.abs(DOUT_pr) * DFLW_im ** (-4 / 3) * DARE_im ** (-1))
-                                                     ** (-1))
+    #   1. Preprocessing Water Surface Elevation
+    torch.add(rivelv, rivdph, out=sfcelv)                                   #   !! water surface elevation (t)   [m]
+    torch.add(rivelv, rivdph_pre, out=sfcelv_pre)                           #   !! water surface elevation (t-1) [m]
+    torch.sub(rivdph_pre, rivhgt, out=flddph_pre)
+    torch.maximum(flddph_pre, zero, out=flddph_pre)                         #   !! floodplain depth (t-1)        [m]
 
-        Mask                            =           (DFLW_im > 1e-5) & (DARE > 1e-5)  # !! replace small depth location with zero
-        CC_VARS.D2FLDOUT[RMF_Index, 1]  =           torch.where(Mask, DOUT, torch.tensor(0.0, dtype=Datatype.JPRB, device=device))
+    #   2. Loop Over River Cells
+    if nriv > 0:
+        # !Update downstream elevation
+        torch.index_select(sfcelv, 0, next0, out=dwnelv[RC])
+        torch.index_select(sfcelv_pre, 0, next0, out=dwnelv_pre[RC])
+
+        #   !=== River Flow ===
+        dsfc = torch.maximum(sfcelv[RC], dwnelv[RC], out=ws.buffer("outflw_r_dsfc", nriv, dtype))
+        dslp = torch.sub(sfcelv[RC], dwnelv[RC], out=ws.buffer("outflw_r_dslp", nriv, dtype))
+        dslp.mul_(torch.pow(nxtdst[RC], -1, out=ws.buffer("outflw_r_t", nriv, dtype)))
+        dsfc_pr = torch.maximum(sfcelv_pre[RC], dwnelv_pre[RC], out=ws.buffer("outflw_r_dsfc_pr", nriv, dtype))
+        dflw = torch.sub(dsfc, rivelv[RC], out=ws.buffer("outflw_r_dflw", nriv, dtype))            #   !!  flow cross-section depth
+        dflw_pr = torch.sub(dsfc_pr, rivelv[RC], out=ws.buffer("outflw_r_dflw_pr", nriv, dtype))
+        _outflw_cpu_rivflw(ws, "r", dtype, gdt, dslp, dflw, dflw_pr,
+                           rivwth[RC], rivman[RC], rivout[RC], rivout_pre[RC], rivvel[RC])
+
+        #!=== Floodplain Flow ===
+        if CC_NMLIST.LFLDOUT:
+            torch.sub(dsfc, elevtn[RC], out=dflw)
+            torch.maximum(dflw, zero, out=dflw)
+            torch.sub(dsfc_pr, elevtn[RC], out=dflw_pr)
+            _outflw_cpu_fldflw(ws, "r", dtype, gdt, CC_NMLIST.PMANFLD, dslp, dflw, dflw_pr,
+                               fldsto[RC], fldsto_pre[RC], flddph[RC], flddph_pre[RC], rivlen[RC], rivwth[RC],
+                               rivout[RC], fldout[RC], fldout_pre[RC])
 
-        DOUT                            =           CC_VARS.D2FLDOUT[RMF_Index, 1]
-        Mask                            =           (CC_VARS.D2FLDOUT[RMF_Index, 1] * CC_VARS.D2RIVOUT[RMF_Index, 1] > 0)   #   !! river and floodplain different direction
-        CC_VARS.D2FLDOUT[RMF_Index, 1]  =           torch.where(Mask, DOUT, torch.tensor(0.0, dtype=Datatype.JPRB, device=device))
+    #   !=== river mouth flow ===
+    if nmth > 0:
+        dslp = torch.sub(sfcelv[RMF], dwnelv[RMF], out=ws.buffer("outflw_m_dslp", nmth, dtype))
+        dslp.mul_(CC_NMLIST.PDSTMTH ** (-1))
+        _outflw_cpu_rivflw(ws, "m", dtype, gdt, dslp, rivdph[RMF], rivdph_pre[RMF],
+                           rivwth[RMF], rivman[RMF], rivout[RMF], rivout_pre[RMF], rivvel[RMF])
 
+        # !=== floodplain mouth flow ===
+        if CC_NMLIST.LFLDOUT:
+            dflw = torch.sub(sfcelv[RMF], elevtn[RMF], out=ws.buffer("outflw_m_dflw", nmth, dtype))
+            dflw_pr = torch.sub(sfcelv_pre[RMF], elevtn[RMF], out=ws.buffer("outflw_m_dflw_pr", nmth, dtype))
+            _outflw_cpu_fldflw(ws, "m", dtype, gdt, CC_NMLIST.PMANFLD, dslp, dflw, dflw_pr,
+                               fldsto[RMF], fldsto_pre[RMF], flddph[RMF], flddph_pre[RMF], rivlen[RMF], rivwth[RMF],
+                               rivout[RMF], fldout[RMF], fldout_pre[RMF])
 
-    RC_Index                            =           torch.arange(1, CM_NMLIST.NSEQRIV + 1, device=device)
     #   !! Storage change limiter to prevent sudden increase of upstream water level during backward flow (v4.23)
-    DOUT                                =           torch.maximum((-CC_VARS.D2RIVOUT[RC_Index, 1] - CC_VARS.D2FLDOUT[RC_Index, 1]) * CC_NMLIST.DT,
-                                                                  torch.tensor(1e-10, dtype=Datatype.JPRB, device=device))
-    RATE                                =           torch.minimum(torch.tensor(0.05, dtype=Datatype.JPRB, device=device) * CC_VARS.D2STORGE[RC_Index, 1] / DOUT,
-                                                                  torch.tensor(1, dtype=Datatype.JPRB, device=device))
-    CC_VARS.D2RIVOUT[RC_Index, 1]      =           CC_VARS.D2RIVOUT[RC_Index, 1] * RATE
-    CC_VARS.D2FLDOUT[RC_Index, 1]      =           CC_VARS.D2FLDOUT[RC_Index, 1] * RATE
+    if nriv > 0:
+        dout = torch.neg(rivout[RC], out=ws.buffer("outflw_r_t", nriv, dtype)).sub_(fldout[RC]).mul_(CC_NMLIST.DT)
+        torch.maximum(dout, ws.const(1e-10, dtype), out=dout)
+        rate = torch.mul(storge[RC], ws.const(0.05, dtype), out=ws.buffer("outflw_r_t2", nriv, dtype)).div_(dout)
+        torch.minimum(rate, ws.const(1.0, dtype), out=rate)
+        rivout[RC].mul_(rate)
+        fldout[RC].mul_(rate)
 
     return CC_VARS
 
@@ -410,14 +600,179 @@ def CMF_CALC_OUTFLW_CUDA(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
     return CC_VARS
 
 
+_OUTFLW_NUMBA_FIELDS = (
+    ("rivelv", "CM", "D2RIVELV"), ("rivwth", "CM", "D2RIVWTH"), ("rivhgt", "CM", "D2RIVHGT"),
+    ("rivman", "CM", "D2RIVMAN"), ("rivlen", "CM", "D2RIVLEN"), ("elevtn", "CM", "D2ELEVTN"),
+    ("nxtdst", "CM", "D2NXTDST"), ("dwnelv", "CM", "D2DWNELV"),
+    ("rivdph", "CC", "D2RIVDPH"), ("rivdph_pre", "CC", "D2RIVDPH_PRE"), ("sfcelv", "CC", "D2SFCELV"),
+    ("sfcelv_pre", "CC", "D2SFCELV_PRE"), ("flddph", "CC", "D2FLDDPH"), ("flddph_pre", "CC", "D2FLDDPH_PRE"),
+    ("dwnelv_pre", "CC", "D2DWNELV_PRE"), ("rivout", "CC", "D2RIVOUT"), ("fldout", "CC", "D2FLDOUT"),
+    ("rivout_pre", "CC", "D2RIVOUT_PRE"), ("fldout_pre", "CC", "D2FLDOUT_PRE"), ("rivvel", "CC", "D2RIVVEL"),
+    ("fldsto", "CC", "P2FLDSTO"), ("fldsto_pre", "CC", "D2FLDSTO_PRE"), ("storge", "CC", "D2STORGE"),
+)
+
+# Fields written by OUTFLW; compared when COUTFLW_CPU == "check".
+_OUTFLW_OUTPUT_FIELDS = (
+    ("CC", "D2SFCELV"), ("CC", "D2SFCELV_PRE"), ("CC", "D2FLDDPH_PRE"), ("CM", "D2DWNELV"),
+    ("CC", "D2DWNELV_PRE"), ("CC", "D2RIVOUT"), ("CC", "D2FLDOUT"), ("CC", "D2RIVVEL"),
+)
+
+
+def _get_outflw_cpu_views(cache, CM_NMLIST, CC_VARS):
+    """Zero-copy numpy views for the Numba kernel, rebuilt only when a state tensor is rebound (e.g. restart)."""
+    if cache["param_views"] is None:
+        cache["param_views"] = {
+            name: _require_contiguous_cpu_numpy(field, getattr(CM_NMLIST, field).raw())
+            for name, owner, field in _OUTFLW_NUMBA_FIELDS if owner == "CM"
+        }
+    state_raw = [
+        (name, field, getattr(CC_VARS, field).raw())
+        for name, owner, field in _OUTFLW_NUMBA_FIELDS if owner == "CC"
+    ]
+    state_key = (id(CC_VARS),) + tuple(id(tensor) for _, _, tensor in state_raw)
+    if cache["state_key"] != state_key:
+        cache["state_views"] = {
+            name: _require_contiguous_cpu_numpy(field, tensor) for name, field, tensor in state_raw
+        }
+        cache["state_key"] = state_key
+    views = dict(cache["param_views"])
+    views.update(cache["state_views"])
+    return [views[name] for name, _, _ in _OUTFLW_NUMBA_FIELDS]
+
+
+def CMF_CALC_OUTFLW_CPU_NUMBA(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
+    """
+    Numba CPU OUTFLW backend: one parallel pass over cells on zero-copy views of the state tensors.
+    """
+    if torch.device(device).type != "cpu":
+        raise RuntimeError("CMF_CALC_OUTFLW_CPU_NUMBA requires a CPU device.")
+    if outflw_numba_cpu is None:
+        raise RuntimeError("Numba CPU OUTFLW backend requires numba, but numba is not available.")
+    if CC_NMLIST.LSLOPEMOUTH:
+        raise RuntimeError("LSLOPEMOUTH is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
+
+    cache = _get_outflw_cpu_cache(CC_NMLIST, CM_NMLIST, CC_VARS, device)
+    if not cache["all_next_valid"]:
+        raise RuntimeError(
+            "Numba CPU OUTFLW requires valid downstream sequence IDs for all river cells; "
+            "invalid topology was detected."
+        )
+    views = _get_outflw_cpu_views(cache, CM_NMLIST, CC_VARS)
+    nseq = cache["nseq"]
+    nriv = cache["nriv"]
+    next0 = cache["next0"]
+    outflw_numba_cpu(
+        nseq, nriv, next0, *views,
+        float(CC_NMLIST.DT), float(CC_NMLIST.PGRV), float(CC_NMLIST.PMANFLD), float(CC_NMLIST.PDSTMTH),
+        bool(CC_NMLIST.LFLDOUT),
+    )
+    return CC_VARS
+
+
+def CMF_CALC_OUTFLW_CPU_CHECK(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
+    """
+    Run the Numba backend against the tensor backend on the same inputs and stop on any mismatch.
+    The tensor results are kept.
+    """
+    owners = {"CM": CM_NMLIST, "CC": CC_VARS}
+    outputs = [getattr(owners[owner], field).raw() for owner, field in _OUTFLW_OUTPUT_FIELDS]
+    saved = [tensor.clone() for tensor in outputs]
+
+    CMF_CALC_OUTFLW_CPU_NUMBA(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype)
+    numba_out = [tensor.clone() for tensor in outputs]
+    for tensor, backup in zip(outputs, saved):
+        tensor.copy_(backup)
+
+    CC_VARS = CMF_CALC_OUTFLW_CPU(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype)
+    nseq = int(CM_NMLIST.NSEQALL)
+    for (owner, field), tensor, candidate in zip(_OUTFLW_OUTPUT_FIELDS, outputs, numba_out):
+        if not torch.allclose(candidate[:nseq], tensor[:nseq], rtol=1e-10, atol=1e-12, equal_nan=True):
+            diff = torch.nan_to_num(torch.abs(candidate[:nseq] - tensor[:nseq]), nan=float("inf"))
+            raise RuntimeError(
+                f"Numba CPU OUTFLW mismatch in {field}: max abs diff {float(torch.max(diff)):.3e}."
+            )
+    return CC_VARS
+
+
 def CMF_CALC_OUTFLW(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
     backend = torch.device(device).type
     if backend == "cpu":
+        mode = getattr(CC_NMLIST, "COUTFLW_CPU", "tensor")
+        if mode == "numba":
+            return CMF_CALC_OUTFLW_CPU_NUMBA(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype)
+        if mode == "check":
+            return CMF_CALC_OUTFLW_CPU_CHECK(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype)
         return CMF_CALC_OUTFLW_CPU(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype)
     if backend == "cuda":
         return CMF_CALC_OUTFLW_CUDA(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype)
     raise RuntimeError(f"Unsupported CaMa-PyTorch OUTFLW backend: {backend!r}.")
 
+def _get_inflow_pth_engine(CC_NMLIST, CM_NMLIST, device, Datatype, lpath):
+    """
+    Bifurcation engine (see CMF_PTH_ENGINE) when there is at least one valid path, else None.
+    """
+    if not lpath:
+        return None
+    eng = CMF_PTH_ENGINE(CC_NMLIST, CM_NMLIST, device, Datatype)
+    return eng if eng["nvalid"] > 0 else None
+
+
+def _pth_add_ends(acc, path_sum_valid, eng, ends, positive_part, dt=None):
+    """
+    acc += incidence * flow: sign * flow at both ends of every valid path in one index_add_
+    (upstream ends first, as the former pair of index_add_ calls). With positive_part the
+    ends keep max(sign * flow, 0) * dt, the storage each end loses to the path.
+    """
+    torch.mul(path_sum_valid, eng["sign"], out=ends)
+    if positive_part:
+        ends.clamp_(min=0.0).mul_(dt)
+    acc.index_add_(0, eng["ends0"], ends.view(-1))
+    return acc
+
+
+def _pth_rescale_levels(d1pth, eng, rate_up, rate_down, ws, Datatype):
+    """
+    Rescale every bifurcation layer at once: (nvalid, nlev) gather, per-layer upstream/downstream
+    rate by the sign of that layer's flow, scatter back to the valid paths.
+    """
+    nvalid, nlev = eng["nvalid"], eng["nlev"]
+    flow = torch.index_select(d1pth, 0, eng["path_idx"], out=ws.buffer("inflow_pth_lev", (nvalid, nlev), d1pth.dtype))
+    sign = torch.ge(flow, 0.0, out=ws.buffer("inflow_pth_lev_pos", (nvalid, nlev), torch.bool))
+    rate = torch.where(sign, rate_up[:, None], rate_down[:, None],
+                       out=ws.buffer("inflow_pth_lev_rate", (nvalid, nlev), Datatype.JPRB))
+    d1pth.index_copy_(0, eng["path_idx"], flow.mul_(rate))
+
+
+def _get_inflow_cpu_cache(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
+    if torch.device(device).type != "cpu":
+        raise RuntimeError("CMF_CALC_INFLOW_CPU requires a CPU device.")
+
+    nseq = int(CM_NMLIST.NSEQALL)
+    nriv = int(CM_NMLIST.NSEQRIV)
+    npth = int(getattr(CM_NMLIST, "NPTHOUT", 0))
+    nlev = int(getattr(CM_NMLIST, "NPTHLEV", 0))
+    lpthout = bool(getattr(CC_NMLIST, "LPTHOUT", False))
+
+    key = (id(CM_NMLIST), nseq, nriv, npth, nlev, lpthout)
+    cache = getattr(CC_NMLIST, "_INFLOW_CPU_CACHE", None)
+    if cache is not None and cache.get("key") == key:
+        return cache
+
+    rc0 = torch.arange(nriv, device=device)
+    next0 = CM_NMLIST.I1NEXT.raw()[:nriv].to(device=device, dtype=torch.long) - 1
+
+    cache = {
+        "key": key,
+        "nseq": nseq,
+        "nriv": nriv,
+        "rc0": rc0,
+        "next0": next0,
+        "pth": _get_inflow_pth_engine(CC_NMLIST, CM_NMLIST, device, Datatype, lpthout and npth > 0 and nlev > 0),
+    }
+    CC_NMLIST._INFLOW_CPU_CACHE = cache
+    return cache
+
+
 def CMF_CALC_INFLOW_CPU(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
     """
     Formal CPU inflow backend.
@@ -425,15 +780,20 @@ def CMF_CALC_INFLOW_CPU(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
     This keeps the formal conservation and pathway formulas, but works on
     0-based raw tensor views to reduce Ftensor_2D wrapper/index-shift overhead.
     Normal river inflow still uses torch.index_add_ to stay close to the
-    Fortran accumulation semantics.
+    Fortran accumulation semantics. Downstream and bifurcation indices come
+    from a per-topology cache, and all temporaries live in CC_VARS.WORKSPACE
+    (out= / in-place ops only).
     """
     if torch.device(device).type != "cpu":
         raise RuntimeError("CMF_CALC_INFLOW_CPU requires a CPU device.")
 
-    nseq = int(CM_NMLIST.NSEQALL)
-    nriv = int(CM_NMLIST.NSEQRIV)
-    zero_b = torch.zeros((), dtype=Datatype.JPRB, device=device)
-    one_b = torch.ones((), dtype=Datatype.JPRB, device=device)
+    cache = _get_inflow_cpu_cache(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype)
+    ws = CC_VARS.WORKSPACE
+    nseq = cache["nseq"]
+    nriv = cache["nriv"]
+    nmth = nseq - nriv
+    dt = CC_NMLIST.DT
+    one_b = ws.const(1.0, Datatype.JPRB)
 
     rivout = CC_VARS.D2RIVOUT.raw()[:nseq, 0]
     fldout = CC_VARS.D2FLDOUT.raw()[:nseq, 0]
@@ -443,107 +803,90 @@ def CMF_CALC_INFLOW_CPU(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
     fldinf = CC_VARS.D2FLDINF.raw()[:nseq, 0]
     pthout = CC_VARS.D2PTHOUT.raw()[:nseq, 0]
 
-    p2rivinf = torch.zeros(nseq, dtype=Datatype.JPRD, device=device)
-    p2fldinf = torch.zeros(nseq, dtype=Datatype.JPRD, device=device)
-    p2pthout = torch.zeros(nseq, dtype=Datatype.JPRD, device=device)
-    p2stoout = torch.zeros(nseq, dtype=Datatype.JPRD, device=device)
-    d2rate = torch.ones(nseq, dtype=Datatype.JPRB, device=device)
-
-    if nriv > 0:
-        rc0 = torch.arange(nriv, device=device)
-        next0 = CM_NMLIST.I1NEXT.raw()[:nriv].to(device=device, dtype=torch.long) - 1
-
-        out_r1 = torch.maximum(rivout[:nriv], zero_b)
-        out_r2 = torch.maximum(-rivout[:nriv], zero_b)
-        out_f1 = torch.maximum(fldout[:nriv], zero_b)
-        out_f2 = torch.maximum(-fldout[:nriv], zero_b)
-        diup = (out_r1 + out_f1) * CC_NMLIST.DT
-        didw = (out_r2 + out_f2) * CC_NMLIST.DT
-
-        p2stoout.index_add_(0, rc0, diup.to(dtype=Datatype.JPRD))
-        p2stoout.index_add_(0, next0, didw.to(dtype=Datatype.JPRD))
-
-    if nseq > nriv:
-        mouth = slice(nriv, nseq)
-        out_r1 = torch.maximum(rivout[mouth], zero_b)
-        out_f1 = torch.maximum(fldout[mouth], zero_b)
-        p2stoout[mouth] += ((out_r1 + out_f1) * CC_NMLIST.DT).to(dtype=Datatype.JPRD)
-
-    path_idx = None
-    iseqp0 = None
-    jseqp0 = None
-    if CC_NMLIST.LPTHOUT:
-        npth = int(CM_NMLIST.NPTHOUT)
-        if npth > 0:
-            iseqp1_all = CM_NMLIST.PTH_UPST.raw()[:npth].to(device=device, dtype=torch.long)
-            jseqp1_all = CM_NMLIST.PTH_DOWN.raw()[:npth].to(device=device, dtype=torch.long)
-            in_domain = (
-                (iseqp1_all > 0) & (jseqp1_all > 0) &
-                (iseqp1_all <= nseq) & (jseqp1_all <= nseq)
-            )
-            valid = torch.zeros(npth, dtype=torch.bool, device=device)
-            if torch.any(in_domain):
-                cand = torch.where(in_domain)[0]
-                cand_iseqp0 = iseqp1_all[cand] - 1
-                cand_jseqp0 = jseqp1_all[cand] - 1
-                mask_raw = CM_NMLIST.I2MASK.raw()
-                valid[cand] = (mask_raw[cand_iseqp0, 0] <= 0) & (mask_raw[cand_jseqp0, 0] <= 0)
-
-            if torch.any(valid):
-                path_idx = torch.where(valid)[0]
-                iseqp0 = iseqp1_all[path_idx] - 1
-                jseqp0 = jseqp1_all[path_idx] - 1
-                path_sum = CC_VARS.D1PTHFLWSUM.raw()[:npth]
-                path_sum_valid = path_sum[path_idx]
-                p2stoout.index_add_(0, iseqp0, (torch.maximum(path_sum_valid, zero_b) * CC_NMLIST.DT).to(dtype=Datatype.JPRD))
-                p2stoout.index_add_(0, jseqp0, (torch.maximum(-path_sum_valid, zero_b) * CC_NMLIST.DT).to(dtype=Datatype.JPRD))
-
-    active = p2stoout > 1.0e-8
-    if torch.any(active):
-        d2rate[active] = torch.minimum(
-            (rivsto[active] + fldsto[active]) / p2stoout[active].to(dtype=Datatype.JPRB),
-            one_b,
-        )
+    p2rivinf = ws.zeros("inflow_p2rivinf", nseq, Datatype.JPRD)
+    p2fldinf = ws.zeros("inflow_p2fldinf", nseq, Datatype.JPRD)
+    p2pthout = ws.zeros("inflow_p2pthout", nseq, Datatype.JPRD)
+    p2stoout = ws.zeros("inflow_p2stoout", nseq, Datatype.JPRD)
+    d2rate = ws.ones("inflow_d2rate", nseq, Datatype.JPRB)
 
+    next0 = cache["next0"]
     if nriv > 0:
-        pos = rivout[:nriv] >= 0
-        rate_src = torch.where(pos, d2rate[:nriv], d2rate[next0])
-        rivout[:nriv] *= rate_src
-        fldout[:nriv] *= rate_src
-
-        p2rivinf.index_add_(0, next0, rivout[:nriv].to(dtype=Datatype.JPRD))
-        p2fldinf.index_add_(0, next0, fldout[:nriv].to(dtype=Datatype.JPRD))
-
-    if nseq > nriv:
-        rivout[nriv:nseq] *= d2rate[nriv:nseq]
-        fldout[nriv:nseq] *= d2rate[nriv:nseq]
-
-    if path_idx is not None:
-        npth = int(CM_NMLIST.NPTHOUT)
-        nlev = int(CM_NMLIST.NPTHLEV)
-        d1pth = CC_VARS.D1PTHFLW.raw()[:npth, :nlev]
+        tmp_a = ws.buffer("inflow_riv_a", nriv, Datatype.JPRB)
+        tmp_b = ws.buffer("inflow_riv_b", nriv, Datatype.JPRB)
+
+        torch.clamp(rivout[:nriv], min=0.0, out=tmp_a)
+        torch.clamp(fldout[:nriv], min=0.0, out=tmp_b)
+        tmp_a.add_(tmp_b).mul_(dt)                                  # !! diup
+        p2stoout[:nriv].add_(tmp_a)
+
+        torch.neg(rivout[:nriv], out=tmp_a).clamp_(min=0.0)
+        torch.neg(fldout[:nriv], out=tmp_b).clamp_(min=0.0)
+        tmp_a.add_(tmp_b).mul_(dt)                                  # !! didw
+        p2stoout.index_add_(0, next0, tmp_a)
+
+    if nmth > 0:
+        tmp_a = ws.buffer("inflow_mth_a", nmth, Datatype.JPRB)
+        tmp_b = ws.buffer("inflow_mth_b", nmth, Datatype.JPRB)
+        torch.clamp(rivout[nriv:nseq], min=0.0, out=tmp_a)
+        torch.clamp(fldout[nriv:nseq], min=0.0, out=tmp_b)
+        tmp_a.add_(tmp_b).mul_(dt)
+        p2stoout[nriv:nseq].add_(tmp_a)
+
+    eng = cache["pth"]
+    if eng is not None:
+        npth = eng["npth"]
+        nvalid = eng["nvalid"]
+        path_idx = eng["path_idx"]
         path_sum = CC_VARS.D1PTHFLWSUM.raw()[:npth]
-        rate_up = d2rate[iseqp0]
-        rate_down = d2rate[jseqp0]
+        path_sum_valid = ws.buffer("inflow_pth_sum", nvalid, path_sum.dtype)
+        ends = ws.buffer("inflow_pth_ends", (2, nvalid), path_sum.dtype)
+        torch.index_select(path_sum, 0, path_idx, out=path_sum_valid)
+        _pth_add_ends(p2stoout, path_sum_valid, eng, ends, True, dt)
 
-        for ilev in range(nlev):
-            flow = d1pth[path_idx, ilev]
-            d1pth[path_idx, ilev] = torch.where(flow >= 0, flow * rate_up, flow * rate_down)
+    active = torch.gt(p2stoout, 1.0e-8, out=ws.buffer("inflow_active", nseq, torch.bool))
+    denom = torch.where(active, p2stoout, one_b, out=ws.buffer("inflow_denom", nseq, Datatype.JPRD))
+    rate = torch.add(rivsto, fldsto, out=ws.buffer("inflow_rate", nseq, Datatype.JPRB))
+    rate.div_(denom).clamp_(max=1.0)
+    torch.where(active, rate, one_b, out=d2rate)
 
-        flow_sum = path_sum[path_idx]
-        path_sum[path_idx] = torch.where(flow_sum >= 0, flow_sum * rate_up, flow_sum * rate_down)
-        path_sum_valid = path_sum[path_idx]
-        p2pthout.index_add_(0, iseqp0, path_sum_valid.to(dtype=Datatype.JPRD))
-        p2pthout.index_add_(0, jseqp0, -path_sum_valid.to(dtype=Datatype.JPRD))
-
-    rivinf[:] = p2rivinf.to(dtype=rivinf.dtype)
-    fldinf[:] = p2fldinf.to(dtype=fldinf.dtype)
-    pthout[:] = p2pthout.to(dtype=pthout.dtype)
+    if nriv > 0:
+        pos = torch.ge(rivout[:nriv], 0.0, out=ws.buffer("inflow_pos", nriv, torch.bool))
+        rate_next = torch.index_select(d2rate, 0, next0, out=ws.buffer("inflow_riv_a", nriv, Datatype.JPRB))
+        rate_src = torch.where(pos, d2rate[:nriv], rate_next, out=ws.buffer("inflow_riv_b", nriv, Datatype.JPRB))
+        rivout[:nriv].mul_(rate_src)
+        fldout[:nriv].mul_(rate_src)
+
+        p2rivinf.index_add_(0, next0, rivout[:nriv])
+        p2fldinf.index_add_(0, next0, fldout[:nriv])
+
+    if nmth > 0:
+        rivout[nriv:nseq].mul_(d2rate[nriv:nseq])
+        fldout[nriv:nseq].mul_(d2rate[nriv:nseq])
+
+    if eng is not None:
+        d1pth = CC_VARS.D1PTHFLW.raw()[:npth, :eng["nlev"]]
+        rate_up = torch.index_select(d2rate, 0, eng["iseqp0"], out=ws.buffer("inflow_rate_up", nvalid, Datatype.JPRB))
+        rate_down = torch.index_select(d2rate, 0, eng["jseqp0"], out=ws.buffer("inflow_rate_dn", nvalid, Datatype.JPRB))
+        flow = ws.buffer("inflow_pth_flow", nvalid, d1pth.dtype)
+        sign = ws.buffer("inflow_pth_pos", nvalid, torch.bool)
+        rate_sel = ws.buffer("inflow_pth_rate", nvalid, Datatype.JPRB)
+
+        _pth_rescale_levels(d1pth, eng, rate_up, rate_down, ws, Datatype)
+
+        torch.index_select(path_sum, 0, path_idx, out=flow)
+        torch.ge(flow, 0.0, out=sign)
+        torch.where(sign, rate_up, rate_down, out=rate_sel)
+        path_sum.index_copy_(0, path_idx, flow.mul_(rate_sel))
+        _pth_add_ends(p2pthout, flow, eng, ends, False)
+
+    rivinf.copy_(p2rivinf)
+    fldinf.copy_(p2fldinf)
+    pthout.copy_(p2pthout)
 
     return CC_VARS
 
 
-def _get_inflow_cuda_cache(CC_NMLIST, CM_NMLIST, CC_VARS, device):
+def _get_inflow_cuda_cache(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
     device_obj = torch.device(device)
     if device_obj.type != "cuda":
         raise RuntimeError("CMF_CALC_INFLOW_CUDA requires a CUDA device.")
@@ -568,36 +911,14 @@ def _get_inflow_cuda_cache(CC_NMLIST, CM_NMLIST, CC_VARS, device):
         next0 = CM_NMLIST.I1NEXT.raw()[:nriv].to(device=device, dtype=torch.long) - 1
     mouth0 = torch.arange(nriv, nseq, dtype=torch.long, device=device)
 
-    path_idx0 = empty_long
-    iseqp0 = empty_long
-    jseqp0 = empty_long
-    if bool(getattr(CC_NMLIST, "LPTHOUT", False)) and npth > 0:
-        iseqp1_all = CM_NMLIST.PTH_UPST.raw()[:npth].to(device=device, dtype=torch.long)
-        jseqp1_all = CM_NMLIST.PTH_DOWN.raw()[:npth].to(device=device, dtype=torch.long)
-        in_domain = (
-            (iseqp1_all > 0) & (jseqp1_all > 0) &
-            (iseqp1_all <= nseq) & (jseqp1_all <= nseq)
-        )
-        cand = in_domain.nonzero(as_tuple=True)[0]
-        if cand.numel() > 0:
-            cand_iseqp0 = iseqp1_all[cand] - 1
-            cand_jseqp0 = jseqp1_all[cand] - 1
-            mask_raw = CM_NMLIST.I2MASK.raw()
-            valid = (mask_raw[cand_iseqp0, 0] <= 0) & (mask_raw[cand_jseqp0, 0] <= 0)
-            path_idx0 = cand[valid]
-            iseqp0 = iseqp1_all[path_idx0] - 1
-            jseqp0 = jseqp1_all[path_idx0] - 1
-
     cache = {
         "key": key,
         "river_src0": rc0,
         "river_dst0": next0,
         "valid_downstream_mask": (next0 >= 0) & (next0 < nseq),
         "mouth0": mouth0,
-        "path_idx0": path_idx0,
-        "path_iseqp0": iseqp0,
-        "path_jseqp0": jseqp0,
-        "path_valid_mask": torch.ones(path_idx0.numel(), dtype=torch.bool, device=device),
+        "pth": _get_inflow_pth_engine(CC_NMLIST, CM_NMLIST, device, Datatype,
+                                      bool(getattr(CC_NMLIST, "LPTHOUT", False)) and npth > 0 and nlev > 0),
     }
     CC_NMLIST._INFLOW_CUDA_CACHE = cache
     return cache
@@ -615,7 +936,7 @@ def CMF_CALC_INFLOW_CUDA(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
     nriv = int(CM_NMLIST.NSEQRIV)
     npth = int(getattr(CM_NMLIST, "NPTHOUT", 0))
     nlev = int(getattr(CM_NMLIST, "NPTHLEV", 0))
-    cache = _get_inflow_cuda_cache(CC_NMLIST, CM_NMLIST, CC_VARS, device)
+    cache = _get_inflow_cuda_cache(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype)
 
     rivout = CC_VARS.D2RIVOUT.raw()[:nseq, 0]
     fldout = CC_VARS.D2FLDOUT.raw()[:nseq, 0]
@@ -653,21 +974,12 @@ def CMF_CALC_INFLOW_CUDA(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
         out_f1 = torch.maximum(fldout[mouth0], zero_flow)
         p2stoout[mouth0] += ((out_r1 + out_f1) * CC_NMLIST.DT).to(dtype=Datatype.JPRD)
 
-    path_idx0 = cache["path_idx0"]
-    iseqp0 = cache["path_iseqp0"]
-    jseqp0 = cache["path_jseqp0"]
-    has_path = bool(getattr(CC_NMLIST, "LPTHOUT", False)) and path_idx0.numel() > 0
-    if has_path:
+    eng = cache["pth"]
+    if eng is not None:
+        path_idx0 = eng["path_idx"]
         path_sum = CC_VARS.D1PTHFLWSUM.raw()[:npth]
-        path_sum_valid = path_sum[path_idx0]
-        p2stoout.index_add_(
-            0, iseqp0,
-            (torch.maximum(path_sum_valid, zero_flow) * CC_NMLIST.DT).to(dtype=Datatype.JPRD),
-        )
-        p2stoout.index_add_(
-            0, jseqp0,
-            (torch.maximum(-path_sum_valid, zero_flow) * CC_NMLIST.DT).to(dtype=Datatype.JPRD),
-        )
+        ends = (path_sum[path_idx0] * eng["sign"]).to(dtype=Datatype.JPRD)
+        p2stoout.index_add_(0, eng["ends0"], (torch.maximum(ends, zero_flow) * CC_NMLIST.DT).view(-1))
 
     active = p2stoout > 1.0e-8
     denom = torch.where(active, p2stoout, torch.ones_like(p2stoout))
@@ -698,21 +1010,17 @@ def CMF_CALC_INFLOW_CUDA(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
         rivout[mouth0] *= d2rate[mouth0]
         fldout[mouth0] *= d2rate[mouth0]
 
-    if has_path:
+    if eng is not None:
         d1pth = CC_VARS.D1PTHFLW.raw()[:npth, :nlev]
-        path_sum = CC_VARS.D1PTHFLWSUM.raw()[:npth]
-        rate_up = d2rate[iseqp0]
-        rate_down = d2rate[jseqp0]
+        rate_up = d2rate[eng["iseqp0"]][:, None]
+        rate_down = d2rate[eng["jseqp0"]][:, None]
 
-        for ilev in range(nlev):
-            flow = d1pth[path_idx0, ilev]
-            d1pth[path_idx0, ilev] = torch.where(flow >= 0, flow * rate_up, flow * rate_down)
+        flow = d1pth[path_idx0, :]
+        d1pth[path_idx0, :] = torch.where(flow >= 0, flow * rate_up, flow * rate_down)
 
         flow_sum = path_sum[path_idx0]
-        path_sum[path_idx0] = torch.where(flow_sum >= 0, flow_sum * rate_up, flow_sum * rate_down)
-        path_sum_valid = path_sum[path_idx0]
-        p2pthout.index_add_(0, iseqp0, path_sum_valid.to(dtype=Datatype.JPRD))
-        p2pthout.index_add_(0, jseqp0, -path_sum_valid.to(dtype=Datatype.JPRD))
+        path_sum[path_idx0] = torch.where(flow_sum >= 0, flow_sum * rate_up[:, 0], flow_sum * rate_down[:, 0])
+        p2pthout.index_add_(0, eng["ends0"], (path_sum[path_idx0] * eng["sign"]).to(dtype=Datatype.JPRD).view(-1))
 
     rivinf[:] = p2rivinf.to(dtype=rivinf.dtype)
     fldinf[:] = p2fldinf.to(dtype=fldinf.dtype)
@@ -721,8 +1029,187 @@ def CMF_CALC_INFLOW_CUDA(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
     return CC_VARS
 
 
+def _build_gather_op(dst0, nseq, mode, device):
+    if mode == "csr":
+        slots, _ = build_gather_slots_torch(dst0, nseq, device)
+        return {"mode": mode, "nedge": int(dst0.numel()), "slots": slots}
+    upst, _, upstream_mask = build_gather_matrix_torch(dst0, nseq, device)
+    upst = torch.where(upstream_mask, upst, torch.full_like(upst, int(dst0.numel())))   # !! padding reads a zero
+    return {"mode": mode, "nedge": int(dst0.numel()),
+            "cols": [upst[:, k].contiguous() for k in range(upst.shape[1])]}
+
+
+def _gather_add(acc, src, op, ws, name):
+    """
+    acc[i] += src[e] for every edge e into row i, in ascending edge order (same rounding
+    as a serial index_add_). No atomics: each row is written by one element per slot.
+    """
+    if op["mode"] == "csr":
+        for k, (rows, edges) in enumerate(op["slots"]):
+            nrow = int(rows.numel())
+            tmp = torch.index_select(acc, 0, rows, out=ws.buffer(f"{name}_acc{k}", nrow, acc.dtype))
+            tmp.add_(torch.index_select(src, 0, edges, out=ws.buffer(f"{name}_src{k}", nrow, src.dtype)))
+            acc.index_copy_(0, rows, tmp)
+        return acc
+    nedge = op["nedge"]
+    ext = ws.buffer(f"{name}_ext", nedge + 1, src.dtype)
+    ext[:nedge].copy_(src)
+    ext[nedge:].zero_()
+    col = ws.buffer(f"{name}_col", acc.numel(), src.dtype)
+    for cols in op["cols"]:
+        acc.add_(torch.index_select(ext, 0, cols, out=col))
+    return acc
+
+
+def _get_inflow_gather_cache(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
+    nseq = int(CM_NMLIST.NSEQALL)
+    nriv = int(CM_NMLIST.NSEQRIV)
+    npth = int(getattr(CM_NMLIST, "NPTHOUT", 0))
+    nlev = int(getattr(CM_NMLIST, "NPTHLEV", 0))
+    lpthout = bool(getattr(CC_NMLIST, "LPTHOUT", False))
+    mode = CC_NMLIST.CINFLOW
+
+    key = (id(CM_NMLIST), str(device), nseq, nriv, npth, nlev, lpthout, mode)
+    cache = getattr(CC_NMLIST, "_INFLOW_GATHER_CACHE", None)
+    if cache is not None and cache.get("key") == key:
+        return cache
+
+    next0 = CM_NMLIST.I1NEXT.raw()[:nriv].to(device=device, dtype=torch.long) - 1
+    valid = (next0 >= 0) & (next0 < nseq)
+    next_rate = torch.where(valid, next0, torch.full_like(next0, nseq))     # !! outside domain: rate 1
+
+    eng = _get_inflow_pth_engine(CC_NMLIST, CM_NMLIST, device, Datatype, lpthout and npth > 0 and nlev > 0)
+
+    cache = {
+        "key": key,
+        "nseq": nseq,
+        "nriv": nriv,
+        "next_rate": next_rate,
+        "river_op": _build_gather_op(next0, nseq, mode, device),
+        "pth": eng,
+        # !! incidence rows: upstream ends first, then downstream ends
+        "path_op": _build_gather_op(eng["ends0"], nseq, mode, device) if eng is not None else None,
+    }
+    CC_NMLIST._INFLOW_GATHER_CACHE = cache
+    return cache
+
+
+def CMF_CALC_INFLOW_GATHER(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
+    """
+    Scatter-free inflow backend for CPU and CUDA (CINFLOW = "gather" or "csr").
+
+    Same formulas as CMF_CALC_INFLOW_CPU, but every accumulation into a cell
+    (storage change, river/floodplain inflow, bifurcation net outflow) is a
+    gather over that cell's upstream edges, added slot by slot in ascending edge
+    order. The result is bitwise reproducible on every device without the
+    deterministic index_add_ fallback. "gather" uses the padded upstream matrix
+    (width = largest fan-in), "csr" the per-slot edge lists (work = edge count).
+    """
+    cache = _get_inflow_gather_cache(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype)
+    ws = CC_VARS.WORKSPACE
+    nseq = cache["nseq"]
+    nriv = cache["nriv"]
+    nmth = nseq - nriv
+    dt = CC_NMLIST.DT
+    one_b = ws.const(1.0, Datatype.JPRB)
+
+    rivout = CC_VARS.D2RIVOUT.raw()[:nseq, 0]
+    fldout = CC_VARS.D2FLDOUT.raw()[:nseq, 0]
+    rivsto = CC_VARS.P2RIVSTO.raw()[:nseq, 0]
+    fldsto = CC_VARS.P2FLDSTO.raw()[:nseq, 0]
+    rivinf = CC_VARS.D2RIVINF.raw()[:nseq, 0]
+    fldinf = CC_VARS.D2FLDINF.raw()[:nseq, 0]
+    pthout = CC_VARS.D2PTHOUT.raw()[:nseq, 0]
+
+    p2rivinf = ws.zeros("inflow_p2rivinf", nseq, Datatype.JPRD)
+    p2fldinf = ws.zeros("inflow_p2fldinf", nseq, Datatype.JPRD)
+    p2pthout = ws.zeros("inflow_p2pthout", nseq, Datatype.JPRD)
+    p2stoout = ws.zeros("inflow_p2stoout", nseq, Datatype.JPRD)
+    d2rate_ext = ws.ones("inflow_d2rate_ext", nseq + 1, Datatype.JPRB)
+    d2rate = d2rate_ext[:nseq]
+
+    if nriv > 0:
+        tmp_a = ws.buffer("inflow_riv_a", nriv, Datatype.JPRB)
+        tmp_b = ws.buffer("inflow_riv_b", nriv, Datatype.JPRB)
+
+        torch.clamp(rivout[:nriv], min=0.0, out=tmp_a)
+        torch.clamp(fldout[:nriv], min=0.0, out=tmp_b)
+        tmp_a.add_(tmp_b).mul_(dt)                                  # !! diup
+        p2stoout[:nriv].add_(tmp_a)
+
+        torch.neg(rivout[:nriv], out=tmp_a).clamp_(min=0.0)
+        torch.neg(fldout[:nriv], out=tmp_b).clamp_(min=0.0)
+        tmp_a.add_(tmp_b).mul_(dt)                                  # !! didw
+        _gather_add(p2stoout, tmp_a, cache["river_op"], ws, "inflow_g_riv")
+
+    if nmth > 0:
+        tmp_a = ws.buffer("inflow_mth_a", nmth, Datatype.JPRB)
+        tmp_b = ws.buffer("inflow_mth_b", nmth, Datatype.JPRB)
+        torch.clamp(rivout[nriv:nseq], min=0.0, out=tmp_a)
+        torch.clamp(fldout[nriv:nseq], min=0.0, out=tmp_b)
+        tmp_a.add_(tmp_b).mul_(dt)
+        p2stoout[nriv:nseq].add_(tmp_a)
+
+    eng = cache["pth"]
+    if eng is not None:
+        npth = eng["npth"]
+        nvalid = eng["nvalid"]
+        path_idx = eng["path_idx"]
+        path_sum = CC_VARS.D1PTHFLWSUM.raw()[:npth]
+        path_sum_valid = ws.buffer("inflow_pth_sum", nvalid, path_sum.dtype)
+        ends = ws.buffer("inflow_pth_ends", (2, nvalid), path_sum.dtype)
+        torch.index_select(path_sum, 0, path_idx, out=path_sum_valid)
+        torch.mul(path_sum_valid, eng["sign"], out=ends).clamp_(min=0.0).mul_(dt)
+        _gather_add(p2stoout, ends.view(-1), cache["path_op"], ws, "inflow_g_pth")
+
+    active = torch.gt(p2stoout, 1.0e-8, out=ws.buffer("inflow_active", nseq, torch.bool))
+    denom = torch.where(active, p2stoout, one_b, out=ws.buffer("inflow_denom", nseq, Datatype.JPRD))
+    rate = torch.add(rivsto, fldsto, out=ws.buffer("inflow_rate", nseq, Datatype.JPRB))
+    rate.div_(denom).clamp_(max=1.0)
+    torch.where(active, rate, one_b, out=d2rate)
+
+    if nriv > 0:
+        pos = torch.ge(rivout[:nriv], 0.0, out=ws.buffer("inflow_pos", nriv, torch.bool))
+        rate_next = torch.index_select(d2rate_ext, 0, cache["next_rate"], out=ws.buffer("inflow_riv_a", nriv, Datatype.JPRB))
+        rate_src = torch.where(pos, d2rate[:nriv], rate_next, out=ws.buffer("inflow_riv_b", nriv, Datatype.JPRB))
+        rivout[:nriv].mul_(rate_src)
+        fldout[:nriv].mul_(rate_src)
+
+        _gather_add(p2rivinf, rivout[:nriv], cache["river_op"], ws, "inflow_g_riv")
+        _gather_add(p2fldinf, fldout[:nriv], cache["river_op"], ws, "inflow_g_riv")
+
+    if nmth > 0:
+        rivout[nriv:nseq].mul_(d2rate[nriv:nseq])
+        fldout[nriv:nseq].mul_(d2rate[nriv:nseq])
+
+    if eng is not None:
+        d1pth = CC_VARS.D1PTHFLW.raw()[:npth, :eng["nlev"]]
+        rate_up = torch.index_select(d2rate, 0, eng["iseqp0"], out=ws.buffer("inflow_rate_up", nvalid, Datatype.JPRB))
+        rate_down = torch.index_select(d2rate, 0, eng["jseqp0"], out=ws.buffer("inflow_rate_dn", nvalid, Datatype.JPRB))
+        flow = ws.buffer("inflow_pth_flow", nvalid, d1pth.dtype)
+        sign = ws.buffer("inflow_pth_pos", nvalid, torch.bool)
+        rate_sel = ws.buffer("inflow_pth_rate", nvalid, Datatype.JPRB)
+
+        _pth_rescale_levels(d1pth, eng, rate_up, rate_down, ws, Datatype)
+
+        torch.index_select(path_sum, 0, path_idx, out=flow)
+        torch.ge(flow, 0.0, out=sign)
+        torch.where(sign, rate_up, rate_down, out=rate_sel)
+        path_sum.index_copy_(0, path_idx, flow.mul_(rate_sel))
+        torch.mul(flow, eng["sign"], out=ends)
+        _gather_add(p2pthout, ends.view(-1), cache["path_op"], ws, "inflow_g_pth")
+
+    rivinf.copy_(p2rivinf)
+    fldinf.copy_(p2fldinf)
+    pthout.copy_(p2pthout)
+
+    return CC_VARS
+
+
 def CMF_CALC_INFLOW(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
     backend = torch.device(device).type
+    if getattr(CC_NMLIST, "CINFLOW", "scatter") in ("gather", "csr"):
+        return CMF_CALC_INFLOW_GATHER(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype)
     if backend == "cpu":
         return CMF_CALC_INFLOW_CPU(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype)
     if backend == "cuda":
@@ -25,73 +25,72 @@ def _scalar_tensor(value, dtype, device):
     return torch.tensor(value, dtype=dtype, device=device)
 
 def CMF_CALC_STONXT(CC_NMLIST, CM_NMLIST, CC_VARS , device, Datatype):
+    """
+    FTCS storage update. All temporaries are CC_VARS.WORKSPACE buffers and the state is
+    updated in place, so the steady-state call does not allocate.
+    """
+    ws                                                  =           CC_VARS.WORKSPACE
+    nseq                                                =           int(CM_NMLIST.NSEQALL)
     storage_dtype = CC_VARS.P2RIVSTO.raw().dtype
-    diag_dtype = CC_VARS.D2OUTFLW.raw().dtype
-    dt_storage = _scalar_tensor(CC_NMLIST.DT, storage_dtype, device)
-    zero_storage = torch.zeros((), dtype=storage_dtype, device=device)
+    # DT changes every adaptive substep: keep it a python scalar so it is not cached as a constant.
+    dt_storage = float(CC_NMLIST.DT) if not torch.is_tensor(CC_NMLIST.DT) \
+        else _scalar_tensor(CC_NMLIST.DT, storage_dtype, device)
+    one_storage = ws.const(1.0, storage_dtype)
 
     if CC_NMLIST.LGDWDLY:
         raise RuntimeError("LGDWDLY is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
     elif CC_NMLIST.LROSPLIT:
         # ! No ground water delay
-        CC_VARS.D2GDWRTN[:CM_NMLIST.NSEQALL+1,1]        =       CC_VARS.D2ROFSUB[:CM_NMLIST.NSEQALL+1,1].to(dtype=CC_VARS.D2GDWRTN.raw().dtype)
-        CC_VARS.P2GDWSTO[:CM_NMLIST.NSEQALL+1,1]        =       zero_storage
+        CC_VARS.D2GDWRTN.raw()[:nseq, 0].copy_(CC_VARS.D2ROFSUB.raw()[:nseq, 0])
+        CC_VARS.P2GDWSTO.raw()[:nseq, 0].zero_()
     # ------------------------------------------------------------------------------------------------------------------
-    NQ_Index                                            =           torch.arange(1, CM_NMLIST.NSEQALL + 1, dtype=torch.long, device=device)
-    # CC_VARS.P0GLBSTOPRE                                 =           CC_VARS.P2RIVSTO.raw().sum()  +    CC_VARS.P2FLDSTO.raw().sum()
-    # CC_VARS.P0GLBRIVINF                                 =           (((CC_VARS.D2RIVINF.raw()   *  CC_NMLIST.DT).sum()  +
-    #                                                                 (CC_VARS.D2FLDINF.raw()   *  CC_NMLIST.DT).sum()    +
-    #                                                                 (CC_VARS.D2PTHINF.raw()   *  CC_NMLIST.DT).sum()))
-    # CC_VARS.P0GLBRIVOUT                                 =           (((CC_VARS.D2RIVOUT.raw() * CC_NMLIST.DT).sum()     +
-    #                                                                 (CC_VARS.D2FLDOUT.raw() * CC_NMLIST.DT).sum()       +
-    #                                                                 (CC_VARS.D2PTHOUT.raw() * CC_NMLIST.DT).sum()))
+    rivsto                                              =           CC_VARS.P2RIVSTO.raw()[:nseq, 0]
+    fldsto                                              =           CC_VARS.P2FLDSTO.raw()[:nseq, 0]
+    rivinf                                              =           CC_VARS.D2RIVINF.raw()[:nseq, 0]
+    fldinf                                              =           CC_VARS.D2FLDINF.raw()[:nseq, 0]
+    rivout                                              =           CC_VARS.D2RIVOUT.raw()[:nseq, 0]
+    fldout                                              =           CC_VARS.D2FLDOUT.raw()[:nseq, 0]
+    pthout                                              =           CC_VARS.D2PTHOUT.raw()[:nseq, 0]
+    runoff                                              =           CC_VARS.D2RUNOFF.raw()[:nseq, 0]
+    gdwrtn                                              =           CC_VARS.D2GDWRTN.raw()[:nseq, 0]
+    fldfrc                                              =           CC_VARS.D2FLDFRC.raw()[:nseq, 0]
 
-    rivsto_old                                          =           CC_VARS.P2RIVSTO[NQ_Index, 1].to(dtype=storage_dtype).clone()
-    fldsto_old                                          =           CC_VARS.P2FLDSTO[NQ_Index, 1].to(dtype=storage_dtype).clone()
-    rivinf                                              =           CC_VARS.D2RIVINF[NQ_Index, 1].to(dtype=storage_dtype)
-    fldinf                                              =           CC_VARS.D2FLDINF[NQ_Index, 1].to(dtype=storage_dtype)
-    rivout                                              =           CC_VARS.D2RIVOUT[NQ_Index, 1].to(dtype=storage_dtype)
-    fldout                                              =           CC_VARS.D2FLDOUT[NQ_Index, 1].to(dtype=storage_dtype)
-    pthout                                              =           CC_VARS.D2PTHOUT[NQ_Index, 1].to(dtype=storage_dtype)
-    runoff                                              =           CC_VARS.D2RUNOFF[NQ_Index, 1].to(dtype=storage_dtype)
-    gdwrtn                                              =           CC_VARS.D2GDWRTN[NQ_Index, 1].to(dtype=storage_dtype)
-    fldfrc                                              =           CC_VARS.D2FLDFRC[NQ_Index, 1].to(dtype=storage_dtype)
+    tmp                                                 =           ws.buffer("stonxt_tmp", nseq, storage_dtype)
+    rivsto_nxt                                          =           ws.buffer("stonxt_rivsto", nseq, storage_dtype)
+    droff                                               =           ws.buffer("stonxt_droff", nseq, storage_dtype)
 
-    CC_VARS.P0GLBSTOPRE                                 =           torch.sum(rivsto_old + fldsto_old)
-    CC_VARS.P0GLBRIVINF                                 =           torch.sum((rivinf + fldinf) * dt_storage)
-    CC_VARS.P0GLBRIVOUT                                 =           torch.sum((rivout + fldout + pthout) * dt_storage)
-                                                                    # ------------------------------------------------------------------------------------------------------------------
-    rivsto_after_flow                                   =           rivsto_old + rivinf * dt_storage - rivout * dt_storage
-    rivsto_deficit                                      =           torch.minimum(rivsto_after_flow, zero_storage)
-    rivsto_after_transfer                               =           torch.maximum(rivsto_after_flow, zero_storage)
-    fldsto_after_riv_transfer                           =           fldsto_old + rivsto_deficit
+    CC_VARS.P0GLBSTOPRE = torch.sum(torch.add(rivsto, fldsto, out=tmp), dim=0,
+                                    out=ws.buffer("glb_stopre", (), storage_dtype))
+    CC_VARS.P0GLBRIVINF = torch.sum(torch.add(rivinf, fldinf, out=tmp).mul_(dt_storage),
+                                    dim=0, out=ws.buffer("glb_rivinf", (), storage_dtype))
+    CC_VARS.P0GLBRIVOUT = torch.sum(torch.add(rivout, fldout, out=tmp).add_(pthout).mul_(dt_storage),
+                                    dim=0, out=ws.buffer("glb_rivout", (), storage_dtype))
+    # ------------------------------------------------------------------------------------------------------------------
+    # !! river storage after flow; negative part is taken from the floodplain
+    torch.add(rivsto, torch.mul(rivinf, dt_storage, out=tmp), out=rivsto_nxt)
+    rivsto_nxt.sub_(torch.mul(rivout, dt_storage, out=tmp))
+    fldsto.add_(torch.clamp(rivsto_nxt, max=0.0, out=tmp))
+    rivsto_nxt.clamp_(min=0.0)
 
-    fldsto_after_flow                                   =           (fldsto_after_riv_transfer +
-                                                                     fldinf * dt_storage -
-                                                                     fldout * dt_storage -
-                                                                     pthout * dt_storage)
-    fldsto_deficit                                      =           torch.minimum(fldsto_after_flow, zero_storage)
-    rivsto_after_exchange                               =           torch.maximum(rivsto_after_transfer + fldsto_deficit, zero_storage)
-    fldsto_after_exchange                               =           torch.maximum(fldsto_after_flow, zero_storage)
+    fldsto.add_(torch.mul(fldinf, dt_storage, out=tmp))
+    fldsto.sub_(torch.mul(fldout, dt_storage, out=tmp))
+    fldsto.sub_(torch.mul(pthout, dt_storage, out=tmp))
+    # !! floodplain deficit is taken from the river
+    rivsto_nxt.add_(torch.clamp(fldsto, max=0.0, out=tmp)).clamp_(min=0.0)
+    fldsto.clamp_(min=0.0)
 
     # ------------------------------------------------------------------------------------------------------------------
-    # CC_VARS.P0GLBSTONXT                                 =           CC_VARS.P2RIVSTO.raw().sum() +  CC_VARS.P2FLDSTO.raw().sum()
-    CC_VARS.P0GLBSTONXT                                 =            torch.sum(rivsto_after_exchange + fldsto_after_exchange)
-    CC_VARS.D2OUTFLW[NQ_Index, 1]                       =            (rivout + fldout).to(dtype=diag_dtype)
+    CC_VARS.P0GLBSTONXT = torch.sum(torch.add(rivsto_nxt, fldsto, out=tmp), dim=0,
+                                    out=ws.buffer("glb_stonxt", (), storage_dtype))
+    torch.add(rivout, fldout, out=CC_VARS.D2OUTFLW.raw()[:nseq, 0])
     # ------------------------------------------------------------------------------------------------------------------
     #     !! bug before v4.2 (pthout shoudl not be added)
     # CC_VARS.D2OUTFLW[NQ_Index, 1]                       =           (CC_VARS.D2RIVOUT[NQ_Index, 1]  +  CC_VARS.D2FLDOUT[NQ_Index, 1]  +
     #                                                                  CC_VARS.D2PTHOUT[NQ_Index, 1])
-    DRIVROF                                             =           ((runoff + gdwrtn) *
-                                                                     (torch.ones((), dtype=storage_dtype, device=device) - fldfrc) *
-                                                                     dt_storage)
-    DFLDROF                                             =           ((runoff + gdwrtn) *
-                                                                                                                                fldfrc *
-                                                                     dt_storage)
-    rivsto_new                                          =            rivsto_after_exchange + DRIVROF
-    fldsto_new                                          =            fldsto_after_exchange + DFLDROF
-    CC_VARS.P2RIVSTO[NQ_Index, 1]                       =            rivsto_new
-    CC_VARS.P2FLDSTO[NQ_Index, 1]                       =            fldsto_new
+    torch.add(runoff, gdwrtn, out=droff)
+    # !! DRIVROF = droff * (1 - fldfrc) * DT ; DFLDROF = droff * fldfrc * DT
+    rivsto.copy_(rivsto_nxt).add_(torch.sub(one_storage, fldfrc, out=tmp).mul_(droff).mul_(dt_storage))
+    fldsto.add_(torch.mul(droff, fldfrc, out=tmp).mul_(dt_storage))
 
     if  CC_NMLIST.LWEVAP:
         #   !! Find out amount of water to be extracted from flooplain reservoir
@@ -99,9 +98,7 @@ def CMF_CALC_STONXT(CC_NMLIST, CM_NMLIST, CC_VARS , device, Datatype):
         #   !! Limited by total amount of flooplain storage
         raise RuntimeError("LWEVAP is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
 
-    CC_VARS.D2STORGE[NQ_Index, 1]                       =             (rivsto_new + fldsto_new).to(dtype=CC_VARS.D2STORGE.raw().dtype)
-
-
-    # CC_VARS.P0GLBSTONEW                                 =             CC_VARS.D2STORGE.raw().sum()
-    CC_VARS.P0GLBSTONEW                                 =             torch.sum(rivsto_new + fldsto_new)
+    storge                                              =           torch.add(rivsto, fldsto, out=CC_VARS.D2STORGE.raw()[:nseq, 0])
+    CC_VARS.P0GLBSTONEW = torch.sum(storge, dim=0, out=ws.buffer("glb_stonew", (), storage_dtype))
+    CC_VARS.NSTOVER     = CC_VARS.NSTOVER + 1                  # !! stage is out of date
     return  CC_VARS
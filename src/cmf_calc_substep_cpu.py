@@ -0,0 +1,788 @@
+#!/usr/bin/env python3
+"""Fused CPU substep backend (opt-in with ``LCPUFUSED``).
+
+One adaptive substep (OUTFLW, INFLOW, VARS_PRE, STONXT, FLDSTG and the
+ADPSTP average/max accumulation) runs as compiled Numba passes over zero-copy
+0-based views of the model state. The per-cell formulas and the stage order
+follow the staged CPU routines; only the global sums may differ from
+``torch.sum`` at round-off level because they are accumulated serially.
+
+With LPTHOUT the bifurcation stage stays on the torch PTHOUT routine, so the
+substep is split into an OUTFLW pass and an update pass around it.
+
+With ``NCPUCHUNK > 1`` the update pass runs in parallel over chunks of whole
+river basins (``prange``). A cell's downstream cell and bifurcation partners
+are always in the same chunk, so the inflow scatter needs no atomics. The
+global sums are then added per chunk in a fixed order, so they do not depend
+on the number of threads.
+
+With ``LMULTIRATE`` each basin group picks its own power-of-two substep count
+from its CFL limit (CMF_CALC_SUBSTEP_CPU_MULTIRATE). The class is set by the
+most restrictive cell of the group, and a group is never split, so there is no
+flux synchronisation at class interfaces. A large basin with one deep, short
+cell takes the global NT, so the gain comes only from many small basins with
+slow dynamics. A single continental basin runs no faster than without it.
+
+With ``LACTIVE`` both passes run over a compacted per-cell active set: cells
+that are wet or receive runoff, their upstream neighbours (backwater), the
+bifurcation ends, and every cell downstream of those. A cell is left out only
+when it and its neighbours were at rest (dry, no flow, no runoff) at the start
+of two consecutive substeps; a substep from that state reproduces the same
+state, so the result equals the full pass. Dry headwaters of a basin with a
+wet reach are skipped. "At rest" means exact zeros, since any tolerance would
+change the results. LACTIVE exists on this fused path only.
+"""
+import os
+
+import numpy as np
+import torch
+
+from cmf_calc_fldstg_cpu import _require_contiguous_cpu_numpy, fldstg_flooded_cell_numba_cpu
+from cmf_calc_outflw_mod import outflw_chunks_numba_cpu, outflw_numba_cpu
+from cmf_calc_pthout_mod import CMF_CALC_PTHOUT
+from cmf_topology_utils import pack_largest_first
+
+try:
+    import numba
+except Exception:  # pragma: no cover - handled explicitly at runtime.
+    numba = None
+
+
+os.environ["PYTHONWARNINGS"] = "ignore::FutureWarning"
+os.environ["PYTHONWARNINGS"] = "ignore::RuntimeWarning"
+
+
+# Order of the global budget terms returned in ``glb``.
+_GLB_NAMES = (
+    "P0GLBSTOPRE",
+    "P0GLBRIVINF",
+    "P0GLBRIVOUT",
+    "P0GLBSTONXT",
+    "P0GLBSTONEW",
+    "P0GLBSTOPRE2",
+    "P0GLBSTONEW2",
+    "P0GLBRIVSTO",
+    "P0GLBFLDSTO",
+    "P0GLBFLDARE",
+)
+
+
+if numba is not None:
+    @numba.njit(cache=True, fastmath=False)
+    def _update_chunk_numba(
+        cells, paths, nriv, nlfp, next0,
+        path_idx0, path_up0, path_dn0, d1pthflw, d1pthflwsum,
+        rivelv, rivwth, rivlen, grarea, rivstomax, fldstomax, fldgrd,
+        rivsto, fldsto, rivdph, flddph, fldfrc, fldare, sfcelv, storge,
+        rivout, fldout, rivout_pre, fldout_pre, rivdph_pre, fldsto_pre, rivvel,
+        rivinf, fldinf, pthout, pthinf, outflw, runoff, rofsub, gdwrtn, gdwsto,
+        rivout_aavg, fldout_aavg, rivvel_aavg, outflw_aavg, pthout_aavg,
+        gdwrtn_aavg, runoff_aavg, rofsub_aavg, storge_amax, outflw_amax, rivdph_amax,
+        p2stoout, p2rivinf, p2fldinf, p2pthout, d2rate, glb,
+        dt, dfrcinc, lrosplit,
+    ):
+        # One group of whole basins: every downstream cell and bifurcation partner of ``cells`` is in ``cells``,
+        # so chunks touch disjoint memory and can run on different threads.
+        ncell = cells.shape[0]
+        nlev = d1pthflw.shape[1]
+
+        # ------------------------------------------------------------------------------------------------------------
+        # INFLOW: water budget adjustment and inflow
+        for ii in range(ncell):
+            i = cells[ii]
+            p2stoout[i] = 0.0
+            p2rivinf[i] = 0.0
+            p2fldinf[i] = 0.0
+            p2pthout[i] = 0.0
+            d2rate[i] = 1.0
+        for ii in range(ncell):
+            i = cells[ii]
+            p2stoout[i] += (max(rivout[i, 0], 0.0) + max(fldout[i, 0], 0.0)) * dt
+        for ii in range(ncell):
+            i = cells[ii]
+            if i < nriv:
+                p2stoout[next0[i]] += (max(-rivout[i, 0], 0.0) + max(-fldout[i, 0], 0.0)) * dt
+        for kk in range(paths.shape[0]):
+            k = paths[kk]
+            psum = d1pthflwsum[path_idx0[k]]
+            p2stoout[path_up0[k]] += max(psum, 0.0) * dt
+        for kk in range(paths.shape[0]):
+            k = paths[kk]
+            psum = d1pthflwsum[path_idx0[k]]
+            p2stoout[path_dn0[k]] += max(-psum, 0.0) * dt
+
+        for ii in range(ncell):
+            i = cells[ii]
+            if p2stoout[i] > 1.0e-8:
+                d2rate[i] = min((rivsto[i, 0] + fldsto[i, 0]) / p2stoout[i], 1.0)
+
+        for ii in range(ncell):
+            i = cells[ii]
+            if i < nriv:
+                j = next0[i]
+                rate = d2rate[i] if rivout[i, 0] >= 0.0 else d2rate[j]
+                rivout[i, 0] = rivout[i, 0] * rate
+                fldout[i, 0] = fldout[i, 0] * rate
+        for ii in range(ncell):
+            i = cells[ii]
+            if i < nriv:
+                p2rivinf[next0[i]] += rivout[i, 0]
+        for ii in range(ncell):
+            i = cells[ii]
+            if i < nriv:
+                p2fldinf[next0[i]] += fldout[i, 0]
+        for ii in range(ncell):
+            i = cells[ii]
+            if i >= nriv:
+                rivout[i, 0] = rivout[i, 0] * d2rate[i]
+                fldout[i, 0] = fldout[i, 0] * d2rate[i]
+
+        for kk in range(paths.shape[0]):
+            k = paths[kk]
+            ipth = path_idx0[k]
+            rate_up = d2rate[path_up0[k]]
+            rate_dn = d2rate[path_dn0[k]]
+            for ilev in range(nlev):
+                flow = d1pthflw[ipth, ilev]
+                d1pthflw[ipth, ilev] = flow * rate_up if flow >= 0.0 else flow * rate_dn
+            flow = d1pthflwsum[ipth]
+            d1pthflwsum[ipth] = flow * rate_up if flow >= 0.0 else flow * rate_dn
+        for kk in range(paths.shape[0]):
+            k = paths[kk]
+            p2pthout[path_up0[k]] += d1pthflwsum[path_idx0[k]]
+        for kk in range(paths.shape[0]):
+            k = paths[kk]
+            p2pthout[path_dn0[k]] += -d1pthflwsum[path_idx0[k]]
+
+        for ii in range(ncell):
+            i = cells[ii]
+            rivinf[i, 0] = p2rivinf[i]
+            fldinf[i, 0] = p2fldinf[i]
+            pthout[i, 0] = p2pthout[i]
+
+        # ------------------------------------------------------------------------------------------------------------
+        # VARS_PRE: save value for next tstep
+        for ii in range(ncell):
+            i = cells[ii]
+            rivout_pre[i, 0] = rivout[i, 0]
+            rivdph_pre[i, 0] = rivdph[i, 0]
+            fldout_pre[i, 0] = fldout[i, 0]
+            fldsto_pre[i, 0] = fldsto[i, 0]
+
+        # ------------------------------------------------------------------------------------------------------------
+        # STONXT: storage in the next time step in FTCS diff. eq.
+        glbstopre = 0.0
+        glbrivinf = 0.0
+        glbrivout = 0.0
+        glbstonxt = 0.0
+        glbstonew = 0.0
+        for ii in range(ncell):
+            i = cells[ii]
+            if lrosplit:
+                gdwrtn[i, 0] = rofsub[i, 0]
+                gdwsto[i, 0] = 0.0
+            rivsto_old = rivsto[i, 0]
+            fldsto_old = fldsto[i, 0]
+            glbstopre += rivsto_old + fldsto_old
+            glbrivinf += (rivinf[i, 0] + fldinf[i, 0]) * dt
+            glbrivout += (rivout[i, 0] + fldout[i, 0] + pthout[i, 0]) * dt
+
+            rivsto_new = rivsto_old + rivinf[i, 0] * dt - rivout[i, 0] * dt
+            fldsto_new = fldsto_old
+            if rivsto_new < 0.0:
+                fldsto_new = fldsto_new + rivsto_new
+                rivsto_new = 0.0
+            fldsto_new = fldsto_new + fldinf[i, 0] * dt - fldout[i, 0] * dt - pthout[i, 0] * dt
+            if fldsto_new < 0.0:
+                rivsto_new = max(rivsto_new + fldsto_new, 0.0)
+                fldsto_new = 0.0
+            glbstonxt += rivsto_new + fldsto_new
+            outflw[i, 0] = rivout[i, 0] + fldout[i, 0]
+
+            droff = runoff[i, 0] + gdwrtn[i, 0]
+            rivsto_new = rivsto_new + droff * (1.0 - fldfrc[i, 0]) * dt
+            fldsto_new = fldsto_new + droff * fldfrc[i, 0] * dt
+            rivsto[i, 0] = rivsto_new
+            fldsto[i, 0] = fldsto_new
+            storge[i, 0] = rivsto_new + fldsto_new
+            glbstonew += rivsto_new + fldsto_new
+
+        # ------------------------------------------------------------------------------------------------------------
+        # FLDSTG: river and floodplain staging
+        glbstopre2 = 0.0
+        glbstonew2 = 0.0
+        for ii in range(ncell):
+            i = cells[ii]
+            pstoall = rivsto[i, 0] + fldsto[i, 0]
+            glbstopre2 += pstoall
+            if pstoall > rivstomax[i, 0]:
+                fldstg_flooded_cell_numba_cpu(
+                    i, rivsto, fldsto, rivdph, flddph, fldfrc, fldare, sfcelv, storge,
+                    rivelv, rivstomax, rivwth, rivlen, grarea, fldstomax, fldgrd, dfrcinc, nlfp,
+                )
+            else:
+                rivsto[i, 0] = pstoall
+                rivdph[i, 0] = max(pstoall / rivlen[i, 0] / rivwth[i, 0], 0.0)
+                fldsto[i, 0] = 0.0
+                flddph[i, 0] = 0.0
+                fldfrc[i, 0] = 0.0
+                fldare[i, 0] = 0.0
+                sfcelv[i, 0] = rivelv[i, 0] + rivdph[i, 0]
+                storge[i, 0] = pstoall
+            glbstonew2 += rivsto[i, 0] + fldsto[i, 0]
+
+        glbrivsto = 0.0
+        glbfldsto = 0.0
+        glbfldare = 0.0
+        for ii in range(ncell):
+            i = cells[ii]
+            glbrivsto += rivsto[i, 0]
+            glbfldsto += fldsto[i, 0]
+            glbfldare += fldare[i, 0]
+
+        # ------------------------------------------------------------------------------------------------------------
+        # AVEMAX_ADPSTP: averages and maximum within the adaptive time step
+        for ii in range(ncell):
+            i = cells[ii]
+            rivout_aavg[i, 0] += rivout[i, 0] * dt
+            fldout_aavg[i, 0] += fldout[i, 0] * dt
+            rivvel_aavg[i, 0] += rivvel[i, 0] * dt
+            outflw_aavg[i, 0] += outflw[i, 0] * dt
+            pthout_aavg[i, 0] = pthout_aavg[i, 0] + pthout[i, 0] * dt - pthinf[i, 0] * dt
+            gdwrtn_aavg[i, 0] += gdwrtn[i, 0] * dt
+            runoff_aavg[i, 0] += runoff[i, 0] * dt
+            rofsub_aavg[i, 0] += rofsub[i, 0] * dt
+            outflw_amax[i, 0] = max(outflw_amax[i, 0], abs(outflw[i, 0]))
+            rivdph_amax[i, 0] = max(rivdph_amax[i, 0], rivdph[i, 0])
+            storge_amax[i, 0] = max(storge_amax[i, 0], storge[i, 0])
+
+        glb[0] = glbstopre
+        glb[1] = glbrivinf
+        glb[2] = glbrivout
+        glb[3] = glbstonxt
+        glb[4] = glbstonew
+        glb[5] = glbstopre2
+        glb[6] = glbstonew2
+        glb[7] = glbrivsto
+        glb[8] = glbfldsto
+        glb[9] = glbfldare
+
+    @numba.njit(cache=True, fastmath=False, parallel=True)
+    def _update_stage_numba(
+        nseqmax, nseq, nriv, nlfp, next0,
+        cells, cell_ptr, paths, path_ptr, glb_chunk,
+        path_idx0, path_up0, path_dn0, d1pthflw, d1pthflw_pre, d1pthflwsum, d1pthflw_aavg,
+        rivelv, rivwth, rivlen, grarea, rivstomax, fldstomax, fldgrd,
+        rivsto, fldsto, rivdph, flddph, fldfrc, fldare, sfcelv, storge,
+        rivout, fldout, rivout_pre, fldout_pre, rivdph_pre, fldsto_pre, rivvel,
+        rivinf, fldinf, pthout, pthinf, outflw, runoff, rofsub, gdwrtn, gdwsto,
+        rivout_aavg, fldout_aavg, rivvel_aavg, outflw_aavg, pthout_aavg,
+        gdwrtn_aavg, runoff_aavg, rofsub_aavg, storge_amax, outflw_amax, rivdph_amax,
+        p2stoout, p2rivinf, p2fldinf, p2pthout, d2rate, glb,
+        dt, dfrcinc, lpthout, lrosplit,
+    ):
+        nchunk = cell_ptr.shape[0] - 1
+        nlev = d1pthflw.shape[1]
+
+        # INFLOW .. AVEMAX per basin chunk (one chunk == the serial cell order)
+        for c in numba.prange(nchunk):
+            _update_chunk_numba(
+                cells[cell_ptr[c]:cell_ptr[c + 1]], paths[path_ptr[c]:path_ptr[c + 1]], nriv, nlfp, next0,
+                path_idx0, path_up0, path_dn0, d1pthflw, d1pthflwsum,
+                rivelv, rivwth, rivlen, grarea, rivstomax, fldstomax, fldgrd,
+                rivsto, fldsto, rivdph, flddph, fldfrc, fldare, sfcelv, storge,
+                rivout, fldout, rivout_pre, fldout_pre, rivdph_pre, fldsto_pre, rivvel,
+                rivinf, fldinf, pthout, pthinf, outflw, runoff, rofsub, gdwrtn, gdwsto,
+                rivout_aavg, fldout_aavg, rivvel_aavg, outflw_aavg, pthout_aavg,
+                gdwrtn_aavg, runoff_aavg, rofsub_aavg, storge_amax, outflw_amax, rivdph_amax,
+                p2stoout, p2rivinf, p2fldinf, p2pthout, d2rate, glb_chunk[c],
+                dt, dfrcinc, lrosplit,
+            )
+
+        # cells beyond NSEQALL (padding up to NSEQMAX) and all bifurcation paths
+        for i in range(nseq, nseqmax):
+            rivout_pre[i, 0] = rivout[i, 0]
+            rivdph_pre[i, 0] = rivdph[i, 0]
+            fldout_pre[i, 0] = fldout[i, 0]
+            fldsto_pre[i, 0] = fldsto[i, 0]
+        if lpthout:
+            for ipth in range(d1pthflw.shape[0]):
+                for ilev in range(nlev):
+                    d1pthflw_pre[ipth, ilev] = d1pthflw[ipth, ilev]
+
+        # chunk partial sums in fixed chunk order: reproducible for any thread count
+        for k in range(glb.shape[0]):
+            glb[k] = 0.0
+        for c in range(nchunk):
+            for k in range(glb.shape[0]):
+                glb[k] += glb_chunk[c, k]
+        for i in range(nseq, nseqmax):
+            glb[7] += rivsto[i, 0]
+            glb[8] += fldsto[i, 0]
+            glb[9] += fldare[i, 0]
+
+        for i in range(nseq, nseqmax):
+            rivout_aavg[i, 0] += rivout[i, 0] * dt
+            fldout_aavg[i, 0] += fldout[i, 0] * dt
+            rivvel_aavg[i, 0] += rivvel[i, 0] * dt
+            outflw_aavg[i, 0] += outflw[i, 0] * dt
+            pthout_aavg[i, 0] = pthout_aavg[i, 0] + pthout[i, 0] * dt - pthinf[i, 0] * dt
+            gdwrtn_aavg[i, 0] += gdwrtn[i, 0] * dt
+            runoff_aavg[i, 0] += runoff[i, 0] * dt
+            rofsub_aavg[i, 0] += rofsub[i, 0] * dt
+            outflw_amax[i, 0] = max(outflw_amax[i, 0], abs(outflw[i, 0]))
+            rivdph_amax[i, 0] = max(rivdph_amax[i, 0], rivdph[i, 0])
+            storge_amax[i, 0] = max(storge_amax[i, 0], storge[i, 0])
+        if lpthout:
+            for ipth in range(d1pthflw.shape[0]):
+                for ilev in range(nlev):
+                    d1pthflw_aavg[ipth, ilev] += d1pthflw[ipth, ilev] * dt
+
+    @numba.njit(cache=True, fastmath=False, parallel=True)
+    def _cell_active_numba(
+        cells, cell_ptr, nriv, next0, pinned, skip, at_rest, hot, active, lrosplit,
+        rivsto, fldsto, storge, rivdph, rivdph_pre, flddph, fldfrc, fldare,
+        rivout, fldout, rivout_pre, fldout_pre, fldsto_pre, rivvel,
+        rivinf, fldinf, pthout, pthinf, outflw, runoff, rofsub, gdwrtn,
+    ):
+        """
+        LACTIVE: per-cell active set of one substep, parallel over the basin chunks.
+        A cell at rest is dry, without flow and without runoff (exact zeros). It is hot unless it was at rest at
+        the start of this and of the previous substep. A cell skipped in the last substep (skip[i]) still holds
+        the state it was found at rest with, so only its inputs are checked. Active are the hot cells, the
+        upstream cells of a hot cell (backwater), the bifurcation ends (pinned) and everything downstream of an
+        active cell, since the inflow pass writes to the downstream cell.
+        """
+        for ichunk in numba.prange(cell_ptr.shape[0] - 1):
+            for j in range(cell_ptr[ichunk], cell_ptr[ichunk + 1]):
+                i = cells[j]
+                if (runoff[i, 0] != 0.0 or gdwrtn[i, 0] != 0.0 or (lrosplit and rofsub[i, 0] != 0.0)
+                        or pthout[i, 0] != 0.0):
+                    rest = False
+                elif skip[i]:
+                    rest = True
+                else:
+                    rest = not (rivsto[i, 0] != 0.0 or fldsto[i, 0] != 0.0 or storge[i, 0] != 0.0
+                                or rivdph[i, 0] != 0.0 or rivdph_pre[i, 0] != 0.0 or flddph[i, 0] != 0.0
+                                or fldfrc[i, 0] != 0.0 or fldare[i, 0] != 0.0
+                                or rivout[i, 0] != 0.0 or fldout[i, 0] != 0.0 or rivout_pre[i, 0] != 0.0
+                                or fldout_pre[i, 0] != 0.0 or fldsto_pre[i, 0] != 0.0 or rivvel[i, 0] != 0.0
+                                or rivinf[i, 0] != 0.0 or fldinf[i, 0] != 0.0
+                                or pthinf[i, 0] != 0.0 or outflw[i, 0] != 0.0)
+                hot[i] = not (rest and at_rest[i])
+                at_rest[i] = rest
+                active[i] = hot[i] or pinned[i]
+            # ! cells ascend inside a chunk and drain to a later cell, so active[i] is final when i is reached
+            for j in range(cell_ptr[ichunk], cell_ptr[ichunk + 1]):
+                i = cells[j]
+                if i < nriv:
+                    if hot[next0[i]]:
+                        active[i] = True
+                    if active[i]:
+                        active[next0[i]] = True
+
+    @numba.njit(cache=True, fastmath=False)
+    def _group_dtmin_numba(nseq, nriv, gid, i2mask, rivdph, nxtdst, pcadp, pgrv, pdstmth, dtmin):
+        """CALC_ADPSTP CFL limit, reduced to the minimum of every basin group."""
+        for g in range(dtmin.shape[0]):
+            dtmin[g] = np.inf
+        for i in range(nseq):
+            if i2mask[i] != 0:
+                continue
+            ddph = max(rivdph[i, 0], 0.01)
+            ddst = nxtdst[i, 0] if i < nriv else pdstmth
+            dt_cfl = pcadp * ddst * (pgrv * ddph) ** (-0.5)
+            if dt_cfl < dtmin[gid[i]]:
+                dtmin[gid[i]] = dt_cfl
+else:
+    _update_stage_numba = None
+    _cell_active_numba = None
+    _group_dtmin_numba = None
+
+
+def _basin_groups(nseq, nriv, next0, path_up0, path_dn0):
+    """
+    Basin label (0-based mouth cell) of every 1D cell; basins joined by a bifurcation channel share a label.
+    """
+    # ! pointer jumping: every cell ends at its river mouth
+    root = np.arange(nseq, dtype=np.int64)
+    root[:nriv] = next0
+    while True:
+        jump = root[root]
+        if np.array_equal(jump, root):
+            break
+        root = jump
+
+    parent = np.arange(nseq, dtype=np.int64)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for up, dn in zip(root[path_up0].tolist(), root[path_dn0].tolist()):
+        ru, rd = find(up), find(dn)
+        if ru != rd:
+            parent[max(ru, rd)] = min(ru, rd)
+    mouths = np.unique(root)
+    group = np.arange(nseq, dtype=np.int64)
+    group[mouths] = np.array([find(m) for m in mouths.tolist()], dtype=np.int64)
+    return group[root]
+
+
+def _chunk_ptr(chunk_of_item, nchunk):
+    ptr = np.zeros(nchunk + 1, dtype=np.int64)
+    ptr[1:] = np.cumsum(np.bincount(chunk_of_item, minlength=nchunk))
+    return ptr
+
+
+def _basin_chunks(nseq, nriv, next0, path_up0, path_dn0, nchunk):
+    """
+    Group the 1D cells into ``nchunk`` sets of whole basins for the parallel update stage.
+
+    Basins joined by a bifurcation channel are merged. Cells keep their ascending sequence order inside a
+    chunk, so each chunk walks memory forward and ``nchunk == 1`` is the plain serial order.
+
+    The chunks are index lists over the arrays in the global sequence order; the arrays are not permuted into
+    basin-contiguous order. That order (rivers upstream-first, then mouths) is shared with I1SEQX/I1SEQY, the
+    restart and output vectors, the bifurcation tables and every other backend, which all slice [:NSEQRIV] for
+    rivers. Chunks of interleaved basins can therefore share cache lines at their boundaries.
+    """
+    npath = path_up0.shape[0]
+    if nchunk <= 1 or nseq == 0:
+        return (np.arange(nseq, dtype=np.int64), np.array([0, nseq], dtype=np.int64),
+                np.arange(npath, dtype=np.int64), np.array([0, npath], dtype=np.int64),
+                np.zeros(nseq, dtype=np.int64))
+
+    group = _basin_groups(nseq, nriv, next0, path_up0, path_dn0)
+    chunk_of_group, _ = pack_largest_first(np.bincount(group, minlength=nseq).tolist(), nchunk)
+    chunk_of_cell = np.asarray(chunk_of_group, dtype=np.int64)[group]
+    cells = np.ascontiguousarray(np.argsort(chunk_of_cell, kind="stable").astype(np.int64))
+    chunk_of_path = chunk_of_cell[path_up0]
+    paths = np.ascontiguousarray(np.argsort(chunk_of_path, kind="stable").astype(np.int64))
+    return cells, _chunk_ptr(chunk_of_cell, nchunk), paths, _chunk_ptr(chunk_of_path, nchunk), chunk_of_cell
+
+
+def _get_substep_cpu_cache(CC_NMLIST, CM_NMLIST, CC_VARS, device):
+    """Zero-copy numpy views and scratch vectors for the fused CPU substep."""
+    nseqmax = int(CM_NMLIST.NSEQMAX)
+    nseq = int(CM_NMLIST.NSEQALL)
+    nriv = int(CM_NMLIST.NSEQRIV)
+    lpthout = bool(getattr(CC_NMLIST, "LPTHOUT", False))
+    npth = int(getattr(CM_NMLIST, "NPTHOUT", 0)) if lpthout else 0
+
+    tensors = {
+        "rivelv": CM_NMLIST.D2RIVELV, "rivwth": CM_NMLIST.D2RIVWTH, "rivhgt": CM_NMLIST.D2RIVHGT,
+        "rivman": CM_NMLIST.D2RIVMAN, "rivlen": CM_NMLIST.D2RIVLEN, "elevtn": CM_NMLIST.D2ELEVTN,
+        "nxtdst": CM_NMLIST.D2NXTDST, "dwnelv": CM_NMLIST.D2DWNELV, "grarea": CM_NMLIST.D2GRAREA,
+        "rivstomax": CM_NMLIST.D2RIVSTOMAX, "fldstomax": CM_NMLIST.D2FLDSTOMAX, "fldgrd": CM_NMLIST.D2FLDGRD,
+        "rivsto": CC_VARS.P2RIVSTO, "fldsto": CC_VARS.P2FLDSTO, "rivdph": CC_VARS.D2RIVDPH,
+        "rivdph_pre": CC_VARS.D2RIVDPH_PRE, "flddph": CC_VARS.D2FLDDPH, "flddph_pre": CC_VARS.D2FLDDPH_PRE,
+        "fldfrc": CC_VARS.D2FLDFRC, "fldare": CC_VARS.D2FLDARE, "sfcelv": CC_VARS.D2SFCELV,
+        "sfcelv_pre": CC_VARS.D2SFCELV_PRE, "dwnelv_pre": CC_VARS.D2DWNELV_PRE, "storge": CC_VARS.D2STORGE,
+        "rivout": CC_VARS.D2RIVOUT, "fldout": CC_VARS.D2FLDOUT, "rivout_pre": CC_VARS.D2RIVOUT_PRE,
+        "fldout_pre": CC_VARS.D2FLDOUT_PRE, "fldsto_pre": CC_VARS.D2FLDSTO_PRE, "rivvel": CC_VARS.D2RIVVEL,
+        "rivinf": CC_VARS.D2RIVINF, "fldinf": CC_VARS.D2FLDINF, "pthout": CC_VARS.D2PTHOUT,
+        "pthinf": CC_VARS.D2PTHINF, "outflw": CC_VARS.D2OUTFLW, "runoff": CC_VARS.D2RUNOFF,
+        "rofsub": CC_VARS.D2ROFSUB, "gdwrtn": CC_VARS.D2GDWRTN, "gdwsto": CC_VARS.P2GDWSTO,
+        "rivout_aavg": CC_VARS.D2RIVOUT_aAVG, "fldout_aavg": CC_VARS.D2FLDOUT_aAVG,
+        "rivvel_aavg": CC_VARS.D2RIVVEL_aAVG, "outflw_aavg": CC_VARS.D2OUTFLW_aAVG,
+        "pthout_aavg": CC_VARS.D2PTHOUT_aAVG, "gdwrtn_aavg": CC_VARS.D2GDWRTN_aAVG,
+        "runoff_aavg": CC_VARS.D2RUNOFF_aAVG, "rofsub_aavg": CC_VARS.D2ROFSUB_aAVG,
+        "storge_amax": CC_VARS.D2STORGE_aMAX, "outflw_amax": CC_VARS.D2OUTFLW_aMAX,
+        "rivdph_amax": CC_VARS.D2RIVDPH_aMAX,
+        "d1pthflw": CC_VARS.D1PTHFLW, "d1pthflw_pre": CC_VARS.D1PTHFLW_PRE,
+        "d1pthflwsum": CC_VARS.D1PTHFLWSUM,
+    }
+    raws = {name: field.raw() for name, field in tensors.items()}
+    # D1PTHFLW_aAVG only exists with LPTHOUT; the kernel skips it otherwise.
+    if lpthout:
+        raws["d1pthflw_aavg"] = CC_VARS.D1PTHFLW_aAVG.raw()
+    else:
+        raws["d1pthflw_aavg"] = torch.zeros((0, 1), dtype=raws["d1pthflw"].dtype)
+
+    # Restart and re-initialisation rebind state tensors, so the key tracks tensor identity.
+    nchunk = max(int(getattr(CC_NMLIST, "NCPUCHUNK", 1)), 1)
+    key = (
+        id(CM_NMLIST), id(CC_VARS), nseqmax, nseq, nriv, npth, lpthout, nchunk,
+        tuple(id(tensor) for tensor in raws.values()),
+    )
+    cache = getattr(CC_NMLIST, "_SUBSTEP_CPU_CACHE", None)
+    if cache is not None and cache.get("key") == key:
+        return cache
+
+    views = {
+        name: (tensor.detach().numpy() if tensor.numel() == 0 else _require_contiguous_cpu_numpy(name, tensor))
+        for name, tensor in raws.items()
+    }
+
+    next0 = np.zeros(0, dtype=np.int64)
+    if nriv > 0:
+        next0 = np.ascontiguousarray(CM_NMLIST.I1NEXT.raw()[:nriv].detach().cpu().numpy().astype(np.int64) - 1)
+        if np.any((next0 < 0) | (next0 >= nseq)):
+            raise RuntimeError(
+                "Fused CPU substep requires valid downstream sequence IDs for all river cells; "
+                "invalid topology was detected."
+            )
+
+    path_idx0 = np.zeros(0, dtype=np.int64)
+    path_up0 = np.zeros(0, dtype=np.int64)
+    path_dn0 = np.zeros(0, dtype=np.int64)
+    if npth > 0:
+        iseqp1 = CM_NMLIST.PTH_UPST.raw()[:npth].detach().cpu().numpy().astype(np.int64)
+        jseqp1 = CM_NMLIST.PTH_DOWN.raw()[:npth].detach().cpu().numpy().astype(np.int64)
+        valid = (iseqp1 > 0) & (jseqp1 > 0) & (iseqp1 <= nseq) & (jseqp1 <= nseq)
+        mask_raw = CM_NMLIST.I2MASK.raw()[:, 0].detach().cpu().numpy()
+        cand = np.nonzero(valid)[0]
+        valid[cand] = (mask_raw[iseqp1[cand] - 1] <= 0) & (mask_raw[jseqp1[cand] - 1] <= 0)
+        path_idx0 = np.ascontiguousarray(np.nonzero(valid)[0].astype(np.int64))
+        path_up0 = np.ascontiguousarray(iseqp1[path_idx0] - 1)
+        path_dn0 = np.ascontiguousarray(jseqp1[path_idx0] - 1)
+
+    cells, cell_ptr, paths, path_ptr, chunk_of_cell = _basin_chunks(nseq, nriv, next0, path_up0, path_dn0, nchunk)
+
+    cache = {
+        "key": key,
+        "nseqmax": nseqmax,
+        "nseq": nseq,
+        "nriv": nriv,
+        "views": views,
+        "next0": next0,
+        "path_idx0": path_idx0,
+        "path_up0": path_up0,
+        "path_dn0": path_dn0,
+        "cells": cells,
+        "cell_ptr": cell_ptr,
+        "paths": paths,
+        "path_ptr": path_ptr,
+        "chunk_of_cell": chunk_of_cell,
+        "glb_chunk": np.zeros((nchunk, len(_GLB_NAMES)), dtype=np.float64),
+        "p2stoout": np.zeros(nseq, dtype=np.float64),
+        "p2rivinf": np.zeros(nseq, dtype=np.float64),
+        "p2fldinf": np.zeros(nseq, dtype=np.float64),
+        "p2pthout": np.zeros(nseq, dtype=np.float64),
+        "d2rate": np.ones(nseq, dtype=np.float64),
+        "glb": np.zeros(len(_GLB_NAMES), dtype=np.float64),
+    }
+    CC_NMLIST._SUBSTEP_CPU_CACHE = cache
+    return cache
+
+
+def _run_outflw_stage(cache, CC_NMLIST, dt, cells=None, cell_ptr=None):
+    v = cache["views"]
+    args = (
+        v["rivelv"], v["rivwth"], v["rivhgt"], v["rivman"], v["rivlen"], v["elevtn"], v["nxtdst"], v["dwnelv"],
+        v["rivdph"], v["rivdph_pre"], v["sfcelv"], v["sfcelv_pre"], v["flddph"], v["flddph_pre"], v["dwnelv_pre"],
+        v["rivout"], v["fldout"], v["rivout_pre"], v["fldout_pre"], v["rivvel"],
+        v["fldsto"], v["fldsto_pre"], v["storge"],
+        dt, float(CC_NMLIST.PGRV), float(CC_NMLIST.PMANFLD), float(CC_NMLIST.PDSTMTH),
+        bool(CC_NMLIST.LFLDOUT),
+    )
+    if cells is None:
+        outflw_numba_cpu(cache["nseq"], cache["nriv"], cache["next0"], *args)
+    else:
+        outflw_chunks_numba_cpu(cells, cell_ptr, cache["nriv"], cache["next0"], *args)
+    if not CC_NMLIST.LFLDOUT:                                   # !! OPTION: no high-water channel flow
+        v["fldout"].fill(0.0)
+        v["fldout_pre"].fill(0.0)
+
+
+def _run_update_stage(cache, CC_NMLIST, CM_NMLIST, dt, cells=None, cell_ptr=None, paths=None, path_ptr=None):
+    v = cache["views"]
+    if cells is None:
+        nseqmax, lpthout = cache["nseqmax"], bool(CC_NMLIST.LPTHOUT)
+        cells, cell_ptr, paths, path_ptr = cache["cells"], cache["cell_ptr"], cache["paths"], cache["path_ptr"]
+    elif paths is not None:
+        # !! active set (LACTIVE): same chunks in the same order, padding cells and path copies as in the full pass
+        nseqmax, lpthout = cache["nseqmax"], bool(CC_NMLIST.LPTHOUT)
+    else:
+        # !! subset of basins (multi-rate class): no padding cells, no bifurcation paths
+        nseqmax, lpthout = cache["nseq"], False
+        paths, path_ptr = cache["paths"][:0], np.zeros_like(cell_ptr)
+    _update_stage_numba(
+        nseqmax, cache["nseq"], cache["nriv"], int(CC_NMLIST.NLFP), cache["next0"],
+        cells, cell_ptr, paths, path_ptr, cache["glb_chunk"],
+        cache["path_idx0"], cache["path_up0"], cache["path_dn0"],
+        v["d1pthflw"], v["d1pthflw_pre"], v["d1pthflwsum"], v["d1pthflw_aavg"],
+        v["rivelv"], v["rivwth"], v["rivlen"], v["grarea"], v["rivstomax"], v["fldstomax"], v["fldgrd"],
+        v["rivsto"], v["fldsto"], v["rivdph"], v["flddph"], v["fldfrc"], v["fldare"], v["sfcelv"], v["storge"],
+        v["rivout"], v["fldout"], v["rivout_pre"], v["fldout_pre"], v["rivdph_pre"], v["fldsto_pre"], v["rivvel"],
+        v["rivinf"], v["fldinf"], v["pthout"], v["pthinf"], v["outflw"], v["runoff"], v["rofsub"],
+        v["gdwrtn"], v["gdwsto"],
+        v["rivout_aavg"], v["fldout_aavg"], v["rivvel_aavg"], v["outflw_aavg"], v["pthout_aavg"],
+        v["gdwrtn_aavg"], v["runoff_aavg"], v["rofsub_aavg"], v["storge_amax"], v["outflw_amax"], v["rivdph_amax"],
+        cache["p2stoout"], cache["p2rivinf"], cache["p2fldinf"], cache["p2pthout"], cache["d2rate"], cache["glb"],
+        dt, float(CM_NMLIST.DFRCINC), lpthout, bool(CC_NMLIST.LROSPLIT),
+    )
+
+
+def _check_substep_cpu(CC_NMLIST, device):
+    if torch.device(device).type != "cpu":
+        raise RuntimeError("Fused CPU substep is CPU-only; run with device=cpu.")
+    if _update_stage_numba is None:
+        raise RuntimeError("Fused CPU substep (LCPUFUSED) requires numba, but numba is not available.")
+    if CC_NMLIST.LGDWDLY:
+        raise RuntimeError("LGDWDLY is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
+    if CC_NMLIST.LWEVAP:
+        raise RuntimeError("LWEVAP is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
+    if CC_NMLIST.LSLOPEMOUTH:
+        raise RuntimeError("LSLOPEMOUTH is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
+
+
+def CMF_CALC_SUBSTEP_CPU(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype):
+    """
+    One adaptive substep: OUTFLW -> (PTHOUT) -> INFLOW -> VARS_PRE -> STONXT -> FLDSTG -> AVEMAX_ADPSTP.
+    """
+    _check_substep_cpu(CC_NMLIST, device)
+
+    cache = _get_substep_cpu_cache(CC_NMLIST, CM_NMLIST, CC_VARS, device)
+    dt = float(CC_NMLIST.DT)
+
+    cells = cell_ptr = paths = path_ptr = None
+    if CC_NMLIST.LACTIVE:
+        cells, cell_ptr, paths, path_ptr = _active_set(cache, CC_NMLIST, CM_NMLIST)
+    _run_outflw_stage(cache, CC_NMLIST, dt, cells, cell_ptr)
+    if CC_NMLIST.LPTHOUT:
+        CC_VARS = CMF_CALC_PTHOUT(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype)
+    _run_update_stage(cache, CC_NMLIST, CM_NMLIST, dt, cells, cell_ptr, paths, path_ptr)
+
+    glb = cache["glb"]
+    for idx, name in enumerate(_GLB_NAMES):
+        setattr(CC_VARS, name, torch.tensor(glb[idx], dtype=Datatype.JPRD, device=device))
+    CC_VARS.NADD_adp = CC_VARS.NADD_adp + CC_NMLIST.DT
+
+    return CC_VARS
+
+
+def _get_active_cache(cache, CM_NMLIST):
+    act = cache.get("active")
+    if act is not None:
+        return act
+    nseq = cache["nseq"]
+    pinned = np.zeros(nseq, dtype=np.bool_)
+    pinned[cache["path_up0"]] = True
+    pinned[cache["path_dn0"]] = True
+    act = {
+        "pinned": pinned,
+        "at_rest": np.zeros(nseq, dtype=np.bool_),              # !! nothing is skipped in the first substep
+        "hot": np.zeros(nseq, dtype=np.bool_),
+        "active": np.zeros(nseq, dtype=np.bool_),
+        "skip": np.zeros(nseq, dtype=np.bool_),
+        "sel": None,
+    }
+    cache["active"] = act
+    return act
+
+
+def _active_set(cache, CC_NMLIST, CM_NMLIST):
+    """
+    LACTIVE: compacted index of the active cells in chunk order (cells, cell_ptr, paths, path_ptr), see
+    _cell_active_numba. A cell is skipped when it and its neighbours were at rest at the start of this and of
+    the previous substep: the previous substep then ran (or was skipped) from the same local state and left it
+    unchanged, so this one does the same. Skipped cells would only add exact zeros to the inflow of active
+    cells, the chunk sums and the AVEMAX accumulators. All bifurcation paths are kept, with both ends active.
+    The compacted index is rebuilt only when the active set changes.
+    """
+    act = _get_active_cache(cache, CM_NMLIST)
+    v = cache["views"]
+    _cell_active_numba(
+        cache["cells"], cache["cell_ptr"], cache["nriv"], cache["next0"], act["pinned"], act["skip"],
+        act["at_rest"], act["hot"], act["active"], bool(CC_NMLIST.LROSPLIT),
+        v["rivsto"], v["fldsto"], v["storge"], v["rivdph"], v["rivdph_pre"], v["flddph"], v["fldfrc"], v["fldare"],
+        v["rivout"], v["fldout"], v["rivout_pre"], v["fldout_pre"], v["fldsto_pre"], v["rivvel"],
+        v["rivinf"], v["fldinf"], v["pthout"], v["pthinf"], v["outflw"], v["runoff"], v["rofsub"], v["gdwrtn"],
+    )
+    skip = ~act["active"]
+    if act["sel"] is None or not np.array_equal(skip, act["skip"]):
+        act["skip"][:] = skip
+        nchunk = cache["cell_ptr"].shape[0] - 1
+        cells = np.ascontiguousarray(cache["cells"][act["active"][cache["cells"]]])
+        act["sel"] = (
+            cells, _chunk_ptr(cache["chunk_of_cell"][cells], nchunk), cache["paths"], cache["path_ptr"],
+        )
+    return act["sel"]
+
+
+def _get_multirate_cache(cache, CM_NMLIST):
+    lts = cache.get("multirate")
+    if lts is not None:
+        return lts
+    nseq = cache["nseq"]
+    group = _basin_groups(nseq, cache["nriv"], cache["next0"], cache["path_up0"], cache["path_dn0"])
+    _, gid = np.unique(group, return_inverse=True)
+    gid = np.ascontiguousarray(gid.astype(np.int64))
+    lts = {
+        "gid": gid,
+        "dtmin": np.zeros(int(gid.max()) + 1 if nseq > 0 else 0, dtype=np.float64),
+        "i2mask": np.ascontiguousarray(CM_NMLIST.I2MASK.raw()[:nseq, 0].detach().cpu().numpy()),
+    }
+    cache["multirate"] = lts
+    return lts
+
+
+def CMF_CALC_SUBSTEP_CPU_MULTIRATE(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype, DT_DEF):
+    """
+    Multi-rate adaptive outer step (LMULTIRATE). Each basin group takes NT = 2**k substeps of DT_DEF/NT, with
+    k the smallest power of two meeting its own CALC_ADPSTP CFL limit, instead of every cell taking the global NT.
+
+    No water crosses a basin boundary, so classes need no flux synchronisation and each cell's budget closes
+    exactly as in the single-rate scheme. In exchange a basin group runs entirely at the rate of its most
+    restrictive cell, so large basins get no speed-up; only domains with many small basins do. The P0GLB terms
+    describe the whole outer step (storage at its start and end, summed fluxes), so CALC_WATBAL is called once
+    per outer step.
+    Returns CC_VARS, the largest NT and the number of cells per class.
+    """
+    _check_substep_cpu(CC_NMLIST, device)
+    if CC_NMLIST.LPTHOUT:
+        raise RuntimeError("LMULTIRATE with LPTHOUT is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
+
+    cache = _get_substep_cpu_cache(CC_NMLIST, CM_NMLIST, CC_VARS, device)
+    lts = _get_multirate_cache(cache, CM_NMLIST)
+    v = cache["views"]
+    DT_DEF = float(DT_DEF)
+
+    _group_dtmin_numba(cache["nseq"], cache["nriv"], lts["gid"], lts["i2mask"], v["rivdph"], v["nxtdst"],
+                       float(CC_NMLIST.PCADP), float(CC_NMLIST.PGRV), float(CC_NMLIST.PDSTMTH), lts["dtmin"])
+    with np.errstate(divide="ignore"):
+        nt_group = np.floor(DT_DEF / lts["dtmin"] - 0.01).astype(np.int64) + 1      # !! NT rule of CALC_ADPSTP
+    k_group = np.ceil(np.log2(np.maximum(nt_group, 1))).astype(np.int64)
+    k_cell = k_group[lts["gid"]]
+
+    cells = cache["cells"]
+    nchunk = cache["cell_ptr"].shape[0] - 1
+    glb = cache["glb"]
+    stopre = rivinf = rivout = rof = stonew = err2 = stonew2 = rivsto = fldsto = fldare = 0.0
+    ncell_class = {}
+    for k in np.unique(k_cell).tolist():
+        sel = np.ascontiguousarray(cells[k_cell[cells] == k])
+        sel_ptr = _chunk_ptr(cache["chunk_of_cell"][sel], nchunk)
+        nt = 1 << k
+        dt = DT_DEF / nt
+        ncell_class[nt] = sel.shape[0]
+        for it in range(nt):
+            _run_outflw_stage(cache, CC_NMLIST, dt, sel, sel_ptr)
+            _run_update_stage(cache, CC_NMLIST, CM_NMLIST, dt, sel, sel_ptr)
+            if it == 0:
+                stopre += glb[0]
+            rivinf += glb[1]
+            rivout += glb[2]
+            rof += glb[4] - glb[3]                  # !! runoff added in this substep
+            err2 += glb[5] - glb[6]
+        stonew += glb[4]
+        stonew2 += glb[6]
+        rivsto += glb[7]
+        fldsto += glb[8]
+        fldare += glb[9]
+
+    outer = {
+        "P0GLBSTOPRE": stopre, "P0GLBRIVINF": rivinf, "P0GLBRIVOUT": rivout,
+        "P0GLBSTONXT": stonew - rof, "P0GLBSTONEW": stonew,
+        "P0GLBSTOPRE2": stonew2 + err2, "P0GLBSTONEW2": stonew2,
+        "P0GLBRIVSTO": rivsto, "P0GLBFLDSTO": fldsto, "P0GLBFLDARE": fldare,
+    }
+    for name in _GLB_NAMES:
+        setattr(CC_VARS, name, torch.tensor(outer[name], dtype=Datatype.JPRD, device=device))
+    CC_VARS.NADD_adp = CC_VARS.NADD_adp + DT_DEF
+
+    return CC_VARS, max(ncell_class) if ncell_class else 1, ncell_class
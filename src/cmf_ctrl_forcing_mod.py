@@ -21,19 +21,13 @@ import re
 import torch
 import numpy as np
 from fortran_tensor_2D import Ftensor_2D
+from cmf_forcing_prefetch_mod import CMF_FORCING_BINREADER
+from cmf_forcing_cdf_mod import CMF_FORCING_CDFREADER, CDF_SPLIT, CDF_FILESTART, CDF_FILENAME
 
 os.environ['PYTHONWARNINGS']='ignore::FutureWarning'
 os.environ['PYTHONWARNINGS']='ignore::RuntimeWarning'
 
 
-def _netcdf_dataset(*args, **kwargs):
-    try:
-        from netCDF4 import Dataset
-    except ModuleNotFoundError as exc:
-        raise RuntimeError("NetCDF forcing requires the netCDF4 Python package.") from exc
-    return Dataset(*args, **kwargs)
-
-
 class RofCdf_Class:
     def __init__(self):
         self.CNAME: str = ""
@@ -60,11 +54,20 @@ class CMF_FORCING_NMLIST_MOD:
         self.CSUBDIR                =                   "./runoff/"         # !! Forcing: sub-surface runoff directory
         self.CSUBPRE                =                   "Rsub____"          # !! Forcing: sub-surface runoff prefix
         self.CSUBSUF                =                   ".one"              # !! Forcing: sub-surface runoff suffix
+        self.NINPPREF               =                   0                   # !! plain binary: records prefetched on a background thread (0: synchronous)
+        self.FRCBIN                 =                   None                # !! memory-mapped plain binary reader (CMF_FORCING_BINREADER)
         #！  netCDF Forcing
         self.CROFCDF                =                   "NONE"              # !! Netcdf forcing file file
         self.CVNTIME                =                   "time"              # !! Netcdf forcing file file
         self.CVNROF                 =                   "runoff"            # !! Netcdf VARNAME of time dimention
         self.CVNSUB                 =                   "NONE"              # !! NetCDF VARNAME of sub-surface runoff.
+        self.NCDFBLK                =                   1                   # !! NetCDF records per read (look-ahead buffer, rounded up to the time chunk)
+        self.FRCCDF                 =                   None                # !! NetCDF reader with open datasets (CMF_FORCING_CDFREADER)
+        #！  input grid extent for CONV_RESOL (None: same as the map, WEST/EAST/SOUTH/NORTH)
+        self.WESTIN                 =                   None                # !! western  edge of the input grid
+        self.EASTIN                 =                   None                # !! eastern  edge of the input grid
+        self.SOUTHIN                =                   None                # !! southern edge of the input grid
+        self.NORTHIN                =                   None                # !! northern edge of the input grid
         if  CC_NMLIST.LROSPLIT:
             self.CVNROF             =                   "Qs"
             self.CVNSUB             =                   "Qsb"
@@ -85,6 +88,9 @@ class CMF_FORCING_NMLIST_MOD:
         self.INPX_TyPe              =                   Datatype.JPIM                # !! INPUT GRID XIN
         self.INPY_TyPe              =                   Datatype.JPIM                # !! INPUT GRID YIN
         self.INPA_TyPe              =                   Datatype.JPRB                # !! INPUT AREA
+        self.INPCSR                 =                   None                         # !! input matrix as CSR operator (NSEQALL, NXIN*NYIN)
+        self.INPBOX                 =                   None                         # !! input grid box read from file (IX0, IX1, IY0, IY1), 0-based half-open
+        self.INPCNV                 =                   None                         # !! CONV_RESOL gather index & weights (no input matrix)
 
         #! input matrix Inverse
         self.INPXI_TyPe              =                   Datatype.JPIM                # !! OUTPUT GRID XOUT
@@ -123,11 +129,18 @@ class CMF_FORCING_NMLIST_MOD:
         self.CSUBDIR                =                   config['CSUBDIR']      if 'CSUBDIR'  in config  else self.CSUBDIR
         self.CSUBPRE                =                   config['CSUBPRE']      if 'CSUBPRE'  in config  else self.CSUBPRE
         self.CSUBSUF                =                   config['CSUBSUF']      if 'CSUBSUF'  in config  else self.CSUBSUF
+        self.NINPPREF               =                   config['NINPPREF']     if 'NINPPREF' in config  else self.NINPPREF
         #！  netCDF Forcing
         self.CROFCDF                =                   config['CROFCDF']      if 'CROFCDF'  in config  else self.CROFCDF
         self.CVNTIME                =                   config['CVNTIME']      if 'CVNTIME'  in config  else self.CVNTIME
         self.CVNROF                 =                   config['CVNROF']       if 'CVNROF'   in config  else self.CVNROF
         self.CVNSUB                 =                   config['CVNSUB']       if 'CVNSUB'   in config  else self.CVNSUB
+        self.NCDFBLK                =                   config['NCDFBLK']      if 'NCDFBLK'  in config  else self.NCDFBLK
+        #！  input grid extent (CONV_RESOL)
+        self.WESTIN                 =                   config['WESTIN']       if 'WESTIN'   in config  else self.WESTIN
+        self.EASTIN                 =                   config['EASTIN']       if 'EASTIN'   in config  else self.EASTIN
+        self.SOUTHIN                =                   config['SOUTHIN']      if 'SOUTHIN'  in config  else self.SOUTHIN
+        self.NORTHIN                =                   config['NORTHIN']      if 'NORTHIN'  in config  else self.NORTHIN
 
         self.SYEARIN                =                   config['SYEARIN']      if 'SYEARIN'  in config  else self.SYEARIN
         self.SMONIN                 =                   config['SMONIN']       if 'SMONIN'   in config  else self.SMONIN
@@ -169,6 +182,7 @@ class CMF_FORCING_NMLIST_MOD:
                 log_file.write(f"CROFPRE            {self.CROFPRE.strip()}\n")
                 log_file.write(f"CROFSUF            {self.CROFSUF.strip()}\n")
             if not self.LINPCDF:                                        #   !! plain binary
+                log_file.write(f"NINPPREF           {self.NINPPREF}\n")
                 if CC_NMLIST.LROSPLIT:
                     log_file.write(f"CROFDIR            {self.CROFDIR.strip()}\n")
                     log_file.write(f"CROFPRE            {self.CROFPRE.strip()}\n")
@@ -179,15 +193,18 @@ class CMF_FORCING_NMLIST_MOD:
                     log_file.write(f"SYEARIN, SMONIN, SDAYIN, SHOURIN:          {self.SYEARIN, self.SMONIN, self.SDAYIN, self.SHOURIN:}\n")
                 log_file.write(f"CVNTIME                    {self.CVNTIME.strip()}\n")
                 log_file.write(f"CVNROF                     {self.CVNROF.strip()}\n")
+                log_file.write(f"NCDFBLK                    {self.NCDFBLK}\n")
                 if CC_NMLIST.LROSPLIT:
                     log_file.write(f"CVNSUB             {self.CVNSUB.strip()}\n")
+            if not self.LINTERP and self.WESTIN is not None:
+                log_file.write(f"WESTIN,EASTIN,NORTHIN,SOUTHIN          {self.WESTIN},    {self.EASTIN},    {self.NORTHIN},   {self.SOUTHIN}\n")
             if self.LINPEND:
                 log_file.write(f"LINPEND         {self.LINPEND.strip()}\n")
         # --------------------------------------------------------------------------------------------------------------
         # !*** 4. modify base date (shared for KMIN)
         if not self.LINPDAY:
             if self.SYEARIN > 0:
-                CT_NMLIST.YYYY0        =           torch.minimum(CT_NMLIST.YYYY0,torch.tensor(self.SYEARIN))
+                CT_NMLIST.YYYY0        =           min(CT_NMLIST.YYYY0, int(self.SYEARIN))
         with open(log_filename, 'a') as log_file:
             log_file.write(f"CMF::FORCING_NMLIST: end\n")
             log_file.flush()
@@ -245,7 +262,142 @@ class CMF_FORCING_NMLIST_MOD:
             return
         # --------------------------------------------------------------------------------------------------------------
         # --------------------------------------------------------------------------------------------------------------
+        def CMF_INPMAT_INIT_CSR(CC_NMLIST, CM_NMLIST, log_filename, device, Datatype):
+            """
+            ! input matrix as one (NSEQALL, NXIN*NYIN) CSR operator, weights INPA/DROFUNIT
+            ! columns: flattened (IXIN-1)*NYIN + (IYIN-1) of the input grid; built once, used by ROFF_INTERP
+            """
+            NSEQALL         =       int(CM_NMLIST.NSEQALL)
+            IXIN            =       self.INPX.raw()[:NSEQALL, :].to(dtype=torch.long)
+            IYIN            =       self.INPY.raw()[:NSEQALL, :].to(dtype=torch.long)
+            INPA            =       self.INPA.raw()[:NSEQALL, :]
+
+            cond_out        =       (IXIN > 0) & ((IXIN > CC_NMLIST.NXIN) | (IYIN > CC_NMLIST.NYIN))
+            cond_valid      =       (IXIN > 0) & (IYIN > 0) & ~cond_out & (INPA != 0)
+
+            if bool(cond_out.any()):
+                ISEQ_bad, INPI_bad = cond_out.nonzero(as_tuple=True)
+                with open(log_filename, 'a') as log_file:
+                    for i in range(ISEQ_bad.numel()):
+                        log_file.write(f"error")
+                        log_file.write(f"XXX  {int(ISEQ_bad[i]) + 1} {int(INPI_bad[i]) + 1} "
+                                       f"{int(IXIN[ISEQ_bad[i], INPI_bad[i]])} {int(IYIN[ISEQ_bad[i], INPI_bad[i]])}\n")
+                    log_file.flush()
+                    log_file.close()
+
+            ROWS, COLS      =       cond_valid.nonzero(as_tuple=True)                 # !! row-major: ROWS already sorted
+            ICOL            =       (IXIN[ROWS, COLS] - 1) * CC_NMLIST.NYIN + (IYIN[ROWS, COLS] - 1)
+            VALS            =       (INPA[ROWS, COLS] / self.DROFUNIT).to(dtype=Datatype.JPRB)
+            CROW            =       torch.zeros(NSEQALL + 1, dtype=torch.long, device=device)
+            CROW[1:]        =       torch.cumsum(torch.bincount(ROWS, minlength=NSEQALL), dim=0)
+
+            self.INPCSR     =       torch.sparse_csr_tensor(CROW, ICOL, VALS,
+                                                            size=(NSEQALL, CC_NMLIST.NXIN * CC_NMLIST.NYIN),
+                                                            dtype=Datatype.JPRB, device=device)
+            #   !! bounding box of the referenced input cells: the forcing readers fetch only this hyperslab
+            if VALS.numel() > 0:
+                IXV, IYV    =       IXIN[ROWS, COLS], IYIN[ROWS, COLS]
+                self.INPBOX =       (int(IXV.min()) - 1, int(IXV.max()), int(IYV.min()) - 1, int(IYV.max()))
+            with open(log_filename, 'a') as log_file:
+                log_file.write(f"CMF::INPMAT_INIT_CSR: nnz = {VALS.numel()}\n")
+                log_file.write(f"CMF::INPMAT_INIT_CSR: input box IX {self.INPBOX[0] + 1}:{self.INPBOX[1]}, "
+                               f"IY {self.INPBOX[2] + 1}:{self.INPBOX[3]}\n")
+                log_file.flush()
+                log_file.close()
+            return
+        # --------------------------------------------------------------------------------------------------------------
+        # --------------------------------------------------------------------------------------------------------------
+        def CMF_CONVRES_INIT(CC_NMLIST, CM_NMLIST, log_filename, device, Datatype):
+            """
+            ! gather index for CONV_RESOL (no input matrix): input cells (NSEQALL, K) of every river cell
+            ! SAME: identical grids, K=1 / FINE: input finer by integer ratios, K=RX*RY cells averaged with cos(lat) weights
+            ! COARSE: input coarser by integer ratios, K=1 / NEAREST: input cell holding the cell centre, K=1
+            ! input grid extent WESTIN..EASTIN, SOUTHIN..NORTHIN (default: the map extent) must contain the map domain;
+            ! SAME/FINE/COARSE also need the map edges on input cell edges (resp. input edges on map edges)
+            """
+            def INT_RATIO(A):
+                N           =       round(A)
+                return int(N) if abs(A - N) <= 1.0e-6 * max(abs(A), 1.0) else None
+
+            NSEQALL         =       int(CM_NMLIST.NSEQALL)
+            NX, NY          =       int(CC_NMLIST.NX), int(CC_NMLIST.NY)
+            NXIN, NYIN      =       int(CC_NMLIST.NXIN), int(CC_NMLIST.NYIN)
+            WEST, EAST      =       float(CC_NMLIST.WEST), float(CC_NMLIST.EAST)
+            SOUTH, NORTH    =       float(CC_NMLIST.SOUTH), float(CC_NMLIST.NORTH)
+            WESTIN          =       WEST  if self.WESTIN  is None else float(self.WESTIN)
+            EASTIN          =       EAST  if self.EASTIN  is None else float(self.EASTIN)
+            SOUTHIN         =       SOUTH if self.SOUTHIN is None else float(self.SOUTHIN)
+            NORTHIN         =       NORTH if self.NORTHIN is None else float(self.NORTHIN)
+            DX, DY          =       (EAST - WEST) / NX, (NORTH - SOUTH) / NY
+            DXIN, DYIN      =       (EASTIN - WESTIN) / NXIN, (NORTHIN - SOUTHIN) / NYIN
+            TOL             =       1.0e-6 * min(DX, DY, DXIN, DYIN)
+            if WEST < WESTIN - TOL or EAST > EASTIN + TOL or SOUTH < SOUTHIN - TOL or NORTH > NORTHIN + TOL:
+                with open(log_filename, 'a') as log_file:
+                    log_file.write(f"CMF::CONVRES_INIT: map domain {WEST}:{EAST}, {SOUTH}:{NORTH} outside "
+                                   f"input grid {WESTIN}:{EASTIN}, {SOUTHIN}:{NORTHIN} (NXIN,NYIN {NXIN},{NYIN})\n")
+                    log_file.flush()
+                    log_file.close()
+                raise ValueError("Stop: map domain WEST..EAST, SOUTH..NORTH is not inside the input grid "
+                                 "WESTIN..EASTIN, SOUTHIN..NORTHIN; set the input grid extent in the forcing namelist")
+
+            IX              =       CM_NMLIST.I1SEQX.raw()[:NSEQALL].to(device=device, dtype=torch.long) - 1
+            IY              =       CM_NMLIST.I1SEQY.raw()[:NSEQALL].to(device=device, dtype=torch.long) - 1
+            WGT             =       None
+            RX, RY          =       INT_RATIO(DX / DXIN), INT_RATIO(DY / DYIN)             # !! input cells per map cell
+            CX, CY          =       INT_RATIO(DXIN / DX), INT_RATIO(DYIN / DY)             # !! map cells per input cell
+            OXIN, OYIN      =       INT_RATIO((WEST - WESTIN) / DXIN), INT_RATIO((NORTHIN - NORTH) / DYIN)
+            OX, OY          =       INT_RATIO((WEST - WESTIN) / DX), INT_RATIO((NORTHIN - NORTH) / DY)
+            if None not in (RX, RY, OXIN, OYIN) and RX == 1 and RY == 1:
+                CMODE       =       "SAME"
+                IXI, IYI    =       (OXIN + IX)[:, None], (OYIN + IY)[:, None]
+            elif None not in (RX, RY, OXIN, OYIN) and RX >= 1 and RY >= 1:
+                CMODE       =       "FINE"
+                KX          =       torch.arange(RX, device=device).repeat_interleave(RY)
+                KY          =       torch.arange(RY, device=device).repeat(RX)
+                IXI         =       OXIN + IX[:, None] * RX + KX[None, :]
+                IYI         =       OYIN + IY[:, None] * RY + KY[None, :]
+                RLAT        =       NORTHIN - (IYI.to(dtype=Datatype.JPRB) + 0.5) * DYIN
+                WGT         =       torch.cos(torch.deg2rad(RLAT))              # !! relative area of the input cells
+            elif None not in (CX, CY, OX, OY) and CX >= 1 and CY >= 1:
+                CMODE       =       "COARSE"
+                IXI         =       ((OX + IX) // CX)[:, None]
+                IYI         =       ((OY + IY) // CY)[:, None]
+            else:
+                CMODE       =       "NEAREST"
+                RLON        =       WEST + (IX.to(dtype=torch.float64) + 0.5) * DX
+                RLAT        =       NORTH - (IY.to(dtype=torch.float64) + 0.5) * DY
+                IXI         =       torch.clamp(((RLON - WESTIN) / DXIN).floor().to(dtype=torch.long), 0, NXIN - 1)[:, None]
+                IYI         =       torch.clamp(((NORTHIN - RLAT) / DYIN).floor().to(dtype=torch.long), 0, NYIN - 1)[:, None]
+
+            self.INPCNV     =       {
+                "mode": CMODE,
+                "ixi": IXI,
+                "iyi": IYI,
+                "wgt": WGT,
+                "area": (CM_NMLIST.D2GRAREA.raw()[:NSEQALL, 0].to(device=device) / self.DROFUNIT).to(dtype=Datatype.JPRB),
+            }
+            if NSEQALL > 0:
+                self.INPBOX =       (int(IXI.min()), int(IXI.max()) + 1, int(IYI.min()), int(IYI.max()) + 1)
+            with open(log_filename, 'a') as log_file:
+                log_file.write(f"CMF::CONVRES_INIT: NX,NY {NX},{NY} NXIN,NYIN {NXIN},{NYIN} mode {CMODE}, K = {IXI.shape[1]}\n")
+                log_file.write(f"CMF::CONVRES_INIT: input box IX {self.INPBOX[0] + 1}:{self.INPBOX[1]}, "
+                               f"IY {self.INPBOX[2] + 1}:{self.INPBOX[3]}\n")
+                log_file.flush()
+                log_file.close()
+            return
+        # --------------------------------------------------------------------------------------------------------------
+        # --------------------------------------------------------------------------------------------------------------
         def CMF_FORCING_INIT_CDF(CC_NMLIST, CT_NMLIST, log_filename, CU):
+            if self.FRCCDF is None:
+                self.FRCCDF     =       CMF_FORCING_CDFREADER([self.CVNROF, self.CVNSUB if CC_NMLIST.LROSPLIT else None],
+                                                              self.NCDFBLK, CC_NMLIST.RMIS, self.INPBOX)
+            if not self.LINPDAY and CDF_SPLIT(self.CROFCDF) != "NONE":
+                #   !! yearly / monthly / daily files from a template: opened on demand in CMF_FORCING_GET_CDF
+                with open(log_filename, 'a') as log_file:
+                    log_file.write(f"CMF::FORCING_INIT_CDF: {self.CROFCDF}, split: {CDF_SPLIT(self.CROFCDF)}\n")
+                    log_file.flush()
+                    log_file.close()
+                return CC_NMLIST
             if not self.LINPDAY:
                 # --------------------------------------------------------------------------------------------------------------
                 #   !*** 1. calculate KMINSTAINP (start KMIN for forcing)
@@ -274,7 +426,7 @@ class CMF_FORCING_NMLIST_MOD:
                     log_file.close()
 
                 #     !*** 3. Open netCDF ruoff file
-                NC_FILE = _netcdf_dataset(self.ROFCDF.CNAME, mode='r')
+                NC_FILE = self.FRCCDF.DATASET(self.ROFCDF.CNAME)                        # !! kept open across steps
                 self.ROFCDF.NVARID[0] = NC_FILE.variables[self.ROFCDF.CVAR[0]]
 
                 # CC_NMLIST.NXIN        =     self.ROFCDF.NVARID[0].shape[1]
@@ -325,14 +477,19 @@ class CMF_FORCING_NMLIST_MOD:
             log_file.flush()
             log_file.close()
 
-        if self.LINPCDF:
-            CC_NMLIST   =   CMF_FORCING_INIT_CDF(CC_NMLIST, CT_NMLIST, log_filename, CU)
-
+        #   !! input matrix first: its bounding box (INPBOX) limits what the forcing readers fetch
+        self.INPBOX     =   (0, int(CC_NMLIST.NXIN), 0, int(CC_NMLIST.NYIN))
         if self.LINTERP:
             if self.LITRPCDF:
                 raise NotImplementedError("LITRPCDF interpolation input is not supported in CaMa-PyTorch v1.0.")
             else:
                 CMF_INPMAT_INIT_BIN(CC_NMLIST,log_filename,CM_NMLIST, CU, self.device, Datatype)
+                CMF_INPMAT_INIT_CSR(CC_NMLIST, CM_NMLIST, log_filename, self.device, Datatype)
+        else:
+            CMF_CONVRES_INIT(CC_NMLIST, CM_NMLIST, log_filename, self.device, Datatype)
+
+        if self.LINPCDF:
+            CC_NMLIST   =   CMF_FORCING_INIT_CDF(CC_NMLIST, CT_NMLIST, log_filename, CU)
 
         with open(log_filename, 'a') as log_file:
             log_file.write("CMF::FORCING_INIT: end\n")
@@ -348,131 +505,88 @@ class CMF_FORCING_NMLIST_MOD:
         # --------------------------------------------------------------------------------------------------------------
         def CMF_FORCING_GET_BIN(CC_NMLIST, PBUFF, CT_NMLIST, log_filename,device,Datatype):
         # --------------------------------------------------------------------------------------------------------------
-            R2TMP           =           torch.zeros((CC_NMLIST.NXIN, CC_NMLIST.NYIN), dtype=Datatype.JPRM, device=device)
-            R2TMP           =           Ftensor_2D(R2TMP, start_row=1, start_col=1)
-            # *** 1. calculate IREC for sub-daily runoff
-            ISEC            =           CT_NMLIST.IHOUR * 3600 + CT_NMLIST.IMIN * 60        # !! current second in a day
-            self.IRECINP         =           (ISEC // CC_NMLIST.DTIN) + 1                        # !! runoff irec (sub-dairy runoff)
-
-             # !*** 2. set file name
-
-            CDATE           =           f"{CT_NMLIST.IYYYY:04d}{CT_NMLIST.IMM:02d}{CT_NMLIST.IDD:02d}"
-            self.CIFNAME         =           f"{self.CROFDIR}/{self.CROFPRE}{CDATE}{self.CROFSUF}"
+            def BIN_KEY(IYYYYMMDD, IHOUR, IMIN):
+                # !! (runoff file, sub-surface runoff file, IREC) of one forcing time
+                ISEC            =           IHOUR * 3600 + IMIN * 60                            # !! current second in a day
+                IREC            =           int(ISEC // CC_NMLIST.DTIN) + 1                     # !! runoff irec (sub-dairy runoff)
+                CDATE           =           f"{IYYYYMMDD:08d}"
+                CROF            =           f"{self.CROFDIR}/{self.CROFPRE}{CDATE}{self.CROFSUF}"
+                CSUB            =           f"{self.CSUBDIR}/{self.CSUBPRE}{CDATE}{self.CSUBSUF}" if CC_NMLIST.LROSPLIT else None
+                return CROF, CSUB, IREC
+
+            if self.FRCBIN is None:
+                self.FRCBIN     =           CMF_FORCING_BINREADER(CC_NMLIST.NXIN, CC_NMLIST.NYIN, self.NINPPREF, self.INPBOX)
+
+            # *** 1. calculate IREC for sub-daily runoff & set file name
+            KEY             =           BIN_KEY(CT_NMLIST.IYYYYMMDD, CT_NMLIST.IHOUR, CT_NMLIST.IMIN)
+            self.CIFNAME, _, self.IRECINP = KEY
             with open(log_filename, 'a') as log_file:
                 log_file.write(f"CMF::FORCING_GET_BIN: {self.CIFNAME}\n")
-                log_file.flush()
-                log_file.close()
-
-            # !*** 3. open & read runoff
-            with open(self.CIFNAME, 'rb') as f:
-                buffer          =           f.read(4 * CC_NMLIST.NXIN * CC_NMLIST.NYIN)
-                data_np         =           np.frombuffer(buffer, dtype=np.float32).reshape(CC_NMLIST.NYIN, CC_NMLIST.NXIN).T
-                R2TMP[:, :]     =           torch.tensor(data_np, dtype=R2TMP.raw().dtype, device=device)
-                f.close()
-            with open(log_filename, 'a') as log_file:
+                if CC_NMLIST.LROSPLIT:
+                    log_file.write(f"CMF::FORCING_GET_BIN: (sub-surface): {KEY[1]}\n")
                 log_file.write(f"IRECINP: {self.IRECINP}\n")
                 log_file.flush()
                 log_file.close()
 
-            # !*** 4. copy runoff to PBUSS, endian conversion is needed
+            #  !*** 2. forcing times of the next NINPPREF calls (queued on the prefetch thread)
+            KEYS_NEXT       =           []
+            KMINSTP         =           int(CC_NMLIST.DTIN // 60)
+            for IPREF in range(1, self.NINPPREF + 1):
+                KMINPREF        =       CT_NMLIST.KMIN + IPREF * KMINSTP
+                if KMINPREF >= CT_NMLIST.KMINEND:
+                    break
+                JYYYYMMDD, JHHMM =      CU.MIN2DATE(KMINPREF, CT_NMLIST.YYYY0, CT_NMLIST.MM0, CT_NMLIST.DD0)
+                JHOUR, JMIN     =       CU.SPLITHOUR(JHHMM)
+                KEYS_NEXT.append(BIN_KEY(JYYYYMMDD, JHOUR, JMIN))
+
+            # !*** 3. read runoff (memory-mapped record IRECINP), endian conversion is needed
+            R2ROF, R2SUB    =           self.FRCBIN.GET(KEY, KEYS_NEXT)
             if self.LINPEND:
                 raise NotImplementedError("Endian conversion for runoff input is not supported in CaMa-PyTorch v1.0.")
-            PBUFF[:, :, 1]      =           R2TMP[:,:]
+
+            # !*** 4. copy runoff to PBUSS (input box only)
+            IX0, IX1, IY0, IY1  =           self.INPBOX
+            PBUFF.raw()[IX0:IX1, IY0:IY1, 0] = R2ROF.to(dtype=PBUFF.raw().dtype, device=device)
             # !*** for sub-surface runoff withe LROSPLIT
             PBUFF[:, :, 2]       =          torch.tensor(0, dtype=Datatype.JPRB, device=device)     #!! Plain Binary subsurface runoff to be added later
             if CC_NMLIST.LROSPLIT:
-                self.CIFNAME = f"{self.CSUBDIR}/{self.CSUBPRE}{CDATE}{self.CSUBSUF}"
-                with open(log_filename, 'a') as log_file:
-                    log_file.write(f"CMF::FORCING_GET_BIN: (sub-surface): {self.CIFNAME}\n")
-                    log_file.flush()
-                    log_file.close()
-                with open(self.CIFNAME, 'rb') as f:
-                    buffer = f.read(4 * CC_NMLIST.NXIN * CC_NMLIST.NYIN)
-                    data_np = np.frombuffer(buffer, dtype=np.float32).reshape(CC_NMLIST.NYIN, CC_NMLIST.NXIN).T
-                    R2TMP[:, :] = torch.tensor(data_np, dtype=R2TMP.raw().dtype, device=device)
-                    f.close()
-                with open(log_filename, 'a') as log_file:
-                    log_file.write(f"IRECINP: {R2TMP.raw().ndim}\n")
-                    log_file.flush()
-                    log_file.close()
-
-                if self.LINPEND:
-                    raise NotImplementedError("Endian conversion for subsurface runoff input is not supported in CaMa-PyTorch v1.0.")
-                PBUFF[:, :, 2] = R2TMP[:, :]
+                PBUFF.raw()[IX0:IX1, IY0:IY1, 1] = R2SUB.to(dtype=PBUFF.raw().dtype, device=device)
 
             return PBUFF
         # --------------------------------------------------------------------------------------------------------------
         # --------------------------------------------------------------------------------------------------------------
         def CMF_FORCING_GET_CDF(CC_NMLIST, CU, CT_NMLIST, log_filename, device):
         # --------------------------------------------------------------------------------------------------------------
-
+            #   !*** 1. file & start KMIN of the file holding the current time
             if self.LINPDAY:
-                # *** 1. calculate IREC for sub-daily runoff
-                ISEC            =           CT_NMLIST.IHOUR * 3600 + CT_NMLIST.IMIN * 60  # !! current second in a day
-                self.IRECINP         =           (ISEC // CC_NMLIST.DTIN) + 1  # !! runoff irec (sub-dairy runoff)
-
-                #   !! netCDF runoff file start time
-                KMINSTA         =           (CU.DATE2MIN
-                                            (CT_NMLIST.IYYYY * 10000 + CT_NMLIST.IMM * 100 + CT_NMLIST.IDD, 0,
-                                            CT_NMLIST.YYYY0, log_filename))
-
-                # !*** 2. set file name
-                CDATE = f"{CT_NMLIST.IYYYY:04d}{CT_NMLIST.IMM:02d}{CT_NMLIST.IDD:02d}"
-                self.CIFNAME = f"{self.CROFDIR}/{self.CROFPRE}{CDATE}{self.CROFSUF}"
-                with open(log_filename, 'a') as log_file:
-                    log_file.write(f"CMF::FORCING_GET_CDF: {self.CIFNAME}, {KMINSTA}\n")
-                    log_file.flush()
-                    log_file.close()
-
-
-
-                self.ROFCDF.CNAME    =   self.CIFNAME
-                self.ROFCDF.CVAR     =   [self.CVNROF, self.CVNSUB]
-                if not CC_NMLIST.LROSPLIT:
-                    self.ROFCDF.CVAR[1] = "NONE"
-                    self.ROFCDF.NVARID[1] = [None, -1]
-                if not CC_NMLIST.LWEVAP:
-                    self.ROFCDF.CVAR[2] = "NONE"
-                    self.ROFCDF.NVARID[2] = [None, None, -1]
-
-                self.ROFCDF.NSTART = KMINSTA
-                with open(log_filename, 'a') as log_file:
-                    log_file.write(f"CMF::FORCING_GET_CDF: {self.CIFNAME}, {KMINSTA}\n")
-                    log_file.flush()
-                    log_file.close()
-
-                #     !*** 3. Open netCDF ruoff file
-                NC_FILE         =    _netcdf_dataset(self.ROFCDF.CNAME, mode='r')
-
-                var1            =    NC_FILE.variables[self.ROFCDF.CVAR[0]]
-                if CC_NMLIST.LROSPLIT:
-                    var2 = NC_FILE.variables[self.ROFCDF.CVAR[1]]
-
-                with open(log_filename, 'a') as log_file:
-                    log_file.write(f"CMF::FORCING_GET_CDF: CNAME,NCID,VARID: {self.CIFNAME}, {NC_FILE}, {self.ROFCDF.NVARID[0]}\n")
-                    log_file.flush()
-                    log_file.close()
-
-                #      !*** 4. read runoff
-                # need modify the following code....
-                # ..................................
-            else:       #   !! LINPDAY=.false. : one runoff input file during simulation period
-                #   !*** 1. calculate irec
-                self.IRECINP = int((CT_NMLIST.KMIN - self.ROFCDF.NSTART) * 60 / CC_NMLIST.DTIN)      #   ! (second from netcdf start time) / (input time step)
-
-                #    !*** 2. read runoff
-                PBUFF[:, :, 1] = torch.tensor(self.ROFCDF.NVARID[0][self.IRECINP, :, :].T, device=device)
+                CTEMPLATE       =       f"{self.CROFDIR}/{self.CROFPRE}{{YYYY}}{{MM}}{{DD}}{self.CROFSUF}"
+            else:
+                CTEMPLATE       =       self.CROFCDF
+            CSPLIT              =       CDF_SPLIT(CTEMPLATE)
+            if CSPLIT == "NONE":                    #   !! one runoff input file during simulation period
+                CFILE           =       self.ROFCDF.CNAME
+                KMINSTA         =       self.ROFCDF.NSTART
+            else:
+                JYYYY, JMM, JDD =       CDF_FILESTART(CSPLIT, CT_NMLIST.IYYYY, CT_NMLIST.IMM, CT_NMLIST.IDD)
+                CFILE           =       CDF_FILENAME(CTEMPLATE, JYYYY, JMM, JDD)
+                KMINSTA         =       CU.DATE2MIN(JYYYY * 10000 + JMM * 100 + JDD, 0, CT_NMLIST.YYYY0, log_filename)
 
-                if self.ROFCDF.NVARID[1] != -1:
-                    PBUFF[:, :, 2]      =       torch.tensor(self.ROFCDF.NVARID[1][self.IRECINP, :, :].T, device=device)
+            #   !*** 2. calculate irec: (second from netcdf start time) / (input time step)
+            self.IRECINP        =       int((CT_NMLIST.KMIN - KMINSTA) * 60 // CC_NMLIST.DTIN)
 
+            #   !*** 3. read runoff (from the look-ahead block when buffered)
+            R2ROF, R2SUB        =       self.FRCCDF.GET(CFILE, self.IRECINP)
+            IX0, IX1, IY0, IY1  =       self.INPBOX                                     # !! input box only
+            PBUFF.raw()[IX0:IX1, IY0:IY1, 0] = R2ROF.to(dtype=PBUFF.raw().dtype, device=device)
+            if R2SUB is not None:
+                PBUFF.raw()[IX0:IX1, IY0:IY1, 1] = R2SUB.to(dtype=PBUFF.raw().dtype, device=device)
 
-                with open(log_filename, 'a') as log_file:
-                    log_file.write(f"CMF::FORCING_GET_CDF: read runoff: {CT_NMLIST.IYYYYMMDD}, {CT_NMLIST.IHHMM}, {self.IRECINP}\n")
-                    log_file.flush()
-                    log_file.close()
+            with open(log_filename, 'a') as log_file:
+                log_file.write(f"CMF::FORCING_GET_CDF: read runoff: {CFILE}, {CT_NMLIST.IYYYYMMDD}, {CT_NMLIST.IHHMM}, {self.IRECINP}\n")
+                log_file.flush()
+                log_file.close()
 
-                return PBUFF
+            return PBUFF
         # --------------------------------------------------------------------------------------------------------------
 
         if self.LINPCDF :
@@ -505,82 +619,48 @@ class CMF_FORCING_NMLIST_MOD:
             ! interporlate runoff using "input matrix"
             Note:   Distribute runoff on the two-dimensional grid (in mm/dt) to river network cells according to specified
                     interpolation weights, convert it to volumetric flow rate (m³/s), and ensure mass conservation.
+                    One SpMV with the CSR operator built in CMF_FORCING_INIT; missing input (RMIS) is masked to zero.
             """
-            PBUFFIN         =       Ftensor_2D(PBUFFIN, start_row=1, start_col=1)
-            PBUFFOUT        =       torch.zeros((CM_NMLIST.NSEQALL, 1), dtype=Datatype.JPRB, device=device)
-            PBUFFOUT        =       Ftensor_2D(PBUFFOUT, start_row=1, start_col=1)
-
-            # NQ_Index = torch.arange(1, CM_NMLIST.NSEQALL + 1, device=device)
-            # IP_Index = torch.arange(1, CM_NMLIST.INPN + 1, device=device)
-            NQ_Index, IP_Index = torch.meshgrid(
-                torch.arange(1, CM_NMLIST.NSEQALL + 1, device=device),
-                torch.arange(1, CC_NMLIST.INPN + 1, device=device),
-                indexing='ij'
-            )
-
-            IXIN            =       self.INPX[NQ_Index, IP_Index]
-            IYIN            =       self.INPY[NQ_Index, IP_Index]
-
-            cond_pos_1      =       IXIN > 0
-            cond_pos_2      =       (IXIN <= CC_NMLIST.NXIN) & (IYIN <= CC_NMLIST.NYIN)
-            cond_out_2      =       (IXIN > CC_NMLIST.NXIN) | (IYIN > CC_NMLIST.NYIN)
-
-            #computer valid PBUFFIN-------------------------------------------------------------------------------------
-            cond_valid      =       cond_pos_1 & cond_pos_2
-
-            IXIN_valid      =       IXIN[cond_valid]
-            IYIN_valid      =       IYIN[cond_valid]
-            NQ_valid        =       NQ_Index[cond_valid]
-            IP_valid        =       IP_Index[cond_valid]
-
-            valid_mask      =       (PBUFFIN[IXIN_valid, IYIN_valid] != CC_NMLIST.RMIS)
-
-            IXIN_final      =       IXIN_valid[valid_mask]
-            IYIN_final      =       IYIN_valid[valid_mask]
-            NQ_final        =       NQ_valid[valid_mask] - 1  # index_add_ 从 0 开始
-            IP_final        =       IP_valid[valid_mask]
-
-            PBUFFIN_R       =       PBUFFIN[IXIN_final, IYIN_final]
-            INPA_R          =       self.INPA[NQ_final + 1, IP_final]
-
-            PBUFFOUT.raw().index_add_(
-                0,
-                NQ_final,
-                (PBUFFIN_R * INPA_R / self.DROFUNIT).unsqueeze(1)
-            )
-            # ----------------------------------------------------------------------------------------------------------
-
-            ID_D_M = (cond_pos_1 & cond_out_2).nonzero(as_tuple=True)[0]
-
-            if ID_D_M.any():
-                ISEQ_bad            =           NQ_Index[ID_D_M]
-                INPI_bad            =           IP_Index[ID_D_M]
-                IXIN_bad            =           self.INPX.raw()[ID_D_M]
-                IYIN_bad            =           self.INPY.raw()[ID_D_M]
-                for i in range(len(ISEQ_bad)):
-                    with open(log_filename, 'a') as log_file:
-                        log_file.write(f"error")
-                        log_file.write(f"XXX  {ISEQ_bad[i]} {INPI_bad[i]} {IXIN_bad[i]} {IYIN_bad[i]}\n")
-                        log_file.flush()
-                        log_file.close()
-
-
+            R1INP           =       PBUFFIN.reshape(-1, 1).to(dtype=Datatype.JPRB)
+            R1INP           =       torch.where(R1INP != CC_NMLIST.RMIS, R1INP, torch.zeros_like(R1INP))
+            PBUFFOUT        =       Ftensor_2D(self.INPCSR @ R1INP, start_row=1, start_col=1)
+            return PBUFFOUT
+        # --------------------------------------------------------------------------------------------------------------
+        # --------------------------------------------------------------------------------------------------------------
+        def CONV_RESOL(CC_NMLIST, CM_NMLIST, PBUFFIN ,log_filename, device, Datatype):
+            """
+            ! use runoff data without input matrix: gather the input cells of every river cell (index from CMF_CONVRES_INIT)
+            ! and convert mm/dt on the cell area to m3/s; missing input (RMIS) is skipped
+            """
+            CNV             =       self.INPCNV
+            R2INP           =       PBUFFIN[CNV["ixi"], CNV["iyi"]].to(dtype=Datatype.JPRB)     # !! (NSEQALL, K) gather
+            LVALID          =       R2INP != CC_NMLIST.RMIS
+            R2INP           =       torch.where(LVALID, R2INP, torch.zeros_like(R2INP))
+            if CNV["wgt"] is None:
+                R1OUT       =       R2INP[:, 0]
+            else:
+                R2WGT       =       CNV["wgt"] * LVALID
+                R1WGT       =       R2WGT.sum(dim=1)
+                R1OUT       =       torch.where(R1WGT > 0, (R2INP * R2WGT).sum(dim=1) / torch.clamp(R1WGT, min=1.0e-20),
+                                                torch.zeros_like(R1WGT))
+            PBUFFOUT        =       Ftensor_2D((R1OUT * CNV["area"]).unsqueeze(1), start_row=1, start_col=1)
             return PBUFFOUT
         # --------------------------------------------------------------------------------------------------------------
         # --------------------------------------------------------------------------------------------------------------
         #! Runoff interpolation & unit conversion (mm/dt -> m3/sec)
         if self.LINTERP:                    #! mass conservation using "input matrix table (inpmat)"
-            self.D2RUNOFF               =    ROFF_INTERP  (CC_NMLIST, CM_NMLIST, PBUFF[:,:,1],log_filename, config['device'], Datatype)
-            CC_VAR.D2RUNOFF[:,:]       =    self.D2RUNOFF[:, :]
-            if CC_NMLIST.LROSPLIT:
-                self.D2ROFSUB           =    ROFF_INTERP  (CC_NMLIST, CM_NMLIST, PBUFF[:,:,2],log_filename, config['device'], Datatype)
-                CC_VAR.D2ROFSUB[:, :]  =    self.D2ROFSUB[:, :]
-            else:
-                self.D2ROFSUB           =   torch.zeros((CM_NMLIST.NSEQALL,1), dtype=Datatype.JPRB, device=config['device'])
-                self.D2ROFSUB           =   Ftensor_2D(self.D2ROFSUB, start_row=1, start_col=1)
-                CC_VAR.D2ROFSUB[:, :]  =   self.D2ROFSUB[:, :]
+            CONV_FUNC                   =    ROFF_INTERP
+        else:                               #! same or integer-ratio grids, nearest point otherwise
+            CONV_FUNC                   =    CONV_RESOL
+        self.D2RUNOFF                   =    CONV_FUNC  (CC_NMLIST, CM_NMLIST, PBUFF[:,:,1],log_filename, config['device'], Datatype)
+        CC_VAR.D2RUNOFF[:,:]           =    self.D2RUNOFF[:, :]
+        if CC_NMLIST.LROSPLIT:
+            self.D2ROFSUB               =    CONV_FUNC  (CC_NMLIST, CM_NMLIST, PBUFF[:,:,2],log_filename, config['device'], Datatype)
+            CC_VAR.D2ROFSUB[:, :]      =    self.D2ROFSUB[:, :]
         else:
-            raise NotImplementedError("Runoff resolution conversion is not supported in CaMa-PyTorch v1.0.")
+            self.D2ROFSUB               =   torch.zeros((CM_NMLIST.NSEQALL,1), dtype=Datatype.JPRB, device=config['device'])
+            self.D2ROFSUB               =   Ftensor_2D(self.D2ROFSUB, start_row=1, start_col=1)
+            CC_VAR.D2ROFSUB[:, :]      =   self.D2ROFSUB[:, :]
 
         if CC_NMLIST.LWEVAP:
             raise NotImplementedError("LWEVAP runoff interpolation is not supported in CaMa-PyTorch v1.0.")
@@ -588,6 +668,12 @@ class CMF_FORCING_NMLIST_MOD:
         return  CC_VAR
     def CMF_FORCING_END(self,log_filename):
         # --------------------------------------------------------------------------------------------------------------
+        if self.FRCBIN is not None:
+            self.FRCBIN.CLOSE()
+            self.FRCBIN         =       None
+        if self.FRCCDF is not None:
+            self.FRCCDF.CLOSE()
+            self.FRCCDF         =       None
         with open(log_filename, 'a') as log_file:
             log_file.write(f"\n!---------------------!\n")
             log_file.write(f"CMF::FORCING_END: Finalize forcing module\n")
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@purpose:  On-disk cache of the derived river map & topography (python)
+Licensed under the Apache License, Version 2.0.
+
+* CONTAINS:
+! -- CMF_MAPCACHE_KEY      : hash of the map files (path, size, mtime or content) and of the namelist settings
+! -- CMF_MAPCACHE_SNAPSHOT : attributes of CM_NMLIST before CMF_RIVMAP_INIT / CMF_TOPO_INIT
+! -- CMF_MAPCACHE_LOAD     : set CM_NMLIST from the cache (memory-mapped .npy files), skip map init
+! -- CMF_MAPCACHE_SAVE     : write every array & scalar set by CMF_RIVMAP_INIT / CMF_TOPO_INIT
+
+The cache lives in CMAPCACHE/<key>/: one .npy file per array (1D sequence, I1NEXT, I1SEQLEV,
+topography, D2RIVSTOMAX, D2FLDSTOMAX/D2FLDGRD, bifurcation tables, ...) and meta.json with the
+Fortran start indices and scalar values. A changed map file or setting gives a new key, so stale
+entries are never read. Map files enter the key by (path, size, mtime_ns); LMAPHASH = .true. hashes
+their full content instead (slow for multi-GB maps, but independent of file time stamps).
+CMAPCACHE = "NONE" (default) switches the cache off.
+"""
+import  os
+import json
+import shutil
+import hashlib
+import numpy as np
+import torch
+from fortran_tensor_1D import Ftensor_1D
+from fortran_tensor_2D import Ftensor_2D
+from fortran_tensor_3D import Ftensor_3D
+
+os.environ['PYTHONWARNINGS']='ignore::FutureWarning'
+os.environ['PYTHONWARNINGS']='ignore::RuntimeWarning'
+
+_MAPCACHE_VERSION   =   1
+_MAP_FILES          =   ("CNEXTXY", "CGRAREA", "CELEVTN", "CNXTDST", "CRIVLEN", "CFLDHGT", "CRIVWTH", "CRIVHGT", "CRIVMAN")
+_MAP_SETTINGS       =   ("NX", "NY", "NLFP", "WEST", "EAST", "SOUTH", "NORTH", "IMIS", "REGIONALL", "REGIONTHIS",
+                         "LFPLAIN", "LPTHOUT", "LMEANSL", "LGDWDLY", "LMAPEND", "PMANRIV", "PMANFLD")
+
+
+def _file_digest(path, h, chunk=1 << 24):
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(chunk)
+            if not block:
+                break
+            h.update(block)
+
+
+def _file_stamp(path, h):
+    st = os.stat(path)
+    h.update(f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}".encode())
+
+
+def CMF_MAPCACHE_KEY(CM_NMLIST, CC_NMLIST, Datatype):
+    """
+    ! hash of the input map files + the settings & precisions the derived arrays depend on
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"mapcache-v{_MAPCACHE_VERSION}".encode())
+    files = (list(_MAP_FILES) + (["CPTHOUT"] if CC_NMLIST.LPTHOUT else [])
+             + (["CMEANSL"] if CC_NMLIST.LMEANSL else []) + (["CGDWDLY"] if CC_NMLIST.LGDWDLY else []))
+    h.update(f"LMAPHASH={CM_NMLIST.LMAPHASH}".encode())
+    for name in files:
+        h.update(name.encode())
+        if not os.path.isfile(getattr(CM_NMLIST, name)):
+            h.update(b"missing")
+        elif CM_NMLIST.LMAPHASH:
+            _file_digest(getattr(CM_NMLIST, name), h)
+        else:
+            _file_stamp(getattr(CM_NMLIST, name), h)
+    for name in _MAP_SETTINGS:
+        value = getattr(CC_NMLIST, name, None)
+        if torch.is_tensor(value):
+            value = value.tolist()
+        h.update(f"{name}={value!r}".encode())
+    h.update(f"{Datatype.JPRB}{Datatype.JPRM}{Datatype.JPIM}{Datatype.JPRD}".encode())
+    return h.hexdigest()
+
+
+def CMF_MAPCACHE_SNAPSHOT(CM_NMLIST):
+    return {name: id(value) for name, value in vars(CM_NMLIST).items()}
+
+
+def _cache_dir(CM_NMLIST):
+    return os.path.join(CM_NMLIST.CMAPCACHE, CM_NMLIST._MAPCACHE_KEY)
+
+
+def CMF_MAPCACHE_LOAD(CM_NMLIST, CC_NMLIST, log_filename, Datatype, device):
+    """
+    ! True when CM_NMLIST was set from the cache (CMF_RIVMAP_INIT / CMF_TOPO_INIT can be skipped)
+    """
+    if CM_NMLIST.CMAPCACHE == "NONE":
+        return False
+    CM_NMLIST._MAPCACHE_KEY     =       CMF_MAPCACHE_KEY(CM_NMLIST, CC_NMLIST, Datatype)
+    cdir                        =       _cache_dir(CM_NMLIST)
+    if not os.path.isfile(os.path.join(cdir, "meta.json")):
+        with open(log_filename, 'a') as log_file:
+            log_file.write(f"CMF::MAPCACHE: no cache for key {CM_NMLIST._MAPCACHE_KEY}, map init from files\n")
+        return False
+
+    with open(os.path.join(cdir, "meta.json"), 'r') as f:
+        meta                    =       json.load(f)
+    for name, entry in meta["arrays"].items():
+        # !! copy-on-write memory map: used in place on the CPU, copied once for a device transfer
+        data                    =       np.load(os.path.join(cdir, f"{name}.npy"), mmap_mode='c')
+        tensor                  =       torch.from_numpy(data).to(device=device)
+        start                   =       entry["start"]
+        if entry["kind"] == "Ftensor_1D":
+            tensor              =       Ftensor_1D(tensor, start_index=start[0])
+        elif entry["kind"] == "Ftensor_2D":
+            tensor              =       Ftensor_2D(tensor, start_row=start[0], start_col=start[1])
+        elif entry["kind"] == "Ftensor_3D":
+            tensor              =       Ftensor_3D(tensor, start_depth=start[0], start_row=start[1], start_col=start[2])
+        setattr(CM_NMLIST, name, tensor)
+    for name, value in meta["scalars"].items():
+        setattr(CM_NMLIST, name, value)
+
+    with open(log_filename, 'a') as log_file:
+        log_file.write(f"CMF::MAPCACHE: river map & topography loaded from {cdir}\n")
+        log_file.write(f"NSEQRIV=: {CM_NMLIST.NSEQRIV}\n")
+        log_file.write(f"NSEQALL=: {CM_NMLIST.NSEQALL}\n")
+        log_file.write(f"NSEQMAX=: {CM_NMLIST.NSEQMAX}\n")
+        log_file.flush()
+        log_file.close()
+    return True
+
+
+def CMF_MAPCACHE_SAVE(CM_NMLIST, SNAPSHOT, log_filename):
+    """
+    ! write the attributes CMF_RIVMAP_INIT / CMF_TOPO_INIT added or replaced since SNAPSHOT
+    """
+    if CM_NMLIST.CMAPCACHE == "NONE":
+        return
+    cdir                        =       _cache_dir(CM_NMLIST)
+    if os.path.isdir(cdir):
+        return
+    tmp                         =       f"{cdir}.tmp-{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+
+    meta                        =       {"version": _MAPCACHE_VERSION, "arrays": {}, "scalars": {}}
+    for name, value in vars(CM_NMLIST).items():
+        if name.startswith("_") or SNAPSHOT.get(name) == id(value):
+            continue
+        if isinstance(value, Ftensor_1D):
+            entry, tensor       =       {"kind": "Ftensor_1D", "start": [value.start_index]}, value.raw()
+        elif isinstance(value, Ftensor_2D):
+            entry, tensor       =       {"kind": "Ftensor_2D", "start": [value.start_row, value.start_col]}, value.raw()
+        elif isinstance(value, Ftensor_3D):
+            entry, tensor       =       ({"kind": "Ftensor_3D", "start": [value.start_depth, value.start_row, value.start_col]},
+                                         value.raw())
+        elif torch.is_tensor(value):
+            entry, tensor       =       {"kind": "tensor", "start": []}, value
+        elif isinstance(value, (bool, int, float)):
+            meta["scalars"][name] = value
+            continue
+        else:
+            continue
+        np.save(os.path.join(tmp, f"{name}.npy"), tensor.detach().cpu().numpy())
+        meta["arrays"][name]    =       entry
+
+    with open(os.path.join(tmp, "meta.json"), 'w') as f:
+        json.dump(meta, f)
+    try:
+        os.replace(tmp, cdir)
+    except OSError:                     # !! written meanwhile by another run
+        shutil.rmtree(tmp, ignore_errors=True)
+        return
+
+    with open(log_filename, 'a') as log_file:
+        log_file.write(f"CMF::MAPCACHE: river map & topography written to {cdir}\n")
+        log_file.flush()
+        log_file.close()
@@ -12,17 +12,70 @@ Licensed under the Apache License, Version 2.0.
 ! -- CMF_MAPS_NMLIST   : configuration from namelist
 ! -- CMF_RIVMAP_INIT  : read & set river network map
 ! -- CMF_TOPO_INIT    : read & set topography
+! -- CMF_MAPDATA_WRITE : write map dimensions (mapdata.txt)
 """
 import  os
 import torch
 from fortran_tensor_3D import Ftensor_3D
 from fortran_tensor_2D import Ftensor_2D
 from fortran_tensor_1D import Ftensor_1D
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from cmf_topology_utils import partition_basins_torch, river_sequence_levels_torch
 
 os.environ['PYTHONWARNINGS']='ignore::FutureWarning'
 os.environ['PYTHONWARNINGS']='ignore::RuntimeWarning'
 
 
+def map_flat_offsets(I1SEQX, I1SEQY, NX, NY):
+    """
+    ! flat offsets (Fortran IX fastest, as stored in the map files) of the 1D sequence cells;
+    ! unused slots (I1SEQX = 0) wrap like the 1-based tensor index did
+    """
+    NX, NY = int(NX), int(NY)
+    IX0 = (I1SEQX.raw().to(dtype=torch.long) - 1) % NX
+    IY0 = (I1SEQY.raw().to(dtype=torch.long) - 1) % NY
+    return (IY0 * NX + IX0).cpu().numpy()
+
+
+def read_map_vec(CFILE, NREC, NX, NY, FLAT, DTYPE=np.float32):
+    """
+    ! gather the sequence cells of NREC NX x NY records straight from the memory-mapped file
+    ! (np.take releases the GIL, so several files can be gathered concurrently)
+    """
+    MAP = np.memmap(CFILE, dtype=DTYPE, mode='r', shape=(int(NREC), int(NX) * int(NY)))
+    OUT = np.empty((int(NREC), FLAT.size), dtype=DTYPE)
+    for IREC in range(int(NREC)):
+        np.take(MAP[IREC], FLAT, out=OUT[IREC])
+    del MAP
+    return OUT
+
+
+def read_bifparam_table(CPTHOUT, LPTHBIN=False):
+    """
+    ! bifurcation table of CPTHOUT: header "NPTHOUT NPTHLEV", then one row per path
+    ! (IX IY JX JY DST ELV DPH WTH(1:NPTHLEV) ...). Parsed by the numpy C reader; with LPTHBIN the
+    ! float64 table is kept in the sidecar CPTHOUT.npy and memory-mapped while newer than CPTHOUT.
+    """
+    CBIN = f"{CPTHOUT}.npy"
+    if LPTHBIN and os.path.isfile(CBIN) and os.path.getmtime(CBIN) >= os.path.getmtime(CPTHOUT):
+        TABLE = np.load(CBIN, mmap_mode='r')
+        return int(TABLE.shape[0]), int(TABLE.shape[1]) - 7, TABLE, CBIN
+
+    with open(CPTHOUT, 'r') as f:
+        numbers = [s for s in f.readline().replace(",", " ").split() if s.lstrip("-").isdigit()]
+    NPTHOUT, NPTHLEV = map(int, numbers[:2])
+    TABLE = np.loadtxt(CPTHOUT, dtype=np.float64, skiprows=1, usecols=range(7 + NPTHLEV), ndmin=2)
+    if LPTHBIN:
+        try:
+            CTMP = f"{CBIN}.tmp-{os.getpid()}.npy"
+            np.save(CTMP, TABLE)
+            os.replace(CTMP, CBIN)
+        except OSError:                 # !! map directory not writable: text table every run
+            pass
+    return NPTHOUT, NPTHLEV, TABLE, CPTHOUT
+
+
 class CMF_MAPS_NMLIST_MOD:
     def __init__(self,      config,    Datatype,    CC_NMLIST):
         self.device                     =           config['device']
@@ -107,6 +160,9 @@ class CMF_MAPS_NMLIST_MOD:
         self.CRIVPARNC                  =               "NONE"
         self.CMEANSLNC                  =               "NONE"
         self.CMPIREGNC                  =               "NONE"
+        self.CMAPCACHE                  =               "NONE"                  # !! directory of the derived-map cache ("NONE": off)
+        self.LMAPHASH                   =               False                   # !! CMAPCACHE key from the map file content (default: path, size, mtime)
+        self.LPTHBIN                    =               False                   # !! keep a binary sidecar (CPTHOUT.npy) of the bifurcation table
         self.NPTHOUT                    =               0
         self.NPTHLEV                    =               1
         # --------------------------------------------------------------------------------------------------------------
@@ -147,6 +203,9 @@ class CMF_MAPS_NMLIST_MOD:
         self.CRIVPARNC                  =               config['CRIVPARNC'] if 'CRIVPARNC' in config  else self.CRIVPARNC
         self.CMEANSLNC                  =               config['CMEANSLNC'] if 'CMEANSLNC' in config  else self.CMEANSLNC
         self.CMPIREGNC                  =               config['CMPIREGNC'] if 'CMPIREGNC' in config  else self.CMPIREGNC
+        self.CMAPCACHE                  =               config['CMAPCACHE'] if 'CMAPCACHE' in config  else self.CMAPCACHE
+        self.LMAPHASH                   =               config['LMAPHASH'] if 'LMAPHASH' in config  else self.LMAPHASH
+        self.LPTHBIN                    =               config['LPTHBIN'] if 'LPTHBIN' in config  else self.LPTHBIN
 
         with open(log_filename, 'a') as log_file:
             log_file.write("=== NAMELIST, NMAP ===\n")
@@ -161,10 +220,13 @@ class CMF_MAPS_NMLIST_MOD:
                 log_file.write(f"CNXTDST:   {self.CNXTDST}\nCRIVLEN:    {self.CRIVLEN}\nCFLDHGT:    {self.CFLDHGT}\n")
                 log_file.write(f"CRIVWTH:   {self.CRIVWTH}\nCRIVHGT:    {self.CRIVHGT}\nCRIVMAN:    {self.CRIVMAN}\n")
                 log_file.write(f"CPTHOUT:   {self.CPTHOUT}\n")
+                log_file.write(f"LPTHBIN:   {self.LPTHBIN}\n")
             if CC_NMLIST.LGDWDLY:
                 log_file.write(f"CGDWDLY:   {self.CGDWDLY}\n")
             if CC_NMLIST.LMEANSL:
                 log_file.write(f"CMEANSL:   {self.CMEANSL}\n")
+            log_file.write(f"CMAPCACHE: {self.CMAPCACHE}\n")
+            log_file.write(f"LMAPHASH:  {self.LMAPHASH}\n")
             log_file.write("CMF::MAP_NMLIST: end")
             log_file.flush()
             log_file.close()
@@ -189,14 +251,15 @@ class CMF_MAPS_NMLIST_MOD:
                 log_file.write(f"RIVMAP_INIT: nextxy binary:     {self.CNEXTXY}\n")
                 log_file.flush()
                 log_file.close()
-            with open(self.CNEXTXY, 'rb') as f:
-                I2NEXTX_temp            =           torch.frombuffer(bytearray(f.read(4 * CCNMLIST_Class.NX * CCNMLIST_Class.NY)),
-                                                               dtype=self.I2NEXTX_TyPe).clone().reshape(CCNMLIST_Class.NY, CCNMLIST_Class.NX).T
-                self.I2NEXTX[:CCNMLIST_Class.NX+1, :CCNMLIST_Class.NY+1]          =           I2NEXTX_temp
-                I2NEXTY_temp            =           torch.frombuffer(bytearray(f.read(4 * CCNMLIST_Class.NX * CCNMLIST_Class.NY)),
-                                                                dtype=self.I2NEXTY_TyPe).clone().reshape(CCNMLIST_Class.NY, CCNMLIST_Class.NX).T
-                self.I2NEXTY[:CCNMLIST_Class.NX + 1, :CCNMLIST_Class.NY + 1]      =           I2NEXTY_temp
-                f.close()
+            # !! nextx & nexty records, memory-mapped; each is transposed once into the (NX, NY) map
+            NEXTXY                  =           np.memmap(self.CNEXTXY, dtype=np.int32, mode='r',
+                                                          shape=(2, int(CCNMLIST_Class.NY), int(CCNMLIST_Class.NX)))
+            for IREC, I2MAP in enumerate((self.I2NEXTX, self.I2NEXTY)):
+                if I2MAP.raw().device.type == "cpu":
+                    np.copyto(I2MAP.raw().numpy(), NEXTXY[IREC].T, casting='unsafe')
+                else:
+                    I2MAP.raw().copy_(torch.from_numpy(np.ascontiguousarray(NEXTXY[IREC].T)))
+            del NEXTXY
 
 
             if CCNMLIST_Class.LMAPEND:
@@ -217,32 +280,33 @@ class CMF_MAPS_NMLIST_MOD:
                 log_file.flush()
                 log_file.close()
 
-            #   !*** read MPI region map
-            CCNMLIST_Class.REGIONALL        =       1
-            I2REGION_temp                   =       torch.full(
-                                                    (CCNMLIST_Class.NX, CCNMLIST_Class.NY), CCNMLIST_Class.IMIS,device=device)
-            self.I2REGION                   =       Ftensor_2D(I2REGION_temp, start_row=1, start_col=1)
-            #   Compute the mask of grids with downstream points: [I2REGION[mask]=1]
-            mask                            =       Ftensor_2D(self.I2NEXTX.raw() != CCNMLIST_Class.IMIS, start_row=1, start_col=1)
-            self.I2REGION[mask]             =       1
+            #   !*** split river basins into REGIONALL regions (bifurcation-linked basins kept together)
+            PTH_XY                          =       None
+            if CCNMLIST_Class.REGIONALL > 1 and CCNMLIST_Class.LPTHOUT:
+                with open(self.CPTHOUT, 'r') as f:
+                    next(f)
+                    PTH_XY                  =       [[int(v) for v in line.split()[:4]] for line in f if line.strip()]
+            I2REGION_temp, self.REGIONGRID  =       partition_basins_torch(self.I2NEXTX.raw(), self.I2NEXTY.raw(),
+                                                                           CCNMLIST_Class.IMIS, CCNMLIST_Class.REGIONALL, PTH_XY)
+            self.I2REGION                   =       Ftensor_2D(I2REGION_temp.to(dtype=self.I2REGION_TyPe),
+                                                               start_row=1, start_col=1)
+            self.REGIONALL                  =       CCNMLIST_Class.REGIONALL
+            self.REGIONTHIS                 =       CCNMLIST_Class.REGIONTHIS
 
             with open(log_filename, 'a') as log_file:
                 log_file.write("RIVMAP_INIT: count number of grid in each region:\n")
-                log_file.flush()
-                log_file.close()
-                self.REGIONGRID             =       torch.zeros ((CCNMLIST_Class.REGIONALL), dtype=self.I2REGION.raw().dtype, device=device)
-                unique, counts              =       torch.unique(self.I2REGION[self.I2REGION > 0], return_counts=True)
-                self.REGIONGRID[unique-1]   =       counts[0]
+                for IREGION in range(1, CCNMLIST_Class.REGIONALL + 1):
+                    log_file.write(f"{IREGION:6d}{int(self.REGIONGRID[IREGION - 1]):12d}\n")
 
-                self.NSEQMAX                =       torch.max(self.REGIONGRID).item()
+                #   !! arrays of this process only hold the grids of REGIONTHIS
+                self.NSEQMAX                =       int(self.REGIONGRID[self.REGIONTHIS - 1].item())
                 self.NSEQALL                =       torch.tensor(0)
 
-                with open(log_filename, 'a') as log_file:
-                    log_file.write(f"CALC_REGION: REGIONALL=      {CCNMLIST_Class.REGIONALL}\n")
-                    log_file.write(f"CALC_REGION: NSEQMAX=        {self.NSEQMAX}\n")
-                    log_file.write(f"CALC_REGION: NSEQALL='       {self.NSEQALL}\n")
-                    log_file.flush()
-                    log_file.close()
+                log_file.write(f"CALC_REGION: REGIONALL=      {CCNMLIST_Class.REGIONALL}\n")
+                log_file.write(f"CALC_REGION: NSEQMAX=        {self.NSEQMAX}\n")
+                log_file.write(f"CALC_REGION: NSEQALL='       {self.NSEQALL}\n")
+                log_file.flush()
+                log_file.close()
         # --------------------------------------------------------------------------------------------------------------
         # --------------------------------------------------------------------------------------------------------------
         def CALC_1D_SEQ(CC_NMLIST, Datatype, device):
@@ -251,11 +315,6 @@ class CMF_MAPS_NMLIST_MOD:
                 log_file.flush()
                 log_file.close()
 
-            NUPST_temp              =       torch.zeros((CC_NMLIST.NX, CC_NMLIST.NY), dtype=Datatype.JPIM,device=device)
-            self.NUPST              =       Ftensor_2D(NUPST_temp, start_row=1, start_col=1)
-            UPNOW_temp              =       torch.zeros((CC_NMLIST.NX, CC_NMLIST.NY), dtype=Datatype.JPIM,device=device)
-            self.UPNOW              =       Ftensor_2D(UPNOW_temp, start_row=1, start_col=1)
-
             I1SEQX_temp             =       torch.zeros((self.NSEQMAX), dtype=Datatype.JPIM,device=device)
             self.I1SEQX             =       Ftensor_1D(I1SEQX_temp,    start_index=1)
             I1SEQY_temp             =       torch.zeros((self.NSEQMAX), dtype=Datatype.JPIM,device=device)
@@ -265,77 +324,23 @@ class CMF_MAPS_NMLIST_MOD:
             I2VECTOR_temp           =       torch.zeros((CC_NMLIST.NX, CC_NMLIST.NY), dtype=Datatype.JPIM,device=device)
             self.I2VECTOR           =       Ftensor_2D(I2VECTOR_temp, start_row=1, start_col=1)
         # --------------------------------------------------------------------------------------------------------------
-        # ! count number of upstream
-        # 1-st Role: This is only for counting how many upstream grid cells each grid cell has (i.e., how many river channels flow into it).
-        #       It does not handle topological sorting, nor does it modify the registration information.
-        #       It scans all grid cells once to quickly generate the entire NUPST graph structure.
+        # ! count number of upstream, register upmost grid, then register every grid whose upstream are all registered
+        # 1-st..3-rd Role: level-synchronous topological sort (river_sequence_levels_torch). Layer 0 is the upmost
+        #            grids (NUPST == 0), IY-stable as in the Fortran storage order; each following layer holds the grids
+        #            completed by the previous one, in the order the serial loop would register them.
+        #            I1SEQLEV keeps the layer boundaries: layer k is ISEQ = I1SEQLEV[k]+1 .. I1SEQLEV[k+1].
         # ! mask: grid in I2REGION is valid and grid in I2NEXTX has downstream coordinate
-            mask                    =       Ftensor_2D((self.I2NEXTX.raw() > 0) & (self.I2REGION.raw() == self.REGIONTHIS),
-                                               start_row=self.I2NEXTX.start_row, start_col=self.I2NEXTX.start_col)
-            IX, IY                  =       mask.where(mask.raw())
-            # To match the storage order of the Fortran version, sorting is performed along the IY axis during conversion
-            sorted_indices          =       torch.argsort(IY, stable=True)
-            IX, IY                  =       IX[sorted_indices], IY[sorted_indices]
-            # Extract downstream coordinate for the current grid point.
-            JX                      =       self.I2NEXTX[IX, IY]
-            JY                      =       self.I2NEXTY[IX, IY]
-            # NUPST: Count the total number of upstream river segments associated with the current grid point.
-            values                  =       torch.ones_like(JX, dtype=torch.int32)
-            self.NUPST.index_put_((JX, JY), values, accumulate=True)
-        #  1-st End
-        # --------------------------------------------------------------------------------------------------------------
-        # ! register upmost grid in 1d sequence
-        # 2-nd Role: At this point, all values in UPNOW(IX, IY) are zero.
-        #            If a grid cell's NUPST equals 0, it means it has no upstream cells and can serve as a starting point for topological sorting.
-        #            These points form the first layer of the sorting sequence.
-        # mask                                        :     downstream coordinate.
-        # NUPST == UPNOW (values are 0)               :     no upstream coordinate.
-        # mask_upmost(mask and (NUPST == UPNOW))      :     upmost grid coordinate.
-        # ISEQ                                        :     marks the one-dimensional array positions belonging to the upmost grids.
-            mask_upmost             =       Ftensor_2D(mask & (self.NUPST.raw() == self.UPNOW.raw()), start_row=1, start_col=1)
-            IX, IY = mask_upmost.where(mask_upmost.raw())
-            # To match the storage order of the Fortran version, sorting is performed along the IY axis during conversion
-            sorted_indices          =       torch.argsort(IY, stable=True)
-            IX, IY                  =       IX[sorted_indices], IY[sorted_indices]
-            ISEQ                    =       IX.size(0)
-            self.I1SEQX[:ISEQ]      =       IX
-            self.I1SEQY[:ISEQ]      =       IY
+            mask                    =       (self.I2NEXTX.raw() > 0) & (self.I2REGION.raw() == self.REGIONTHIS)
+            IX0, IY0, self.I1SEQLEV, NUPST_temp     =       river_sequence_levels_torch(self.I2NEXTX.raw(), self.I2NEXTY.raw(), mask)
+            self.NUPST              =       Ftensor_2D(NUPST_temp.to(dtype=Datatype.JPIM), start_row=1, start_col=1)
+            self.UPNOW              =       Ftensor_2D(NUPST_temp.to(dtype=Datatype.JPIM), start_row=1, start_col=1)
+            self.NSEQLEV            =       int(self.I1SEQLEV.numel()) - 1
+
+            JSEQ                    =       int(IX0.numel())
+            self.I1SEQX[:JSEQ]      =       (IX0 + 1).to(dtype=Datatype.JPIM)
+            self.I1SEQY[:JSEQ]      =       (IY0 + 1).to(dtype=Datatype.JPIM)
             # I2VECTOR: indicates the river segment number of the corresponding grid point in the flattened array
-            self.I2VECTOR[IX, IY]   =       torch.arange(1, ISEQ + 1, dtype=Datatype.JPIM,device=device)
-
-            ISEQ1, ISEQ2            =       1, ISEQ
-        # 2-nd End
-        # --------------------------------------------------------------------------------------------------------------
-        # !! if all upstream calculated, register to 1D sequence.
-        # 3-rd Role: Scan the downstream grid cells of already registered nodes.
-        # Update their UPNOW values.
-        # If a grid cell has all its upstream nodes registered, add it to the topological sequence.
-        # Iterate layer by layer until no new nodes can be registered (AGAIN = 0).
-            AGAIN = True
-            while AGAIN:
-                AGAIN               =       False
-                JSEQ                =       ISEQ2
-                for ISEQ in range(ISEQ1, ISEQ2 + 1):
-                    # upmost  coordinate
-                    IX              =       self.I1SEQX[ISEQ]
-                    IY              =       self.I1SEQY[ISEQ]
-                    # downstream coordinate for upmost
-                    JX              =       self.I2NEXTX[IX, IY]
-                    JY              =       self.I2NEXTY[IX, IY]
-
-                    self.UPNOW[JX, JY]      += 1
-                    #  Has both upstream and downstream — it is an “intermediate grid cell” in the middle of the process                          :     downstream coordinate.
-                    #         # UPNOW == NUPST (values are 0)           :     has all its upstream nodes registered.
-                    #         # I2NEXTX[JX, JY] > 0                     :     has downstream coordinate
-                    if self.UPNOW[JX, JY] == self.NUPST[JX, JY] and self.I2NEXTX[JX, JY] > 0:
-                        JSEQ                     += 1
-                        self.I1SEQX[JSEQ]        =           JX
-                        self.I1SEQY[JSEQ]        =           JY
-                        self.I2VECTOR[JX, JY]    =           JSEQ
-                        AGAIN = True
-
-                ISEQ1 = ISEQ2 + 1
-                ISEQ2 = JSEQ
+            self.I2VECTOR.raw()[IX0, IY0]   =   torch.arange(1, JSEQ + 1, dtype=Datatype.JPIM, device=device)
             self.NSEQRIV            =       JSEQ            # The number of grid points with completed topological sorting
                                                             # (including intermediate and upstream points).
                                                             # !! END OF RIVER-LINK GRID
@@ -386,68 +391,49 @@ class CMF_MAPS_NMLIST_MOD:
                 log_file.flush()
                 log_file.close()
 
-                with open(self.CPTHOUT, 'rb') as f:
-                    lines = [line.decode("utf-8").strip() for line in f.readlines()]
-                    numbers = [s for s in lines[0].replace(",", " ").split() if s.lstrip("-").isdigit()]
-                    self.NPTHOUT, self.NPTHLEV          =           map(int, numbers[:2])
+            self.NPTHOUT, self.NPTHLEV, TABLE, CSRC     =       read_bifparam_table(self.CPTHOUT, self.LPTHBIN)
 
+            with open(log_filename, 'a') as log_file:
+                log_file.write(f"Bifurcation channel dimantion:   {self.NPTHOUT,    self.NPTHLEV}\n")
+                if CSRC != self.CPTHOUT:
+                    log_file.write(f"Bifurcation channel table from binary sidecar:   {CSRC}\n")
+                log_file.flush()
+                log_file.close()
+
+            data                =           torch.from_numpy(TABLE).to(dtype=Datatype.JPRB, device=device)
+            IX, IY, JX, JY      =           data[:, 0],   data[:, 1],  data[:, 2],  data[:, 3]
+            self.PTH_DST        =           Ftensor_1D(data[:, 4].to(dtype=self.PTH_DST_TyPe).contiguous(), start_index=1)
+            self.PELV           =           Ftensor_1D(data[:, 5].clone(), start_index=1)
+            self.PDPH           =           Ftensor_1D(data[:, 6].clone(), start_index=1)
+            PWTH                =           data[:, 7:7 + self.NPTHLEV].to(dtype=self.PTH_WTH_TyPe).contiguous()
+            self.PTH_WTH        =           Ftensor_2D(PWTH, start_row=1, start_col=1)
+
+            self.PTH_UPST       =           Ftensor_1D(self.I2VECTOR[IX.long(), IY.long()].to(dtype=self.PTH_UPST_TyPe), start_index=1)
+            self.PTH_DOWN       =           Ftensor_1D(self.I2VECTOR[JX.long(), JY.long()].to(dtype=self.PTH_DOWN_TyPe), start_index=1)
+            NVALID              =           int(((self.PTH_UPST.raw() > 0) & (self.PTH_DOWN.raw() > 0)).sum())
+
+            #   !!ILEV=1: water channel bifurcation. consider bifurcation channel depth; ILEV>=2: bank top level
+            PTH_ELV_temp        =           torch.full((self.NPTHOUT, self.NPTHLEV), 1.0e20, dtype=self.PTH_ELV_TyPe, device=device)
+            for ILEV in range (1 , self.NPTHLEV+1):
+                if ILEV == 1:
+                    PELV_LEV    =           self.PELV.raw() - self.PDPH.raw()
+                else:
+                    PELV_LEV    =           self.PELV.raw() + ILEV - 2
+                PTH_ELV_temp[:, ILEV-1]     =       torch.where(PWTH[:, ILEV-1] > 0, PELV_LEV.to(dtype=self.PTH_ELV_TyPe),
+                                                                PTH_ELV_temp[:, ILEV-1])
+            self.PTH_ELV        =           Ftensor_2D(PTH_ELV_temp, start_row=1, start_col=1)
+
+            PTH_MAN_temp        =           torch.zeros((self.NPTHLEV), dtype=self.PTH_MAN_TyPe, device=device)
+            self.PTH_MAN        =           Ftensor_1D(PTH_MAN_temp,  start_index=1)
+            self.PTH_MAN[1].fill_   (self.PMANRIV)
+            self.PTH_MAN[2:].fill_  (self.PMANFLD)
+
+            if self.NPTHOUT != NVALID:
                 with open(log_filename, 'a') as log_file:
-                    log_file.write(f"Bifurcation channel dimantion:   {self.NPTHOUT,    self.NPTHLEV}\n")
+                    log_file.write(f"Bifuraction channel outside of domain. Only valid:   {NVALID}\n")
+                    log_file.write(f"CMF::RIVMAP_INIT: end")
                     log_file.flush()
                     log_file.close()
-
-                PTH_UPST_temp      =            torch.zeros((self.NPTHOUT), dtype=self.PTH_UPST_TyPe, device=device)
-                self.PTH_UPST      =            Ftensor_1D(PTH_UPST_temp,  start_index=1)
-                PTH_DOWN_temp      =            torch.zeros((self.NPTHOUT), dtype=self.PTH_DOWN_TyPe, device=device)
-                self.PTH_DOWN      =            Ftensor_1D(PTH_DOWN_temp,  start_index=1)
-                PTH_DST_temp       =            torch.zeros((self.NPTHOUT), dtype=self.PTH_DST_TyPe, device=device)
-                self.PTH_DST       =            Ftensor_1D(PTH_DST_temp,  start_index=1)
-                PTH_ELV_temp       =            torch.zeros((self.NPTHOUT, self.NPTHLEV), dtype=self.PTH_ELV_TyPe, device=device)
-                self.PTH_ELV       =            Ftensor_2D(PTH_ELV_temp, start_row=1, start_col=1)
-                PTH_WTH_temp       =            torch.zeros((self.NPTHOUT, self.NPTHLEV), dtype=self.PTH_WTH_TyPe, device=device)
-                self.PTH_WTH       =            Ftensor_2D(PTH_WTH_temp, start_row=1, start_col=1)
-                PTH_MAN_temp       =            torch.zeros((self.NPTHLEV), dtype=self.PTH_MAN_TyPe, device=device)
-                self.PTH_MAN       =            Ftensor_1D(PTH_MAN_temp,  start_index=1)
-
-                IPTH_Index           =            torch.arange(1, self.NPTHOUT + 1, device=device)
-                with open(self.CPTHOUT, 'rb') as f:
-                    lines           =           f.readlines()
-                    data            =           torch.tensor([[float(value) for value in line.split()] for line in lines[1:]]
-                                                             , dtype=Datatype.JPRB, device=device)
-                    IX, IY, JX, JY                                  =       data[:, 0],   data[:, 1],  data[:, 2],  data[:, 3]
-                    self.PTH_DST[:]                                 =       data[:, 4].to(dtype=self.PTH_DST_TyPe)
-                    PELV_temp                                       =       data[:, 5].clone().detach().to(dtype=Datatype.JPRB, device=device)
-                    self.PELV                                       =       Ftensor_1D(PELV_temp, start_index=1)
-                    PDPH_temp                                       =       data[:, 6].clone().detach().to(dtype=Datatype.JPRB, device=device)
-                    self.PDPH                                       =       Ftensor_1D(PDPH_temp, start_index=1)
-                    self.PTH_WTH[:,:self.NPTHLEV+1]        =       data[:, 7:7 + self.NPTHLEV].to(dtype=self.PTH_WTH_TyPe)
-
-                PTH_UPST            =           self.I2VECTOR[IX.long(), IY.long()]
-                PTH_DOWN            =           self.I2VECTOR[JX.long(), JY.long()]
-                self.PTH_UPST[:]    =           PTH_UPST
-                self.PTH_DOWN[:]    =           PTH_DOWN
-                PU_P_M_ID           =           ((self.PTH_UPST.raw() > 0) & (self.PTH_DOWN.raw() > 0)).nonzero(as_tuple=True)[0]
-                for ILEV in range (1 , self.NPTHLEV+1):
-                    if ILEV == 1:       # !!ILEV=1: water channel bifurcation. consider bifurcation channel depth
-                        PWTH                =           self.PTH_WTH[IPTH_Index,ILEV]
-                        PWTH_P_M            =           (PWTH >   0).nonzero(as_tuple=True)[0]
-                        PWTH_N_M            =           (PWTH <=  0).nonzero(as_tuple=True)[0]
-                        self.PTH_ELV[IPTH_Index[PWTH_P_M],ILEV]  =  self.PELV[IPTH_Index[PWTH_P_M]] - self.PDPH[IPTH_Index[PWTH_P_M]]
-                        self.PTH_ELV[IPTH_Index[PWTH_N_M],ILEV]  =  1.0e20
-                    else:              #  !! ILEV=2: bank top level
-                        PWTH                =           self.PTH_WTH[IPTH_Index,ILEV]
-                        PWTH_P_M = (PWTH > 0).nonzero(as_tuple=True)[0]
-                        PWTH_N_M = (PWTH <= 0).nonzero(as_tuple=True)[0]
-                        self.PTH_ELV[IPTH_Index[PWTH_P_M], ILEV] = self.PELV[IPTH_Index[PWTH_P_M]] + ILEV - 2
-                        self.PTH_ELV[IPTH_Index[PWTH_N_M], ILEV] = 1.0e20
-                f.close()
-                self.PTH_MAN[1].fill_   (self.PMANRIV)
-                self.PTH_MAN[2:].fill_  (self.PMANFLD)
-
-
-                if self.NPTHOUT != PU_P_M_ID.shape[0]:
-                    log_file.write(f"Bifuraction channel outside of domain. Only valid:   {PU_P_M_ID.shape[0]}\n")
-                    log_file.write(f"CMF::RIVMAP_INIT: end")
         # --------------------------------------------------------------------------------------------------------------
         # --------------------------------------------------------------------------------------------------------------
         with open(log_filename, 'a') as log_file:
@@ -508,13 +494,7 @@ class CMF_MAPS_NMLIST_MOD:
                 log_file.close()
 
             #   !*** 3c. Write Map Data
-            if self.REGIONTHIS == 1:
-                with open(config["RDIR"]   +   config["EXP"]    +      "mapdata.txt", "w") as f:
-                    f.write(f"NX    {CC_NMLIST.NX}\n")
-                    f.write(f"NY    {CC_NMLIST.NY}\n")
-                    f.write(f"NLFP  {CC_NMLIST.NLFP}\n")
-                    f.write(f"REGIONALL     {self.REGIONALL}\n")
-                    f.write(f"NSEQMAX       {self.NSEQMAX}\n")
+            self.CMF_MAPDATA_WRITE(CC_NMLIST, config)
 
         # --------------------------------------------------------------------------------------------------------------
         #   !*** 4.  bifurcation channel parameters
@@ -531,6 +511,18 @@ class CMF_MAPS_NMLIST_MOD:
                 log_file.close()
         return
         # --------------------------------------------------------------------------------------------------------------
+    def CMF_MAPDATA_WRITE(self, CC_NMLIST, config):
+        """
+        ! write map dimensions to EXP/mapdata.txt (region 1 only)
+        """
+        if self.REGIONTHIS == 1:
+            with open(config["RDIR"]   +   config["EXP"]    +      "mapdata.txt", "w") as f:
+                f.write(f"NX    {CC_NMLIST.NX}\n")
+                f.write(f"NY    {CC_NMLIST.NY}\n")
+                f.write(f"NLFP  {CC_NMLIST.NLFP}\n")
+                f.write(f"REGIONALL     {self.REGIONALL}\n")
+                f.write(f"NSEQMAX       {self.NSEQMAX}\n")
+        # --------------------------------------------------------------------------------------------------------------
     def CMF_TOPO_INIT(self, CC_NMLIST,       log_filename,      Datatype,         CU):
         """
         ! read & set topography map
@@ -544,138 +536,42 @@ class CMF_MAPS_NMLIST_MOD:
         # --------------------------------------------------------------------------------------------------------------
         # --------------------------------------------------------------------------------------------------------------
         def READ_TOPO_BIN(CC_NMLIST,log_filename,device,Datatype,CMF_UTILS_Class):
-            import numpy as np
-
-            R2TEMP_TyPe             =           Datatype.JPRM
-        # --------------------------------------------------------------------------------------------------------------
-            R2TEMP                  =           torch.zeros((CC_NMLIST.NX, CC_NMLIST.NY), dtype=R2TEMP_TyPe, device=device)
-            R2TEMP                  =           Ftensor_2D(R2TEMP, start_row=1, start_col=1)
-
-
-        # --------------------------------------------------------------------------------------------------------------
-        # D2GRAREA:  catchment area
-        # role    :  represents the catchment area upstream of each grid cell, used to quantify the contributing flow
-        #            accumulation in hydrological modeling.
-            with open(log_filename, 'a') as log_file:
-                log_file.write(f"TOPO_INIT: unit-catchment area :   {self.CGRAREA}\n")
-                log_file.flush()
-                log_file.close()
-
-            with open(self.CGRAREA, 'rb') as f:
-                buffer              =           f.read(4 * CC_NMLIST.NX * CC_NMLIST.NY)
-                data_np             =           np.frombuffer(buffer, dtype=np.float32).reshape(CC_NMLIST.NY, CC_NMLIST.NX).T
-                R2TEMP[:,:]         =           torch.tensor(data_np, dtype=R2TEMP_TyPe, device=device)
-                self.D2GRAREA       =           CMF_UTILS_Class.mapR2vecD(R2TEMP, self.I1SEQX, self.I1SEQY, self.NSEQMAX, device)
-                f.close()
-        # --------------------------------------------------------------------------------------------------------------
-        # D2ELEVTN:  bank top elevation
-        # role    :  represents the elevation of the riverbank top for each grid cell, which is used to assess potential
-        #            overflow and channel capacity.
-            with open(log_filename, 'a') as log_file:
-                log_file.write(f"TOPO_INIT: ground elevation :   {self.CELEVTN}\n")
-                log_file.flush()
-                log_file.close()
-
-            with open(self.CELEVTN, 'rb') as f:
-                buffer              =           f.read(4 * CC_NMLIST.NX * CC_NMLIST.NY)
-                data_np             =           np.frombuffer(buffer, dtype=np.float32).reshape(CC_NMLIST.NY, CC_NMLIST.NX).T
-                R2TEMP[:, :]        =           torch.tensor(data_np, dtype=R2TEMP_TyPe, device=device)
-                self.D2ELEVTN       =           CMF_UTILS_Class.mapR2vecD(R2TEMP, self.I1SEQX, self.I1SEQY, self.NSEQMAX, device)
-                f.close()
-        # --------------------------------------------------------------------------------------------------------------
-        # D2NXTDST:  distance to next outlet
-        # role    :  represents the distance from each grid cell to its next downstream outlet, used to determine flow
-        #            path length in routing calculations.
-            with open(log_filename, 'a') as log_file:
-                log_file.write(f"TOPO_INIT: downstream distance :   {self.CNXTDST}\n")
-                log_file.flush()
-                log_file.close()
-
-            with open(self.CNXTDST, 'rb') as f:
-                buffer              =           f.read(4 * CC_NMLIST.NX * CC_NMLIST.NY)
-                data_np             =           np.frombuffer(buffer, dtype=np.float32).reshape(CC_NMLIST.NY, CC_NMLIST.NX).T
-                R2TEMP[:, :]        =           torch.tensor(data_np, dtype=R2TEMP_TyPe, device=device)
-                self.D2NXTDST       =           CMF_UTILS_Class.mapR2vecD(R2TEMP, self.I1SEQX, self.I1SEQY, self.NSEQMAX, device)
-                f.close()
-        # --------------------------------------------------------------------------------------------------------------
-        # D2RIVLEN:  river channel length
-        # role    :  represents the length of the river channel within each grid cell, used to calculate flow travel time
-        #            and hydraulic properties
-            with open(log_filename, 'a') as log_file:
-                log_file.write(f"TOPO_INIT: river channel length :   {self.CRIVLEN}\n")
-                log_file.flush()
-                log_file.close()
-
-            with open(self.CRIVLEN, 'rb') as f:
-                buffer              =           f.read(4 * CC_NMLIST.NX * CC_NMLIST.NY)
-                data_np             =           np.frombuffer(buffer, dtype=np.float32).reshape(CC_NMLIST.NY, CC_NMLIST.NX).T
-                R2TEMP[:, :]        =           torch.tensor(data_np, dtype=R2TEMP_TyPe, device=device)
-                self.D2RIVLEN       =           CMF_UTILS_Class.mapR2vecD(R2TEMP, self.I1SEQX, self.I1SEQY, self.NSEQMAX, device)
-                f.close()
-        # --------------------------------------------------------------------------------------------------------------
-        # D2FLDHGT:  floodplain elevation profile
-        # role    :  represents the elevation profile of the floodplain for each grid cell, used to simulate floodplain
-        #            inundation and overbank flow dynamics.
-            with open(log_filename, 'a') as log_file:
-                log_file.write(f"TOPO_INIT: floodplain elevation profile :   {self.CFLDHGT}\n")
-                log_file.flush()
-                log_file.close()
-
-            with open(self.CFLDHGT, 'rb') as f:
-                for ILFP in range(CC_NMLIST.NLFP):
-                    buffer          =           f.read(4 * CC_NMLIST.NX * CC_NMLIST.NY)
-                    data_np         =           np.frombuffer(buffer, dtype=np.float32).reshape(CC_NMLIST.NY, CC_NMLIST.NX).T
-                    R2TEMP[:, :]    =           torch.tensor(data_np, dtype=R2TEMP_TyPe, device=device)
-                    D2TEMP          =           CMF_UTILS_Class.mapR2vecD(R2TEMP, self.I1SEQX, self.I1SEQY, self.NSEQMAX, device)
-                    self.D2FLDHGT[:, :, ILFP+1] = D2TEMP.raw()
-                f.close()
-
-            #   !*** river channel / groundwater parameters)
-        # --------------------------------------------------------------------------------------------------------------
-        # D2RIVHGT:  channel depth
-        # role    :  represents the depth of the river channel in each grid cell, used to determine channel capacity and
-        #            flow depth in hydrodynamic modeling.
-            with open(log_filename, 'a') as log_file:
-                log_file.write(f"TOPO_INIT: floodplain elevation profile :   {self.CRIVHGT}\n")
-                log_file.flush()
-                log_file.close()
-
-            with open(self.CRIVHGT, 'rb') as f:
-                buffer              =           f.read(4 * CC_NMLIST.NX * CC_NMLIST.NY)
-                data_np             =           np.frombuffer(buffer, dtype=np.float32).reshape(CC_NMLIST.NY, CC_NMLIST.NX).T
-                R2TEMP[:, :]        =           torch.tensor(data_np, dtype=R2TEMP_TyPe, device=device)
-                self.D2RIVHGT       =           CMF_UTILS_Class.mapR2vecD(R2TEMP, self.I1SEQX, self.I1SEQY, self.NSEQMAX, device)
-                f.close()
-        # --------------------------------------------------------------------------------------------------------------
-        # D2RIVWTH:  channel width
-        # role    :  represents the width of the river channel in each grid cell, used to calculate flow capacity and
-        #            water movement within the channel.
-            with open(log_filename, 'a') as log_file:
-                log_file.write(f"TOPO_INIT: river channel width :   {self.CRIVWTH}\n")
-                log_file.flush()
-                log_file.close()
-
-            with open(self.CRIVWTH, 'rb') as f:
-                buffer              =           f.read(4 * CC_NMLIST.NX * CC_NMLIST.NY)
-                data_np             =           np.frombuffer(buffer, dtype=np.float32).reshape(CC_NMLIST.NY, CC_NMLIST.NX).T
-                R2TEMP[:, :]        =           torch.tensor(data_np, dtype=R2TEMP_TyPe, device=device)
-                self.D2RIVWTH       =           CMF_UTILS_Class.mapR2vecD(R2TEMP, self.I1SEQX, self.I1SEQY, self.NSEQMAX, device)
-                f.close()
         # --------------------------------------------------------------------------------------------------------------
-        # D2RIVMAN:  river manning coefficient
-        # role    :  represents the Manning's roughness coefficient for the river channel in each grid cell,
-        #            used to estimate flow resistance and velocity in hydraulic modeling.
+        # D2GRAREA:  catchment area            ; upstream contributing area of each grid cell
+        # D2ELEVTN:  bank top elevation        ; used to assess potential overflow and channel capacity
+        # D2NXTDST:  distance to next outlet   ; flow path length in routing calculations
+        # D2RIVLEN:  river channel length      ; flow travel time and hydraulic properties
+        # D2FLDHGT:  floodplain elevation profile (NLFP records) ; floodplain inundation and overbank flow
+        # D2RIVHGT:  channel depth             ; channel capacity and flow depth
+        # D2RIVWTH:  channel width             ; flow capacity within the channel
+        # D2RIVMAN:  river manning coefficient ; flow resistance and velocity
+        # Each map is memory-mapped and only the NSEQMAX sequence cells are gathered (precomputed flat offsets),
+        # so no full NX x NY copy or transpose is made; the files are read concurrently on a thread pool.
+            TOPO_FILES              =           [("D2GRAREA", self.CGRAREA, 1,              "TOPO_INIT: unit-catchment area :   "),
+                                                 ("D2ELEVTN", self.CELEVTN, 1,              "TOPO_INIT: ground elevation :   "),
+                                                 ("D2NXTDST", self.CNXTDST, 1,              "TOPO_INIT: downstream distance :   "),
+                                                 ("D2RIVLEN", self.CRIVLEN, 1,              "TOPO_INIT: river channel length :   "),
+                                                 ("D2FLDHGT", self.CFLDHGT, CC_NMLIST.NLFP, "TOPO_INIT: floodplain elevation profile :   "),
+                                                 ("D2RIVHGT", self.CRIVHGT, 1,              "TOPO_INIT: floodplain elevation profile :   "),
+                                                 ("D2RIVWTH", self.CRIVWTH, 1,              "TOPO_INIT: river channel width :   "),
+                                                 ("D2RIVMAN", self.CRIVMAN, 1,              "TOPO_INIT: manning coefficient river:   ")]
             with open(log_filename, 'a') as log_file:
-                log_file.write(f"TOPO_INIT: manning coefficient river:   {self.CRIVMAN}\n")
+                for _, CFILE, _, CMSG in TOPO_FILES:
+                    log_file.write(f"{CMSG}{CFILE}\n")
                 log_file.flush()
                 log_file.close()
 
-            with open(self.CRIVMAN, 'rb') as f:
-                buffer              =           f.read(4 * CC_NMLIST.NX * CC_NMLIST.NY)
-                data_np             =           np.frombuffer(buffer, dtype=np.float32).reshape(CC_NMLIST.NY, CC_NMLIST.NX).T
-                R2TEMP[:, :]        =           torch.tensor(data_np, dtype=R2TEMP_TyPe, device=device)
-                self.D2RIVMAN       =           CMF_UTILS_Class.mapR2vecD(R2TEMP, self.I1SEQX, self.I1SEQY, self.NSEQMAX, device)
-                f.close()
+            FLAT                    =           map_flat_offsets(self.I1SEQX, self.I1SEQY, CC_NMLIST.NX, CC_NMLIST.NY)
+            with ThreadPoolExecutor(max_workers=min(len(TOPO_FILES), os.cpu_count() or 1)) as pool:
+                DATA                =           list(pool.map(lambda item: read_map_vec(item[1], item[2], CC_NMLIST.NX,
+                                                                                        CC_NMLIST.NY, FLAT), TOPO_FILES))
+
+            for (NAME, _, _, _), VEC in zip(TOPO_FILES, DATA):
+                VEC                 =           torch.from_numpy(VEC).to(dtype=CMF_UTILS_Class.JPRB, device=device)
+                if NAME == "D2FLDHGT":
+                    self.D2FLDHGT.raw()[:, 0, :]    =   VEC.T
+                else:
+                    setattr(self, NAME, Ftensor_2D(VEC[0].unsqueeze(1).contiguous(), start_row=1, start_col=1))
 
             if CC_NMLIST.LGDWDLY:
                 with open(log_filename, 'a') as log_file:
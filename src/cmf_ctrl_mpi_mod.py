@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@purpose:  MPI-like region control for basin-partitioned CaMa-Flood runs (python, torch.distributed gloo)
+Licensed under the Apache License, Version 2.0.
+
+* CONTAINS:
+! -- CMF_MPI_INIT            : join the region process group (REGIONALL > 1)
+! -- CMF_MPI_END             : leave the region process group
+! -- CMF_MPI_ACTIVE          : True when running with more than one region
+! -- CMF_MPI_REGION_CONFIG   : per-region copy of the run configuration
+! -- CMF_MPI_YEAR_END        : end-of-year file management, region 1 first
+! -- CMF_MPI_AllReduce_R2MAP : merge 2D output maps       (MIN, missing value RMIS is large)
+! -- CMF_MPI_AllReduce_P2MAP : merge 2D restart maps      (SUM, zero outside region)
+! -- CMF_MPI_AllReduce_P1    : reduce global sums         (SUM)
+! -- CMF_MPI_AllReduce_DTMIN : adaptive time step         (MIN, keeps NT identical in all regions)
+
+Regions are groups of whole river basins (see CALC_REGION), so no water is exchanged between
+regions during a time step. Only diagnostics, output maps and the adaptive time step are reduced.
+"""
+import  os
+import copy
+import torch
+import torch.distributed as dist
+
+os.environ['PYTHONWARNINGS']='ignore::FutureWarning'
+os.environ['PYTHONWARNINGS']='ignore::RuntimeWarning'
+
+
+def CMF_MPI_ACTIVE():
+    return dist.is_available() and dist.is_initialized() and dist.get_world_size() > 1
+
+
+def CMF_MPI_REGION_CONFIG(config, REGIONTHIS):
+    """
+    ! region copy of config: REGIONTHIS set, own log file for regions >= 2
+    """
+    region                  =       copy.deepcopy(config)
+    region["REGIONTHIS"]    =       REGIONTHIS
+    if REGIONTHIS > 1:
+        root, ext           =       os.path.splitext(config["LOGOUT"])
+        region["LOGOUT"]    =       f"{root}-{REGIONTHIS:03d}{ext}"
+        root, ext           =       os.path.splitext(config["NMLIST"])
+        region["NMLIST"]    =       f"{root}-{REGIONTHIS:03d}{ext}"
+        region["CSETFILE"]  =       region["NMLIST"]
+    return region
+
+
+def CMF_MPI_INIT(config):
+    """
+    ! join the gloo process group of the REGIONALL regions (one process per region)
+    """
+    REGIONALL = int(config["REGIONALL"]) if "REGIONALL" in config else 1
+    if REGIONALL <= 1 or CMF_MPI_ACTIVE():
+        return
+    if not dist.is_available():
+        raise RuntimeError("REGIONALL > 1 requires torch.distributed, which is not available in this torch build.")
+    init_method = config["CMPIINIT"] if "CMPIINIT" in config else "tcp://127.0.0.1:29500"
+    dist.init_process_group("gloo", init_method=init_method,
+                            rank=int(config["REGIONTHIS"]) - 1, world_size=REGIONALL)
+
+
+def CMF_MPI_YEAR_END(config, run_config_3):
+    """
+    ! end-of-year file management (restart & spin-up moves) by region 1 only;
+    ! other regions keep their log under a per-region name and then update their config
+    """
+    if not CMF_MPI_ACTIVE():
+        return run_config_3(config)
+    dist.barrier()
+    if int(config["REGIONTHIS"]) == 1:
+        config = run_config_3(config)
+    dist.barrier()
+    if int(config["REGIONTHIS"]) > 1:
+        if os.path.exists(config["LOGOUT"]):
+            root, ext = os.path.splitext(config["LOGOUT"])
+            os.replace(config["LOGOUT"], f"{root}-{config['CYR']}{ext}")
+        config = run_config_3(config)
+    return config
+
+
+def CMF_MPI_END():
+    if dist.is_available() and dist.is_initialized():
+        dist.barrier()
+        dist.destroy_process_group()
+
+
+def _allreduce(tensor, op):
+    # gloo reduces CPU tensors only
+    if tensor.device.type == "cpu":
+        dist.all_reduce(tensor, op=op)
+        return tensor
+    host = tensor.cpu()
+    dist.all_reduce(host, op=op)
+    tensor.copy_(host)
+    return tensor
+
+
+def CMF_MPI_AllReduce_R2MAP(R2MAP):
+    if CMF_MPI_ACTIVE():
+        _allreduce(R2MAP.raw(), dist.ReduceOp.MIN)
+    return R2MAP
+
+
+def CMF_MPI_AllReduce_P2MAP(P2MAP):
+    if CMF_MPI_ACTIVE():
+        _allreduce(P2MAP.raw(), dist.ReduceOp.SUM)
+    return P2MAP
+
+
+def CMF_MPI_AllReduce_P1(P1VALS):
+    """
+    ! reduce a list of 0-d global sums (or a tensor of them), returns a tensor of the reduced values
+    """
+    if torch.is_tensor(P1VALS):
+        P1GLB = P1VALS.detach().clone()
+    else:
+        P1GLB = torch.stack([torch.as_tensor(v).reshape(()) for v in P1VALS]).detach().clone()
+    if CMF_MPI_ACTIVE():
+        _allreduce(P1GLB, dist.ReduceOp.SUM)
+    return P1GLB
+
+
+def CMF_MPI_AllReduce_DTMIN(DT_MIN):
+    if CMF_MPI_ACTIVE():
+        _allreduce(DT_MIN, dist.ReduceOp.MIN)
+    return DT_MIN
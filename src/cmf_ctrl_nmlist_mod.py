@@ -73,6 +73,15 @@ class CMF_CTRL_NMLIST_MOD:
         self.LMAPEND        =       config["LMAPEND"]  if "LMAPEND"  in config  else False             # true: for map data endian conversion
         self.LBITSAFE       =       config["LBITSAFE"] if "LBITSAFE" in config  else False             # true: for Bit Identical (not used from v410, set in Mkinclude)
         self.LSTG_ES        =       config["LSTG_ES"]  if "LSTG_ES"  in config  else False             # true: for Vector Processor optimization (CMF_OPT_FLDSTG_ES)
+        self.LCPUFUSED      =       config["LCPUFUSED"] if "LCPUFUSED" in config  else False           # true: fused Numba substep on the CPU backend (OUTFLW..AVEMAX in one pass)
+        self.COUTFLW_CPU    =       config["COUTFLW_CPU"] if "COUTFLW_CPU" in config  else "tensor"   # CPU OUTFLW kernel: "tensor", "numba", or "check" (run both and compare)
+        self.NCPUCHUNK      =       int(config["NCPUCHUNK"]) if "NCPUCHUNK" in config else 1       # LCPUFUSED: number of basin chunks updated in parallel (1: serial cell order)
+        self.LMULTIRATE     =       config["LMULTIRATE"] if "LMULTIRATE" in config  else False         # LADPSTP+LCPUFUSED: per-basin-group NT=2**k set by its worst cell; pays off only with many small basins
+        self.LACTIVE        =       config["LACTIVE"]  if "LACTIVE"  in config  else False             # LCPUFUSED: run over the per-cell active set (wet cells, their neighbours and downstream); bitwise identical
+        self.CINFLOW        =       config["CINFLOW"]  if "CINFLOW"  in config  else "scatter"         # INFLOW accumulation: "scatter" (index_add_), "gather" (padded upstream matrix) or "csr"
+        self.LWATBAL        =       config["LWATBAL"]  if "LWATBAL"  in config  else True              # true: write water balance monitoring (CALC_WATBAL) to the log file
+        self.NWATBAL        =       int(config["NWATBAL"]) if "NWATBAL" in config else 1           # LWATBAL: substeps buffered on device before one bulk flush to the log
+        self.RSTGTOL        =       float(config["RSTGTOL"]) if "RSTGTOL" in config else 0.0       # FLDSTG: relative storage change below which a cell keeps its stage (0: every cell, every call)
         # --------------------------------------------------------------------------------------------------------------
         # *** 2. Set Model Dimension & Time
         # defaults (from namelist)
@@ -97,8 +106,8 @@ class CMF_CTRL_NMLIST_MOD:
         self.EAST           =       torch.tensor    (180.0,      dtype=Datatype.JPRB,  device=self.device)
         self.NORTH          =       torch.tensor    (90.0,       dtype=Datatype.JPRB,  device=self.device)
         self.SOUTH          =       torch.tensor    (-90.0,           dtype=Datatype.JPRB,  device=self.device)
-        self.REGIONALL      =       1
-        self.REGIONTHIS     =       1
+        self.REGIONALL      =       int(config["REGIONALL"]) if "REGIONALL" in config else 1      # number of regions (basin groups), one process each
+        self.REGIONTHIS     =       int(config["REGIONTHIS"]) if "REGIONTHIS" in config else 1    # region of this process (1..REGIONALL)
         ##============================
         #   #*** 1h. Output Settings
         self.IFRQ_OUT       =       config["IFRQ_OUT"] if "IFRQ_OUT" in config else 24  # output frequency: [1,2,3,...,24] hour
@@ -191,6 +200,15 @@ class CMF_CTRL_NMLIST_MOD:
             log_file.write(f"LMAPEND                                    {self.LMAPEND}\n")
             log_file.write(f"LBITSAFE                                   {self.LBITSAFE}\n")
             log_file.write(f"LSTG_ES                                    {self.LSTG_ES}\n")
+            log_file.write(f"LCPUFUSED                                  {self.LCPUFUSED}\n")
+            log_file.write(f"COUTFLW_CPU                                {self.COUTFLW_CPU}\n")
+            log_file.write(f"NCPUCHUNK                                  {self.NCPUCHUNK}\n")
+            log_file.write(f"LMULTIRATE                                 {self.LMULTIRATE}\n")
+            log_file.write(f"LACTIVE                                    {self.LACTIVE}\n")
+            log_file.write(f"CINFLOW                                    {self.CINFLOW}\n")
+            log_file.write(f"LWATBAL                                    {self.LWATBAL}\n")
+            log_file.write(f"NWATBAL                                    {self.NWATBAL}\n")
+            log_file.write(f"RSTGTOL                                    {self.RSTGTOL}\n")
         # --------------------------------------------------------------------------------------------------------------
             # Write model dimension and time settings to the log file
             log_file.write("\n=== NAMELIST, NCONF ===\n")
@@ -230,7 +248,7 @@ class CMF_CTRL_NMLIST_MOD:
             log_file.write("--------------------!")
             log_file.write("\n")
             if self.REGIONALL >= 2:
-                log_file.write(f"REGIONTHIS  {self.REGIONTHIS.strip()}\n")              # Regional output for MPI run
+                log_file.write(f"REGIONTHIS  {self.REGIONTHIS}\n")              # Regional output for MPI run
             log_file.flush()
             log_file.close()
         # --------------------------------------------------------------------------------------------------------------
@@ -279,6 +297,55 @@ class CMF_CTRL_NMLIST_MOD:
                 log_file.write(f"LGDWDLY=true and LROSPLIT=false")
                 log_file.write(f"Ground water reservoir can only be active when runoff splitting is om")
 
+            if self.LCPUFUSED and self.EXECUTION_BACKEND != "cpu":
+                log_file.write(f"LCPUFUSED=true and device={self.device}")
+                log_file.write(f"fused substep is only available on the CPU backend")
+                raise ValueError("Stop: LCPUFUSED=.true. requires device=cpu.")
+
+            if self.NCPUCHUNK < 1:
+                log_file.write(f"NCPUCHUNK={self.NCPUCHUNK}")
+                log_file.write(f"NCPUCHUNK should be >= 1")
+                raise ValueError("Stop: NCPUCHUNK should be >= 1.")
+
+            if self.NWATBAL < 1:
+                log_file.write(f"NWATBAL={self.NWATBAL}")
+                log_file.write(f"NWATBAL should be >= 1")
+                raise ValueError("Stop: NWATBAL should be >= 1.")
+            if self.RSTGTOL < 0.0:
+                log_file.write(f"RSTGTOL={self.RSTGTOL}")
+                log_file.write(f"RSTGTOL should be >= 0")
+                raise ValueError("Stop: RSTGTOL should be >= 0.")
+
+            if self.LMULTIRATE and not (self.LADPSTP and self.LCPUFUSED):
+                log_file.write(f"LMULTIRATE=true, LADPSTP={self.LADPSTP}, LCPUFUSED={self.LCPUFUSED}")
+                log_file.write(f"multi-rate time stepping is an option of the fused CPU adaptive time step")
+                raise ValueError("Stop: LMULTIRATE=.true. requires LADPSTP=.true. and LCPUFUSED=.true.")
+
+            if self.LMULTIRATE and self.LPTHOUT:
+                log_file.write(f"LMULTIRATE=true and LPTHOUT=true")
+                log_file.write(f"bifurcation flow is not sub-cycled per basin")
+                raise ValueError("Stop: LMULTIRATE=.true. is not supported with LPTHOUT=.true.")
+
+            if self.LACTIVE and (not self.LCPUFUSED or self.LMULTIRATE):
+                log_file.write(f"LACTIVE=true, LCPUFUSED={self.LCPUFUSED}, LMULTIRATE={self.LMULTIRATE}")
+                log_file.write(f"LACTIVE requires LCPUFUSED without LMULTIRATE")
+                raise ValueError("Stop: LACTIVE=.true. requires LCPUFUSED=.true. and LMULTIRATE=.false.")
+
+            if self.CINFLOW not in ("scatter", "gather", "csr"):
+                log_file.write(f"CINFLOW={self.CINFLOW}")
+                log_file.write(f"CINFLOW should be one of scatter, gather, csr")
+                raise ValueError("Stop: CINFLOW should be one of 'scatter', 'gather', 'csr'.")
+
+            if self.COUTFLW_CPU not in ("tensor", "numba", "check"):
+                log_file.write(f"COUTFLW_CPU={self.COUTFLW_CPU}")
+                log_file.write(f"COUTFLW_CPU should be one of tensor, numba, check")
+                raise ValueError("Stop: COUTFLW_CPU should be one of 'tensor', 'numba', 'check'.")
+
+            if self.REGIONALL < 1 or not (1 <= self.REGIONTHIS <= self.REGIONALL):
+                log_file.write(f"REGIONALL={self.REGIONALL}, REGIONTHIS={self.REGIONTHIS}")
+                log_file.write(f"REGIONTHIS should be in 1..REGIONALL")
+                raise ValueError("Stop: REGIONTHIS should be in 1..REGIONALL.")
+
             if self.LWEVAPFIX and not self.LWEVAP:
                 log_file.write(f"LWEVAPFIX=true and LWEVAP=false")
                 log_file.write(f"LWEVAPFIX can only be active if LWEVAP is active")
@@ -17,6 +17,7 @@ import  os
 import re
 import torch
 from fortran_tensor_2D import Ftensor_2D
+from cmf_ctrl_mpi_mod import CMF_MPI_AllReduce_R2MAP, CMF_MPI_AllReduce_P2MAP
 
 os.environ['PYTHONWARNINGS']='ignore::FutureWarning'
 os.environ['PYTHONWARNINGS']='ignore::RuntimeWarning'
@@ -98,6 +99,8 @@ class CMF_OUTPUT_NMLIST_MOD:
         self.LOUTCDF                    =           config['LOUTCDF']       if 'LOUTCDF'  in config   else self.LOUTCDF
         self.NDLEVEL                    =           config['NDLEVEL']       if 'NDLEVEL'  in config   else self.NDLEVEL
         self.IFRQ_OUT                   =           config['IFRQ_OUT']      if 'IFRQ_OUT' in config   else self.IFRQ_OUT
+        if self.LOUTVEC and CC_NMLIST.REGIONALL > 1:
+            raise RuntimeError("LOUTVEC with REGIONALL > 1 is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
 
         # !
         self.LOUTTXT                    =           config['LOUTTXT']       if 'LOUTTXT' in config   else self.LOUTTXT
@@ -388,7 +391,7 @@ class CMF_OUTPUT_NMLIST_MOD:
 
             NCFILE = _netcdf_dataset(self.VAROUT[JF].CFILE, 'a', format='NETCDF4')
             # XTIME:    ! seconds since start of the run !
-            XTIME                                =       ((CT_NMLIST.KMINNEXT - CT_NMLIST.KMINSTART) * 60).to(dtype=Datatype.JPRB)  #    !! for netCDF
+            XTIME                                =       torch.tensor((CT_NMLIST.KMINNEXT - CT_NMLIST.KMINSTART) * 60, dtype=Datatype.JPRB)  #    !! for netCDF
 
             NCFILE.variables['time'][self.VAROUT[JF].IRECNC-1]                             =       XTIME.cpu().numpy()  # equivalent to NF90_PUT_VAR for time
             NCFILE.variables[self.VAROUT[JF].CVNAME][self.VAROUT[JF].IRECNC-1, :, :]       =       R2OUT.raw().T.cpu().numpy()
@@ -518,6 +521,13 @@ class CMF_OUTPUT_NMLIST_MOD:
                         continue
                     R1POUT[:, :]     =                  CC_VARS.D1PTHFLW_oAVG[:, :].to(dtype=torch.float64)
 
+                #   !*** 2b. merge regions (each region holds whole basins)
+                if self.VAROUT[JF].CVNAME               !=      'pthflw':
+                    if not self.LOUTVEC:
+                        R2OUT                           =       CMF_MPI_AllReduce_R2MAP(R2OUT)
+                else:
+                    R1POUT                              =       CMF_MPI_AllReduce_P2MAP(R1POUT)
+
                 #   !*** 3. write D2VEC to output file
                 if self.LOUTCDF:
                     if CM_NMLIST.REGIONTHIS == 1:
@@ -11,6 +11,7 @@ Licensed under the Apache License, Version 2.0.
 * CONTAINS:
 ! -- CMF_PROG_INIT      : Initialize Prognostic variables (include restart data handling)
 ! -- CMF_DIAG_INIT      : Initialize Diagnostic variables
+! -- CMF_PHYSICS_WATBAL_FLUSH : write the buffered water balance rows to the log
 """
 import  os
 import torch
@@ -20,6 +21,8 @@ from cmf_calc_pthout_mod import CMF_CALC_PTHOUT
 from cmf_calc_stonxt_mod import CMF_CALC_STONXT
 import cmf_calc_fldstg_cpu
 import cmf_calc_fldstg_cuda
+import cmf_calc_substep_cpu
+from cmf_ctrl_mpi_mod import CMF_MPI_AllReduce_P1, CMF_MPI_AllReduce_DTMIN
 os.environ['PYTHONWARNINGS']='ignore::FutureWarning'
 os.environ['PYTHONWARNINGS']='ignore::RuntimeWarning'
 
@@ -35,33 +38,19 @@ def CMF_PHYSICS_ADVANCE(CC_NMLIST, CM_NMLIST, CT_NMLIST ,log_filename, device, D
         and slope. This value is used to update the global simulation time step (DT) and the number of iterations (NT)
         to satisfy the CFL condition (Courant–Friedrichs–Lewy stability criterion).
         """
-        if torch.is_tensor(DT_DEF):
-            DT_DEF_T                                =           DT_DEF.to(dtype=Datatype.JPRB, device=device)
+        DT_DEF_FLOAT                                =           float(DT_DEF)
+        IDX, DDST                                   =           _get_adpstp_cache(CC_NMLIST, CM_NMLIST, device)
+        if IDX.numel() > 0:
+            #   river cells use the distance to the downstream cell, river mouths PDSTMTH
+            DDPH                                    =           torch.clamp(CC_VARS.D2RIVDPH.raw()[IDX, 0], min=0.01)
+            DT_MIN                                  =           torch.clamp(torch.min(CC_NMLIST.PCADP * DDST *
+                                                                                      (CC_NMLIST.PGRV * DDPH)**(-0.5)),
+                                                                            max=DT_DEF_FLOAT)
         else:
-            DT_DEF_T                                =           torch.tensor(DT_DEF, dtype=Datatype.JPRB, device=device)
-        DT_MIN                                      =           DT_DEF_T.clone()
-        NR_Index                                    =           torch.arange(1, CM_NMLIST.NSEQRIV + 1,device=device)
-        I_E_M                                       =           (CM_NMLIST.I2MASK[NR_Index, 1] == 0).nonzero(as_tuple=True)[0]
-        if not I_E_M is None:
-            CC_VARS.DDPH[NR_Index[I_E_M], 1]            =           torch.maximum(CC_VARS.D2RIVDPH[NR_Index[I_E_M], 1],
-                                                                              torch.tensor(0.01, dtype=Datatype.JPRB,device=device))
-            CC_VARS.DDST[NR_Index[I_E_M], 1]            =           CM_NMLIST.D2NXTDST[NR_Index[I_E_M], 1]
-            DT_MIN_temp                                 =           torch.min(CC_NMLIST.PCADP*CC_VARS.DDST[NR_Index[I_E_M],1]*
-                                                                              (CC_NMLIST.PGRV * CC_VARS.DDPH[NR_Index[I_E_M] ,1])**(-0.5))
-            DT_MIN                                      =           torch.minimum(DT_MIN_temp, DT_MIN)
-        #   Calculate the minimum time step for river channel cells
-        NRA_Index                                   =           torch.arange(CM_NMLIST.NSEQRIV+1, CM_NMLIST.NSEQALL+1,device=device)
-        I_P_M                                       =           (CM_NMLIST.I2MASK[NRA_Index, 1] == 0).nonzero(as_tuple=True)[0]
-        if not I_P_M is None:
-            CC_VARS.DDPH[NRA_Index[I_P_M], 1]            =           torch.maximum(CC_VARS.D2RIVDPH[NRA_Index[I_P_M], 1],
-                                                                                torch.tensor(0.01, dtype=Datatype.JPRB, device=device))
-            CC_VARS.DDST[NRA_Index[I_P_M], 1]            =           CC_NMLIST.PDSTMTH
-            DT_MIN_temp                                  =           torch.min(CC_NMLIST.PCADP*CC_VARS.DDST[NRA_Index[I_P_M],1]*
-                                                                                            (CC_NMLIST.PGRV * CC_VARS.DDPH[NRA_Index[I_P_M] ,1])**(-0.5))
-            DT_MIN                                       =           torch.minimum(DT_MIN_temp, DT_MIN)
-
-        DT_DEF_FLOAT                                =           float(DT_DEF_T.detach().cpu().item())
-        DT_MIN_FLOAT                                =           float(DT_MIN.detach().cpu().item())
+            DT_MIN                                  =           torch.tensor(DT_DEF_FLOAT, dtype=Datatype.JPRB, device=device)
+
+        DT_MIN                                      =           CMF_MPI_AllReduce_DTMIN(DT_MIN)     # !! same NT in every region
+        DT_MIN_FLOAT                                =           float(DT_MIN)                        # !! the only host sync: NT drives the loop
         CC_NMLIST.NT                                =           int(DT_DEF_FLOAT / DT_MIN_FLOAT - 0.01) + 1
         CC_NMLIST.DT                                =           DT_DEF_FLOAT / float(CC_NMLIST.NT)
 
@@ -90,8 +79,11 @@ def CMF_PHYSICS_ADVANCE(CC_NMLIST, CM_NMLIST, CT_NMLIST ,log_filename, device, D
     # ------------------------------------------------------------------------------------------------------------------
     # ------------------------------------------------------------------------------------------------------------------
     def CALC_WATBAL(IT, CU, CT_NMLIST, CC_VARS, CC_NMLIST, Datatype, device, log_filename):
-
-        DORD = torch.tensor(1e-9, dtype=Datatype.JPRB, device=device)
+        """
+        ! buffer the global water balance of this substep on device; flushed to the log every NWATBAL substeps
+        """
+        if not CC_NMLIST.LWATBAL:
+            return
         # ------------------------------------------------------------------------------------------------------------------
         DT_SECONDS = CC_NMLIST.DT.detach().cpu().item() if torch.is_tensor(CC_NMLIST.DT) else CC_NMLIST.DT
         PKMIN = int(CT_NMLIST.KMIN + IT * DT_SECONDS / 60.0)
@@ -99,31 +91,13 @@ def CMF_PHYSICS_ADVANCE(CC_NMLIST, CM_NMLIST, CT_NMLIST ,log_filename, device, D
         PYEAR, PMON, PDAY = CU.SPLITDATE(PYYYYMMDD)
         PHOUR, PMIN = CU.SPLITHOUR(PHHMM)
 
-        # ! poisitive error when water appears from somewhere, negative error when water is lost to somewhere
-        # !! water ballance error1 (discharge calculation)   [m3]
-        DERROR = - (
-                    CC_VARS.P0GLBSTOPRE - CC_VARS.P0GLBSTONXT + CC_VARS.P0GLBRIVINF - CC_VARS.P0GLBRIVOUT)  # !! flux  calc budget error
-        # !! water ballance error2 (flood stage calculation) [m3]
-        DERROR2 = - (CC_VARS.P0GLBSTOPRE2 - CC_VARS.P0GLBSTONEW2)  # !! flux  calc budget error
-        with open(log_filename, 'a') as log_file:
-            log_file.write(
-                f"{PYEAR:04}/{PMON:02}/{PDAY:02}_{PHOUR:02}:{PMIN:02}"
-                f"{IT:6d} flx: "
-                f"{(CC_VARS.P0GLBSTOPRE * DORD).item():12.3f}"
-                f"{(CC_VARS.P0GLBSTONXT * DORD).item():12.3f}"
-                f"{(CC_VARS.P0GLBSTONEW * DORD).item():12.3f}"
-                f"{(DERROR * DORD).item():12.3e}  "
-                f"{(CC_VARS.P0GLBRIVINF * DORD).item():12.3f}"
-                f"{(CC_VARS.P0GLBRIVOUT * DORD).item():12.3f} stg: "
-                f"{(CC_VARS.P0GLBSTOPRE2 * DORD).item():12.3f}"
-                f"{(CC_VARS.P0GLBSTONEW2 * DORD).item():12.3f}"
-                f"{(DERROR2 * DORD).item():12.3e}  "
-                f"{(CC_VARS.P0GLBRIVSTO * DORD).item():12.3f}"
-                f"{(CC_VARS.P0GLBFLDSTO * DORD).item():12.3f}"
-                f"{(CC_VARS.P0GLBFLDARE * DORD).item():12.3f}\n"
-            )
-            log_file.flush()
-            log_file.close()
+        LFULL = CC_VARS.WATBAL.push(
+            f"{PYEAR:04}/{PMON:02}/{PDAY:02}_{PHOUR:02}:{PMIN:02}{IT:6d}",
+            [CC_VARS.P0GLBSTOPRE,   CC_VARS.P0GLBSTONXT,    CC_VARS.P0GLBSTONEW,    CC_VARS.P0GLBRIVINF,
+             CC_VARS.P0GLBRIVOUT,   CC_VARS.P0GLBSTOPRE2,   CC_VARS.P0GLBSTONEW2,   CC_VARS.P0GLBRIVSTO,
+             CC_VARS.P0GLBFLDSTO,   CC_VARS.P0GLBFLDARE])
+        if LFULL:
+            CMF_PHYSICS_WATBAL_FLUSH(CC_NMLIST, CC_VARS, log_filename)
         return
     # ------------------------------------------------------------------------------------------------------------------
     # ------------------------------------------------------------------------------------------------------------------
@@ -133,13 +107,42 @@ def CMF_PHYSICS_ADVANCE(CC_NMLIST, CM_NMLIST, CT_NMLIST ,log_filename, device, D
 
     CC_NMLIST.NT = 1
 
-    if CC_NMLIST.LADPSTP:           # ! adoptive time step
+    if CC_NMLIST.LADPSTP and not CC_NMLIST.LMULTIRATE:           # ! adoptive time step (multi-rate: per basin below)
 
         CC_VARS, CC_NMLIST      =       CALC_ADPSTP(DT_DEF, CC_VARS, CC_NMLIST, CM_NMLIST, Datatype)
     CC_VARS             =           CMF_DIAG_RESET_ADPSTP(log_filename, CC_VARS, CT_NMLIST, CC_NMLIST, CM_NMLIST, device, Datatype)          #   !! average & max calculation: reset
 
     #   !! ==========
     for IT in range (1,CC_NMLIST.NT+1):
+        if CC_NMLIST.LCPUFUSED:
+            # !=== 1.-5. fused CPU substep (OUTFLW, PTHOUT, INFLOW, VARS_PRE, STONXT, FLDSTG, AVEMAX)
+            if CC_NMLIST.LKINE:
+                raise RuntimeError("LKINE is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
+            elif CC_NMLIST.LSLPMIX:
+                raise RuntimeError("LSLPMIX is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
+            if CC_NMLIST.LDAMOUT:
+                raise RuntimeError("LDAMOUT is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
+            if CC_NMLIST.LPTHOUT and CC_NMLIST.LLEVEE:
+                raise RuntimeError("LLEVEE PTHOUT is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
+            if CC_NMLIST.LLEVEE:
+                raise RuntimeError("LLEVEE FLDSTG is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
+            if CC_NMLIST.LSTG_ES:
+                raise RuntimeError("LSTG_ES is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
+            if CC_NMLIST.LMULTIRATE:
+                # !=== multi-rate: every basin group sub-cycles with its own NT = 2**k over the outer step
+                CC_VARS, NTMAX, NCELL_CLASS     =       (cmf_calc_substep_cpu.CMF_CALC_SUBSTEP_CPU_MULTIRATE
+                                                         (CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype, DT_DEF))
+                if NTMAX > 2:
+                    with open(log_filename, 'a') as log_file:
+                        log_file.write(f"\nADPSTP: NTMAX={NTMAX:4d}, DT_DEF={float(DT_DEF):10.2f}, cells (NT:count)="
+                                       f"{', '.join(f'{NT}:{NCELL}' for NT, NCELL in sorted(NCELL_CLASS.items()))}\n")
+                        log_file.flush()
+                        log_file.close()
+            else:
+                CC_VARS     =       cmf_calc_substep_cpu.CMF_CALC_SUBSTEP_CPU(CC_NMLIST, CM_NMLIST, CC_VARS, device, Datatype)
+            CALC_WATBAL(IT,CU,CT_NMLIST,CC_VARS,CC_NMLIST,Datatype,device,log_filename)
+            continue
+
         # !=== 1. Calculate river discharge
         if CC_NMLIST.LKINE:
             raise RuntimeError("LKINE is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
@@ -204,6 +207,68 @@ def CMF_PHYSICS_ADVANCE(CC_NMLIST, CM_NMLIST, CT_NMLIST ,log_filename, device, D
 
     return CC_VARS, CC_NMLIST, CM_NMLIST
 
+# --------------------------------------------------------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------
+def _get_adpstp_cache(CC_NMLIST, CM_NMLIST, device):
+    """
+    ! static CALC_ADPSTP index set (I2MASK == 0, rivers then mouths) and the distance DDST of each cell
+    """
+    I2MASK = CM_NMLIST.I2MASK.raw()
+    D2NXTDST = CM_NMLIST.D2NXTDST.raw()
+    key = (id(CM_NMLIST), int(CM_NMLIST.NSEQRIV), int(CM_NMLIST.NSEQALL), id(I2MASK), id(D2NXTDST),
+           float(CC_NMLIST.PDSTMTH), str(device))
+    cache = getattr(CC_NMLIST, "_ADPSTP_CACHE", None)
+    if cache is not None and cache["key"] == key:
+        return cache["idx"], cache["ddst"]
+
+    IDX = (I2MASK[:CM_NMLIST.NSEQALL, 0] == 0).nonzero(as_tuple=True)[0]
+    DDST = torch.where(IDX < CM_NMLIST.NSEQRIV, D2NXTDST[IDX, 0],
+                       torch.full_like(D2NXTDST[IDX, 0], float(CC_NMLIST.PDSTMTH)))
+    CC_NMLIST._ADPSTP_CACHE = {"key": key, "idx": IDX.to(device), "ddst": DDST.contiguous().to(device)}
+    return CC_NMLIST._ADPSTP_CACHE["idx"], CC_NMLIST._ADPSTP_CACHE["ddst"]
+
+# --------------------------------------------------------------------------------------------------------------
+# --------------------------------------------------------------------------------------------------------------
+def CMF_PHYSICS_WATBAL_FLUSH(CC_NMLIST, CC_VARS, log_filename):
+    """
+    ! write the buffered water balance rows: one all-reduce and one device-to-host copy per flush
+    """
+    WATBAL = getattr(CC_VARS, "WATBAL", None)
+    if WATBAL is None or not WATBAL.STAMP:
+        return
+    STAMP, P1ROWS = WATBAL.take()
+    P1ROWS = CMF_MPI_AllReduce_P1(P1ROWS).cpu().tolist()         # !! global sums over all regions
+    if CC_NMLIST.REGIONTHIS != 1:       # !! global balance is logged by region 1
+        return
+    DORD = 1e-9
+    with open(log_filename, 'a') as log_file:
+        for PREFIX, (P0GLBSTOPRE,   P0GLBSTONXT,    P0GLBSTONEW,    P0GLBRIVINF,    P0GLBRIVOUT,
+                     P0GLBSTOPRE2,  P0GLBSTONEW2,   P0GLBRIVSTO,    P0GLBFLDSTO,    P0GLBFLDARE) in zip(STAMP, P1ROWS):
+            # ! poisitive error when water appears from somewhere, negative error when water is lost to somewhere
+            # !! water ballance error1 (discharge calculation)   [m3]
+            DERROR = - (
+                        P0GLBSTOPRE - P0GLBSTONXT + P0GLBRIVINF - P0GLBRIVOUT)  # !! flux  calc budget error
+            # !! water ballance error2 (flood stage calculation) [m3]
+            DERROR2 = - (P0GLBSTOPRE2 - P0GLBSTONEW2)  # !! flux  calc budget error
+            log_file.write(
+                f"{PREFIX} flx: "
+                f"{P0GLBSTOPRE * DORD:12.3f}"
+                f"{P0GLBSTONXT * DORD:12.3f}"
+                f"{P0GLBSTONEW * DORD:12.3f}"
+                f"{DERROR * DORD:12.3e}  "
+                f"{P0GLBRIVINF * DORD:12.3f}"
+                f"{P0GLBRIVOUT * DORD:12.3f} stg: "
+                f"{P0GLBSTOPRE2 * DORD:12.3f}"
+                f"{P0GLBSTONEW2 * DORD:12.3f}"
+                f"{DERROR2 * DORD:12.3e}  "
+                f"{P0GLBRIVSTO * DORD:12.3f}"
+                f"{P0GLBFLDSTO * DORD:12.3f}"
+                f"{P0GLBFLDARE * DORD:12.3f}\n"
+            )
+        log_file.flush()
+        log_file.close()
+    return
+
 # --------------------------------------------------------------------------------------------------------------
 # --------------------------------------------------------------------------------------------------------------
 def CMF_PHYSICS_FLDSTG(CM_NMLIST,CC_NMLIST,CC_VARS,device, Datatype):
@@ -215,6 +280,14 @@ def CMF_PHYSICS_FLDSTG(CM_NMLIST,CC_NMLIST,CC_VARS,device, Datatype):
     if CC_NMLIST.LSTG_ES:
         raise RuntimeError("LSTG_ES is not supported in the formal CaMa-PyTorch v1.0 CPU/CUDA release.")
 
+    # !! skip the pass when the stage already belongs to this storage: the end of the previous outer step
+    # !! (last substep / fused substep) and the init pass both leave it up to date
+    STGKEY = (CC_VARS.NSTOVER, id(CC_VARS.P2RIVSTO.raw()), id(CC_VARS.P2FLDSTO.raw()))
+    if CC_VARS.STGKEY == STGKEY:
+        return CM_NMLIST,CC_VARS
+    if CC_VARS.STGKEY is not None and CC_VARS.STGKEY[1:] != STGKEY[1:]:
+        CC_VARS.D2STGREF.raw().fill_(-1.0)             # !! storage rebound (restart): every cell once
+
     backend = torch.device(device).type
     if backend == "cpu":
         CM_NMLIST, CC_VARS = cmf_calc_fldstg_cpu.CMF_CALC_FLDSTG_CPU(
@@ -229,5 +302,6 @@ def CMF_PHYSICS_FLDSTG(CM_NMLIST,CC_NMLIST,CC_VARS,device, Datatype):
             f"Unsupported CaMa-PyTorch FLDSTG backend: {backend!r}. "
             "Use CPU or CUDA."
         )
+    CC_VARS.STGKEY = STGKEY
 
     return CM_NMLIST,CC_VARS
@@ -16,6 +16,7 @@ Licensed under the Apache License, Version 2.0.
 import  os
 import re
 from fortran_tensor_2D import Ftensor_2D
+from cmf_ctrl_mpi_mod import CMF_MPI_AllReduce_P2MAP
 import torch
 
 
@@ -192,6 +193,9 @@ class CMF_RESTART_NMLIST_MOD:
         def WRTE_BIN_MAP(P2VAR,TNAM,IREC,CM_NMLIST):
             import numpy as np
             #   !=================
+            #   !! vector -> (NX, NY) map, summed over the regions (each grid belongs to one region)
+            P2MAP                  =        CU.vecP2mapP(P2VAR, CM_NMLIST.I1SEQX, CM_NMLIST.I1SEQY, CM_NMLIST.NSEQMAX, device)
+            P2MAP                  =        CMF_MPI_AllReduce_P2MAP(P2MAP)
             IREC                   =        IREC    +   1
 
             #   !! Double Precision Restart
@@ -199,11 +203,12 @@ class CMF_RESTART_NMLIST_MOD:
                 if CM_NMLIST.REGIONTHIS == 1:
                     with open(TNAM, 'r+b') as f:
                         f.seek((IREC - 1) * 8 * CM_NMLIST.NX * CM_NMLIST.NY)
-                        f.write(P2VAR.raw().numpy().astype(np.float64).tobytes(order='C'))
+                        f.write(P2MAP.raw().cpu().numpy().astype(np.float64).tobytes(order='F'))
 
             #   !! Single Precision Restart
             else:
                 raise NotImplementedError("Single-precision binary restart writing is not supported in CaMa-PyTorch v1.0.")
+            return IREC
         # --------------------------------------------------------------------------------------------------------------
         # --------------------------------------------------------------------------------------------------------------
         def WRTE_REST_BIN(log_filename, CT_NMLIST,CC_NMLIST, CM_NMLIST, CC_VARS):
@@ -218,43 +223,29 @@ class CMF_RESTART_NMLIST_MOD:
                 log_file.flush()
                 log_file.close()
 
-            #   !*** write restart data (2D map)
+            #   !*** write restart data (2D map), region 1 writes the maps gathered from all regions
             TMPNAM              =       CFILE
 
-            if self.LRESTDBL:
-                if CM_NMLIST.REGIONTHIS:
-                    Data            =           torch.zeros((CM_NMLIST.NX, CM_NMLIST.NY), dtype=torch.float64)
-                    with open(CFILE, 'wb') as f:
-                        f.write(Data.numpy().tobytes(order='C'))
-            else:
-                if CM_NMLIST.REGIONTHIS:
-                    Data            =           torch.zeros((CM_NMLIST.NX, CM_NMLIST.NY), dtype=torch.float32)
-                    with open(CFILE, 'wb') as f:
-                        f.write(Data.numpy().tobytes(order='C'))
+            if CM_NMLIST.REGIONTHIS == 1:
+                with open(CFILE, 'wb') as f:
+                    f.truncate(0)
 
             RIREC = 0
-            P2TMP                   =           CC_VARS.P2RIVSTO
-            WRTE_BIN_MAP        (P2TMP, TMPNAM, RIREC)
-            P2TMP                   =           CC_VARS.P2FLDSTO
-            WRTE_BIN_MAP        (P2TMP, TMPNAM, RIREC)
+            RIREC               =       WRTE_BIN_MAP        (CC_VARS.P2RIVSTO,      TMPNAM, RIREC, CM_NMLIST)
+            RIREC               =       WRTE_BIN_MAP        (CC_VARS.P2FLDSTO,      TMPNAM, RIREC, CM_NMLIST)
             #   !!================
             #   !! additional restart data for optional schemes (only write required vars)
             # if not self.LSTOONLY:
-            P2TMP                   =           CC_VARS.D2RIVOUT_PRE
-            WRTE_BIN_MAP        (P2TMP, TMPNAM, RIREC)
-            P2TMP                   =           CC_VARS.D2FLDOUT_PRE
-            WRTE_BIN_MAP        (P2TMP, TMPNAM, RIREC)
-            P2TMP                   =           CC_VARS.D2RIVDPH_PRE
-            WRTE_BIN_MAP        (P2TMP, TMPNAM, RIREC)
-            P2TMP                   =           CC_VARS.D2FLDSTO_PRE
-            WRTE_BIN_MAP        (P2TMP, TMPNAM, RIREC)
+            RIREC               =       WRTE_BIN_MAP        (CC_VARS.D2RIVOUT_PRE,  TMPNAM, RIREC, CM_NMLIST)
+            RIREC               =       WRTE_BIN_MAP        (CC_VARS.D2FLDOUT_PRE,  TMPNAM, RIREC, CM_NMLIST)
+            RIREC               =       WRTE_BIN_MAP        (CC_VARS.D2RIVDPH_PRE,  TMPNAM, RIREC, CM_NMLIST)
+            RIREC               =       WRTE_BIN_MAP        (CC_VARS.D2FLDSTO_PRE,  TMPNAM, RIREC, CM_NMLIST)
             # if self.LSTOONLY:
             # P2TMP                   =           CC_VARS.P2GDWSTO
             # # if self.LDAMOUT:
             # P2TMP                   =           CC_VARS.P2DAMSTO
             # # if self.LLEVEE:
             # P2TMP                   =           CC_VARS.P2LEVSTO
-            f.close()
 
             if CC_NMLIST.LPTHOUT:
                 CFILE               =           self.CRESTSTO    +   ".pth"
@@ -281,7 +272,7 @@ class CMF_RESTART_NMLIST_MOD:
             import torch
             #   !================================================
             #   !*** 1. set file name & tim
-            self.XTIME               =       ((CT_NMLIST.KMINNEXT - CT_NMLIST.KMINSTART) * 60).to(dtype=Datatype.JPRB)
+            self.XTIME               =       torch.tensor((CT_NMLIST.KMINNEXT - CT_NMLIST.KMINSTART) * 60, dtype=Datatype.JPRB)
             self.CTIME               =       f"seconds since {CT_NMLIST.ISYYYY:04d}-{CT_NMLIST.ISMM:02d}-{CT_NMLIST.ISDD:02d} {CT_NMLIST.ISHOUR:02d}:{CT_NMLIST.ISMIN:02d}"
 
             self.CDATE               =       f"{CT_NMLIST.JYYYYMMDD:08d}{CT_NMLIST.JHOUR:02d}"
@@ -406,9 +397,8 @@ class CMF_RESTART_NMLIST_MOD:
                     P2TEMP = CU.vecP2mapP(CC_VARS.P2LEVSTO,CM_NMLIST.I1SEQX,CM_NMLIST.I1SEQY,CM_NMLIST.NSEQMAX,device)
                     IOUT = 1
 
-                #   #ifdef UseMPI_CMF
-                #   CALL CMF_MPI_AllReduce_P2MAP(P2TEMP)
-                #   #endif
+                if IOUT == 1:
+                    P2TEMP      =       CMF_MPI_AllReduce_P2MAP(P2TEMP)
                 if IOUT == 1 and CM_NMLIST.REGIONTHIS == 1:
                     try:
                         NCID.variables[CVAR][ :, :, 0] = P2TEMP.raw().cpu().numpy()
@@ -419,6 +409,7 @@ class CMF_RESTART_NMLIST_MOD:
                 P1PTH           =           torch.zeros((CM_NMLIST.NPTHOUT, CM_NMLIST.NPTHLEV), dtype=Datatype.JPRD,device=device)
                 P1PTH           =           Ftensor_2D(P1PTH, start_row=1, start_col=1)
                 P1PTH[:,:]      =           CC_VARS.D1PTHFLW_PRE.raw()
+                P1PTH           =           CMF_MPI_AllReduce_P2MAP(P1PTH)
                 if CM_NMLIST.REGIONTHIS == 1:
                     try:
                         NCID.variables['pthflw_pre'][:, :, 0]    = P1PTH.raw().cpu().numpy()
@@ -430,7 +421,8 @@ class CMF_RESTART_NMLIST_MOD:
                 log_file.write(f"WRTE_REST: WRITE RESTART NETCDF:      {self.CFILE}\n")
                 log_file.flush()
                 log_file.close()
-            NCID.close()  # !! regionthis=1: definition
+            if CM_NMLIST.REGIONTHIS == 1:
+                NCID.close()  # !! regionthis=1: definition
 
         # --------------------------------------------------------------------------------------------------------------
         # --------------------------------------------------------------------------------------------------------------
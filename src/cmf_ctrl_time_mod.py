@@ -100,7 +100,7 @@ class CMF_CTRL_TIME_MOD:
         self.EHOUR      = torch.tensor    (0,         dtype=self.EHOUR_TyPe,          device=self.device)
 
 
-        self.KMIN       = torch.tensor    (0,         dtype=self.SYEAR_TyPe,          device=self.device)
+        self.KMIN       = 0                                                                 # !! time state kept as host ints
         self.JHOUR      = torch.tensor    (0,         dtype=self.SYEAR_TyPe,          device=self.device)
         self.JMIN       = torch.tensor    (0,         dtype=self.SYEAR_TyPe,          device=self.device)
         self.JYYYY      = torch.tensor    (0,         dtype=self.SYEAR_TyPe,          device=self.device)
@@ -176,9 +176,9 @@ class CMF_CTRL_TIME_MOD:
             log_file.close()
         # --------------------------------------------------------------------------------------------------------------
         # Step 4: Define base date for KMIN calculation
-        self.YYYY0           =          self.SYEAR.to(dtype=self.YYYY0_TyPe,              device=self.device)
-        self.MM0             =          torch.tensor(1,              dtype=self.MM0_TyPe,                device=self.device)
-        self.DD0             =          torch.tensor(1,              dtype=self.DD0_TyPe,                device=self.device)
+        self.YYYY0           =          int(self.SYEAR)
+        self.MM0             =          1
+        self.DD0             =          1
 
         with open(log_filename, 'a') as log_file:
             log_file.write(f"TIME_NMLIST: YYYY0 MM0 DD0 set to:     {self.YYYY0} {self.MM0} {self.DD0}\n")
@@ -207,25 +207,26 @@ class CMF_CTRL_TIME_MOD:
             log_file.close()
 
         #   !*** 1. Start time & End Time
-        self.ISYYYYMMDD               =               self.SYEAR * 10000 + self.SMON * 100 + self.SDAY
-        self.ISHHMM                   =               self.SHOUR * 100
-        self.ISYYYY                   =               self.SYEAR
-        self.ISMM                     =               self.SMON
-        self.ISDD                     =               self.SDAY
-        self.ISHOUR                   =               self.SHOUR
+        #   !    (dates, KMIN and KSTEP are host ints: no device sync in the per-step time bookkeeping)
+        self.ISYYYY                   =               int(self.SYEAR)
+        self.ISMM                     =               int(self.SMON)
+        self.ISDD                     =               int(self.SDAY)
+        self.ISHOUR                   =               int(self.SHOUR)
         self.ISMIN                    =               0
+        self.ISYYYYMMDD               =               self.ISYYYY * 10000 + self.ISMM * 100 + self.ISDD
+        self.ISHHMM                   =               self.ISHOUR * 100
 
 
-        self.IEYYYYMMDD               =               self.EYEAR * 10000 + self.EMON * 100 + self.EDAY  # End time
-        self.IEHHMM                   =               self.EHOUR * 100
-        self.IEYYYY                   =               self.EYEAR
-        self.IEMM                     =               self.EMON
-        self.IEDD                     =               self.EDAY
-        self.IEHOUR                   =               self.EHOUR
+        self.IEYYYY                   =               int(self.EYEAR)
+        self.IEMM                     =               int(self.EMON)
+        self.IEDD                     =               int(self.EDAY)
+        self.IEHOUR                   =               int(self.EHOUR)
         self.IEMIN                    =               0
+        self.IEYYYYMMDD               =               self.IEYYYY * 10000 + self.IEMM * 100 + self.IEDD  # End time
+        self.IEHHMM                   =               self.IEHOUR * 100
 
-        self.KMINSTART                = torch.tensor(0, dtype=self.KMINSTART_TyPe, device=self.device)
-        self.KMIN                     = torch.tensor(0, dtype=self.KMIN_TyPe, device=self.device)
+        self.KMINSTART                =               0
+        self.KMIN                     =               0
 
 
         #   !*** 2. Initialize KMIN for START & END Time
@@ -246,9 +247,8 @@ class CMF_CTRL_TIME_MOD:
             log_file.close()
 
         #   !*** 3. Calculate NSTEPS: time steps within simulation time
-        self.KSTEP                    =           torch.tensor    (0.0,      dtype=self.KSTEP_TyPe,  device=self.device)
-        NSTEPS_temp                   =           int(((self.KMINEND - self.KMINSTART) * 60) / CC_NMLIST.DT)  # (End - Start) / DT
-        self.NSTEPS                   =           torch.tensor    (NSTEPS_temp,   dtype=self.NSTEPS_TyPe,  device=self.device)
+        self.KSTEP                    =           0
+        self.NSTEPS                   =           int(((self.KMINEND - self.KMINSTART) * 60) / CC_NMLIST.DT)  # (End - Start) / DT
 
         with open(log_filename, 'a') as log_file:
             log_file.write(f"NSTEPS:        {self.NSTEPS}\n")
@@ -284,7 +284,7 @@ class CMF_CTRL_TIME_MOD:
         """
         #!*** 1. Advance KMIN, KSTEP
         self.KSTEP          =           self.KSTEP + 1
-        self.KMINNEXT       =           self.KMIN + torch.tensor(int(CC_NMLIST.DT / 60),dtype=self.KMIN_TyPe, device=device)
+        self.KMINNEXT       =           self.KMIN + int(CC_NMLIST.DT / 60)
 
         with open(log_filename, 'a') as log_file:
             # Write settings to log
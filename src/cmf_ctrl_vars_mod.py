@@ -11,6 +11,8 @@ Licensed under the Apache License, Version 2.0.
 * CONTAINS:
 ! -- CMF_PROG_INIT      : Initialize Prognostic variables (include restart data handling)
 ! -- CMF_DIAG_INIT      : Initialize Diagnostic variables
+! -- CMF_WORKSPACE      : scratch buffers for the physics substep
+! -- CMF_WATBAL_RING    : device-side water balance buffer
 """
 import  os
 import torch
@@ -20,6 +22,74 @@ from fortran_tensor_1D import Ftensor_1D
 os.environ['PYTHONWARNINGS']='ignore::FutureWarning'
 os.environ['PYTHONWARNINGS']='ignore::RuntimeWarning'
 
+class CMF_WORKSPACE:
+    """
+    Reusable scratch buffers and scalar constants for the physics substep.
+
+    buffer(name, shape, dtype) hands out the same tensor for the same name as long as
+    shape and dtype match; const(value, dtype) caches 0-d tensors. N_ALLOC counts the
+    tensors the workspace had to create. It does not see temporaries made outside the
+    workspace, so a flat counter only says that no new buffer was requested.
+    """
+    def __init__(self, device):
+        self.device                     =           device
+        self.N_ALLOC                    =           0
+        self._buffers                   =           {}
+        self._consts                    =           {}
+
+    def buffer(self, name, shape, dtype):
+        if isinstance(shape, int):
+            shape = (shape,)
+        buf = self._buffers.get(name)
+        if buf is None or tuple(buf.shape) != tuple(shape) or buf.dtype != dtype:
+            buf = torch.empty(shape, dtype=dtype, device=self.device)
+            self._buffers[name] = buf
+            self.N_ALLOC += 1
+        return buf
+
+    def zeros(self, name, shape, dtype):
+        return self.buffer(name, shape, dtype).zero_()
+
+    def ones(self, name, shape, dtype):
+        return self.buffer(name, shape, dtype).fill_(1)
+
+    def const(self, value, dtype):
+        key = (float(value), dtype)
+        c = self._consts.get(key)
+        if c is None:
+            c = torch.tensor(value, dtype=dtype, device=self.device)
+            self._consts[key] = c
+            self.N_ALLOC += 1
+        return c
+
+    def nbytes(self):
+        return sum(buf.numel() * buf.element_size() for buf in self._buffers.values())
+
+
+class CMF_WATBAL_RING:
+    """
+    Device-side buffer of the CALC_WATBAL global sums.
+
+    push(STAMP, P0GLB) copies the 10 sums of one substep into the next row without a host
+    sync and returns True once NROW rows are buffered; take() hands the buffered rows and
+    their host-side time stamps to the caller (one device-to-host copy) and empties the buffer.
+    """
+    def __init__(self, NROW, dtype, device):
+        self.NROW                       =           max(int(NROW), 1)
+        self.BUF                        =           torch.zeros((self.NROW, 10), dtype=dtype, device=device)
+        self.STAMP                      =           []
+
+    def push(self, STAMP, P0GLB):
+        torch.stack(P0GLB, out=self.BUF[len(self.STAMP)])
+        self.STAMP.append(STAMP)
+        return len(self.STAMP) == self.NROW
+
+    def take(self):
+        NROW, STAMP                     =           len(self.STAMP), self.STAMP
+        self.STAMP                      =           []
+        return STAMP, self.BUF[:NROW]
+
+
 class CMF_CTRL_VARS_MOD:
     """
     Created on  March  24  08:42 2025
@@ -205,20 +275,36 @@ class CMF_CTRL_VARS_MOD:
 
             # ---------------------------------------------------------------------------------------------------------------
             #  !! For Usual River Grid (from downstream to upstream). OMP cannot be applied
-
-            for IESQ_ in reversed(range(CM_NMLIST.NSEQRIV)):
-                IESQ                             =          IESQ_ + 1
-                JSEQ                             =          CM_NMLIST.I1NEXT[IESQ]
-                DSEAELV                          =          CM_NMLIST.D2RIVELV[JSEQ, 1] + self.D2RIVDPH_PRE[JSEQ, 1]
+            #  !! across layers, but every grid of one topological layer (I1SEQLEV, CALC_1D_SEQ) only needs the
+            #  !! downstream grids of later layers, so each layer is one vector update, last layer first.
+            I1SEQLEV                        =          getattr(CM_NMLIST, "I1SEQLEV", None)
+            if I1SEQLEV is None:             # !! no layers: one grid per layer, same as the serial loop
+                I1SEQLEV                    =          torch.arange(CM_NMLIST.NSEQRIV + 1, dtype=torch.long)
+            I1SEQLEV                        =          [int(v) for v in I1SEQLEV.tolist()]
+
+            NEXT0                           =          CM_NMLIST.I1NEXT.raw().to(dtype=torch.long) - 1
+            RIVELV                          =          CM_NMLIST.D2RIVELV.raw()[:, 0]
+            RIVHGT                          =          CM_NMLIST.D2RIVHGT.raw()[:, 0]
+            RIVLEN                          =          CM_NMLIST.D2RIVLEN.raw()[:, 0]
+            RIVWTH                          =          CM_NMLIST.D2RIVWTH.raw()[:, 0]
+            RIVSTOMAX                       =          CM_NMLIST.D2RIVSTOMAX.raw()[:, 0]
+            RIVDPH_PRE                      =          self.D2RIVDPH_PRE.raw()[:, 0]
+            ZERO                            =          torch.tensor(0, dtype=Datatype.JPRB, device=device)
+            ONE_D                           =          torch.tensor(1, dtype=Datatype.JPRD, device=device)
+
+            for ILEV in reversed(range(len(I1SEQLEV) - 1)):
+                I0, I1                          =          I1SEQLEV[ILEV], I1SEQLEV[ILEV + 1]
+                JSEQ0                           =          NEXT0[I0:I1]
+                DSEAELV                         =          RIVELV[JSEQ0] + RIVDPH_PRE[JSEQ0]
 
                 #   set initial water level to sea level if river bed is lower than sea level
-                self.DDPH[IESQ, 1]               =          torch.maximum(DSEAELV - CM_NMLIST.D2RIVELV[IESQ, 1], torch.tensor(0,dtype=Datatype.JPRB,device=device))
-                self.DDPH[IESQ, 1]               =          torch.minimum(self.DDPH[IESQ, 1], CM_NMLIST.D2RIVHGT[IESQ, 1])
+                DDPH                            =          torch.maximum(DSEAELV - RIVELV[I0:I1], ZERO)
+                DDPH                            =          torch.minimum(DDPH, RIVHGT[I0:I1])
 
-                self.P2RIVSTO[IESQ, 1]           =          (self.DDPH[IESQ, 1] * CM_NMLIST.D2RIVLEN[IESQ, 1] * CM_NMLIST.D2RIVWTH[IESQ, 1])
-                self.P2RIVSTO[IESQ, 1]           =          torch.minimum(self.P2RIVSTO[IESQ, 1],
-                                                                    CM_NMLIST.D2RIVSTOMAX[IESQ, 1] * torch.tensor(1,dtype=Datatype.JPRD,device=device))
-                self.D2RIVDPH_PRE[IESQ, 1]       =          self.DDPH[IESQ, 1]
+                self.P2RIVSTO.raw()[I0:I1, 0]   =          torch.minimum(DDPH * RIVLEN[I0:I1] * RIVWTH[I0:I1],
+                                                                         RIVSTOMAX[I0:I1] * ONE_D)
+                self.DDPH.raw()[I0:I1, 0]       =          DDPH
+                RIVDPH_PRE[I0:I1]               =          DDPH
             return
         # --------------------------------------------------------------------------------------------------------------
         # -------------------------------------------------------D2RUNOFF-------------------------------------------------------
@@ -473,6 +559,11 @@ class CMF_CTRL_VARS_MOD:
         self.ONE_JPRB                   =           torch.ones((), dtype=self.D2DAMMY_TyPe, device=device)
         self.EPS_JPRB                   =           torch.tensor(1.0e-10, dtype=self.D2DAMMY_TyPe, device=device)
         self.DEPTH_MIN_JPRB             =           torch.tensor(1.0e-6, dtype=self.D2DAMMY_TyPe, device=device)
+        self.WORKSPACE                  =           CMF_WORKSPACE(device)       # !! scratch buffers for the physics substep
+        self.WATBAL                     =           CMF_WATBAL_RING(CC_NMLIST.NWATBAL, self.P0GLBSTOPRE_TyPe, device)   # !! water balance rows, flushed every NWATBAL substeps
+        self.NSTOVER                    =           0                           # !! storage version, advanced by every storage update (STONXT)
+        self.STGKEY                     =           None                        # !! (NSTOVER, storage tensors) of the last FLDSTG pass
+        self.D2STGREF                   =           torch.full((CM_NMLIST.NSEQMAX, 1), -1.0, dtype=self.D2STORGE_TyPe, device=device)   # !! RSTGTOL: storage at each cell's last stage evaluation
 
 
 
@@ -92,6 +92,9 @@ def ADVANCE(KSTEPS,       CC_NMLIST ,     CM_NMLIST,    CT_NMLIST,     config,
 
         with open(log_filename, 'a') as log_file:
             log_file.write(f"CMF::DRV_ADVANCE END: KSTEP, time (end of Tstep):  {CT_NMLIST.KSTEP}, {CT_NMLIST.JYYYYMMDD}, {CT_NMLIST.JHHMM}\n")
+            WS = getattr(CC_VARS, "WORKSPACE", None)
+            if WS is not None:        # !! workspace buffers only, not a count of all tensor allocations
+                log_file.write(f"CMF::DRV_ADVANCE WORKSPACE: buffers created, bytes:  {WS.N_ALLOC}, {WS.nbytes()}\n")
             log_file.flush()
             log_file.close()
     #   !*** END:time step loop
@@ -91,6 +91,7 @@ def CMF_DRV_INIT(CC_NMLIST,             CT_NMLIST,              CM_NMLIST,
     from cmf_ctrl_vars_mod import CMF_CTRL_VARS_MOD
     import cmf_ctrl_physics_mod
     from cmf_utils_mod import CMF_UTILS_MOD
+    from cmf_ctrl_mapcache_mod import CMF_MAPCACHE_LOAD, CMF_MAPCACHE_SAVE, CMF_MAPCACHE_SNAPSHOT
     log_filename = config['RDIR'] + config['LOGOUT']
     CU                           =       CMF_UTILS_MOD                   (Datatype,  CC_NMLIST, CM_NMLIST)
     # ------------------------------------------------------------------------------------------------------------------
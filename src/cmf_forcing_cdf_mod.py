@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@purpose:  NetCDF runoff forcing reader with persistent handles and chunk-aligned look-ahead blocks (python)
+Licensed under the Apache License, Version 2.0.
+
+* CONTAINS:
+! -- CDF_SPLIT              : file splitting of a forcing filename template ("YEAR", "MON", "DAY" or "NONE")
+! -- CDF_FILESTART          : first date (YYYY,MM,DD) of the file holding date (IYEAR,IMON,IDAY)
+! -- CDF_FILENAME           : filename of the file starting at (IYEAR,IMON,IDAY)
+! -- CMF_FORCING_CDFREADER  : keep datasets open, read time blocks, decode packing in vectorized form
+!    -- DATASET             : open (or reuse) a forcing file
+!    -- GET                 : (runoff, sub-surface runoff or None) of record IREC (0-based) of a file
+!    -- CLOSE               : close all datasets and drop the block buffer
+
+Templates use {YYYY}, {MM}, {DD} for the date of the first record in the file, e.g.
+"./runoff/ERA5_ro_{YYYY}{MM}.nc" is split monthly. A template without them is one file.
+A read covers max(NCDFBLK, time chunk) records, starting at a time-chunk boundary, so each
+compressed chunk is decompressed once; later records of the block come from the buffer.
+Only the input box BOX = (IX0, IX1, IY0, IY1) of the (time, y, x) variables is read.
+"""
+import  os
+from collections import OrderedDict
+import numpy as np
+import torch
+
+os.environ['PYTHONWARNINGS']='ignore::FutureWarning'
+os.environ['PYTHONWARNINGS']='ignore::RuntimeWarning'
+
+
+def _netcdf_dataset(*args, **kwargs):
+    try:
+        from netCDF4 import Dataset
+    except ModuleNotFoundError as exc:
+        raise RuntimeError("NetCDF forcing requires the netCDF4 Python package.") from exc
+    return Dataset(*args, **kwargs)
+
+
+def CDF_SPLIT(CTEMPLATE):
+    if "{DD}" in CTEMPLATE:
+        return "DAY"
+    if "{MM}" in CTEMPLATE:
+        return "MON"
+    if "{YYYY}" in CTEMPLATE:
+        return "YEAR"
+    return "NONE"
+
+
+def CDF_FILESTART(CSPLIT, IYEAR, IMON, IDAY):
+    if CSPLIT == "DAY":
+        return IYEAR, IMON, IDAY
+    if CSPLIT == "MON":
+        return IYEAR, IMON, 1
+    return IYEAR, 1, 1
+
+
+def CDF_FILENAME(CTEMPLATE, IYEAR, IMON, IDAY):
+    return (CTEMPLATE.replace("{YYYY}", f"{IYEAR:04d}")
+                     .replace("{MM}", f"{IMON:02d}")
+                     .replace("{DD}", f"{IDAY:02d}"))
+
+
+class CMF_FORCING_CDFREADER:
+    def __init__(self, CVARS, NCDFBLK, RMIS, BOX=None, NFILES=2):
+        self.CVARS      =       list(CVARS)                 # !! variable names, None for an absent field
+        self.NCDFBLK    =       max(int(NCDFBLK), 1)        # !! records per read (look-ahead buffer)
+        self.RMIS       =       RMIS
+        self.BOX        =       tuple(BOX) if BOX is not None else None     # !! (IX0, IX1, IY0, IY1), None: whole grid
+        self.NFILES     =       max(int(NFILES), 1)         # !! datasets kept open (current + next file)
+        self.FILES      =       OrderedDict()               # !! file -> netCDF4.Dataset
+        self.BLOCK      =       (None, 0, 0, None)          # !! (file, IREC0, IREC1, decoded arrays (t, y, x))
+
+    def DATASET(self, CFILE):
+        NC_FILE = self.FILES.get(CFILE)
+        if NC_FILE is None:
+            NC_FILE = _netcdf_dataset(CFILE, mode='r')
+            for CVAR in self.CVARS:
+                if CVAR is not None:
+                    NC_FILE.variables[CVAR].set_auto_maskandscale(False)   # !! decoded per block below
+            self.FILES[CFILE] = NC_FILE
+            while len(self.FILES) > self.NFILES:
+                self.FILES.popitem(last=False)[1].close()
+        else:
+            self.FILES.move_to_end(CFILE)
+        return NC_FILE
+
+    def _block_range(self, VAR, IREC):
+        NREC = VAR.shape[0]
+        CHUNK = VAR.chunking()
+        NTCHK = int(CHUNK[0]) if isinstance(CHUNK, (list, tuple)) and len(CHUNK) > 0 else 1
+        NBLK = -(-self.NCDFBLK // NTCHK) * NTCHK                 # !! whole time chunks
+        IREC0 = (IREC // NTCHK) * NTCHK
+        return IREC0, min(IREC0 + NBLK, NREC)
+
+    def _decode(self, VAR, RAW):
+        DATA = RAW.astype(np.float32)
+        LMISS = np.zeros(RAW.shape, dtype=bool)
+        for CATT in ("_FillValue", "missing_value"):
+            if CATT in VAR.ncattrs():
+                LMISS |= np.isin(RAW, np.atleast_1d(VAR.getncattr(CATT)))
+        if "scale_factor" in VAR.ncattrs():
+            DATA *= np.float32(VAR.getncattr("scale_factor"))
+        if "add_offset" in VAR.ncattrs():
+            DATA += np.float32(VAR.getncattr("add_offset"))
+        DATA[LMISS] = self.RMIS
+        return DATA
+
+    def GET(self, CFILE, IREC):
+        """
+        ! (runoff, sub-surface runoff or None) of record IREC (0-based) in CFILE, as (x, y) float32 CPU tensors of the box
+        """
+        BFILE, IREC0, IREC1, DATA = self.BLOCK
+        if BFILE != CFILE or not (IREC0 <= IREC < IREC1):
+            NC_FILE = self.DATASET(CFILE)
+            VAR0 = NC_FILE.variables[self.CVARS[0]]
+            if not (0 <= IREC < VAR0.shape[0]):
+                raise ValueError(f"CMF::FORCING_GET_CDF: record {IREC} outside of {CFILE} (NREC={VAR0.shape[0]})")
+            IREC0, IREC1 = self._block_range(VAR0, IREC)
+            if self.BOX is None:
+                SLAB = (slice(IREC0, IREC1), Ellipsis)
+            else:
+                IX0, IX1, IY0, IY1 = self.BOX
+                SLAB = (slice(IREC0, IREC1), slice(IY0, IY1), slice(IX0, IX1))
+            DATA = []
+            for CVAR in self.CVARS:
+                if CVAR is None:
+                    DATA.append(None)
+                    continue
+                VAR = NC_FILE.variables[CVAR]
+                DATA.append(self._decode(VAR, VAR[SLAB]))
+            self.BLOCK = (CFILE, IREC0, IREC1, DATA)
+        return tuple(None if D is None else torch.from_numpy(D[IREC - IREC0]).T for D in DATA)
+
+    def CLOSE(self):
+        for NC_FILE in self.FILES.values():
+            NC_FILE.close()
+        self.FILES.clear()
+        self.BLOCK = (None, 0, 0, None)
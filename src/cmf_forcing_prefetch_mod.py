@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@purpose:  Memory-mapped plain binary forcing reader with background prefetch (python)
+Licensed under the Apache License, Version 2.0.
+
+* CONTAINS:
+! -- CMF_FORCING_BINREADER : read (runoff, sub-surface runoff) records of the daily plain binary files
+!    -- GET                : record for the current forcing time, then queue the next NINPPREF records
+!    -- CLOSE              : stop the prefetch thread and drop the memory maps
+
+A record key is (runoff file, sub-surface file or None, IREC). Files are memory-mapped as float32
+(IREC, NYIN, NXIN); only the input box BOX = (IX0, IX1, IY0, IY1) of a record is paged in, once,
+on the worker thread and handed out as a zero-copy (IX1-IX0, IY1-IY0) view. At most NINPPREF
+records are queued ahead, so the host memory stays bounded.
+NINPPREF = 0 reads synchronously through the same memory maps.
+"""
+import  os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+
+os.environ['PYTHONWARNINGS']='ignore::FutureWarning'
+os.environ['PYTHONWARNINGS']='ignore::RuntimeWarning'
+
+
+class CMF_FORCING_BINREADER:
+    def __init__(self, NXIN, NYIN, NINPPREF, BOX=None):
+        self.NXIN       =       int(NXIN)
+        self.NYIN       =       int(NYIN)
+        self.BOX        =       tuple(BOX) if BOX is not None else (0, self.NXIN, 0, self.NYIN)
+        self.NINPPREF   =       max(int(NINPPREF), 0)
+        self.POOL       =       (ThreadPoolExecutor(max_workers=1, thread_name_prefix="cmf-forcing")
+                                 if self.NINPPREF > 0 else None)
+        self.PEND       =       OrderedDict()       # !! key -> Future, oldest first (bounded by NINPPREF + 1)
+        self.MAPS       =       OrderedDict()       # !! file -> np.memmap, only touched by the reading thread
+        self.LAST       =       (None, None)        # !! (key, record) handed out last
+
+    def _map(self, CFILE):
+        MM = self.MAPS.get(CFILE)
+        if MM is None:
+            MM = np.memmap(CFILE, dtype=np.float32, mode='r')
+            self.MAPS[CFILE] = MM
+            while len(self.MAPS) > 4:               # !! runoff + sub-surface of the current & next day
+                self.MAPS.popitem(last=False)
+        else:
+            self.MAPS.move_to_end(CFILE)
+        return MM
+
+    def _read(self, KEY):
+        NREC = self.NXIN * self.NYIN
+        IREC = KEY[2]
+        IX0, IX1, IY0, IY1 = self.BOX
+        RECORD = []
+        for CFILE in KEY[:2]:
+            if CFILE is None:
+                RECORD.append(None)
+                continue
+            MM = self._map(CFILE)
+            if MM.size < IREC * NREC:
+                raise ValueError(f"CMF::FORCING_GET_BIN: record {IREC} beyond end of file {CFILE}")
+            # !! page the box of the record in now (on the worker thread), hand out the (x, y) view later
+            DATA = np.array(MM[(IREC - 1) * NREC:IREC * NREC].reshape(self.NYIN, self.NXIN)[IY0:IY1, IX0:IX1])
+            RECORD.append(torch.from_numpy(DATA).T)
+        return tuple(RECORD)
+
+    def GET(self, KEY, KEYS_NEXT=()):
+        """
+        ! (runoff, sub-surface runoff or None) for KEY as (IX1-IX0, IY1-IY0) float32 CPU tensors
+        """
+        if KEY == self.LAST[0]:
+            RECORD = self.LAST[1]
+        elif self.POOL is None:
+            RECORD = self._read(KEY)
+        else:
+            # !! records queued before KEY are no longer needed (restart / irregular call)
+            while self.PEND and KEY in self.PEND and next(iter(self.PEND)) != KEY:
+                self.PEND.popitem(last=False)[1].cancel()
+            FUTURE = self.PEND.pop(KEY, None)
+            if FUTURE is None:
+                FUTURE = self.POOL.submit(self._read, KEY)
+            RECORD = FUTURE.result()
+        self.LAST = (KEY, RECORD)
+
+        if self.POOL is not None:
+            for KEY_NEXT in list(KEYS_NEXT)[:self.NINPPREF]:
+                if KEY_NEXT != KEY and KEY_NEXT not in self.PEND:
+                    self.PEND[KEY_NEXT] = self.POOL.submit(self._read, KEY_NEXT)
+            while len(self.PEND) > self.NINPPREF:
+                self.PEND.popitem(last=False)[1].cancel()
+        return RECORD
+
+    def CLOSE(self):
+        for FUTURE in self.PEND.values():
+            FUTURE.cancel()
+        self.PEND.clear()
+        if self.POOL is not None:
+            self.POOL.shutdown(wait=True)
+            self.POOL = None
+        self.MAPS.clear()
+        self.LAST = (None, None)
@@ -1,3 +1,5 @@
+import heapq
+
 import torch
 
 
@@ -12,21 +14,32 @@ def build_upstream_matrix_torch(I1NEXT, NSEQALL, NSEQRIV, device):
     nseqall = int(NSEQALL)
     nseqriv = int(NSEQRIV)
     next0 = I1NEXT.raw()[:nseqriv].to(device=device, dtype=torch.long) - 1
-    src0 = torch.arange(nseqriv, dtype=torch.long, device=device)
-    valid = (next0 >= 0) & (next0 < nseqall)
-    next0 = next0[valid]
+    return build_gather_matrix_torch(next0, nseqall, device)
+
+
+def build_gather_matrix_torch(dst0, nseqall, device):
+    """
+    Padded gather matrix of an edge list: row i holds, in ascending edge order, the
+    edges e with dst0[e] == i (-1 padding). Edges with dst0 outside [0, nseqall) are
+    dropped. Summing a row slot by slot repeats the order of a serial index_add_.
+    """
+    nseqall = int(nseqall)
+    dst0 = dst0.to(device=device, dtype=torch.long)
+    src0 = torch.arange(dst0.numel(), dtype=torch.long, device=device)
+    valid = (dst0 >= 0) & (dst0 < nseqall)
+    dst0 = dst0[valid]
     src0 = src0[valid]
 
     upn = torch.zeros(nseqall, dtype=torch.long, device=device)
-    if next0.numel() > 0:
-        upn.scatter_add_(0, next0, torch.ones_like(next0, dtype=torch.long))
+    if dst0.numel() > 0:
+        upn.scatter_add_(0, dst0, torch.ones_like(dst0, dtype=torch.long))
     upnmax = int(torch.max(upn).item()) if upn.numel() > 0 else 0
     upnmax = max(upnmax, 1)
 
     upst = torch.full((nseqall, upnmax), -1, dtype=torch.long, device=device)
-    if next0.numel() > 0:
-        order = torch.argsort(next0, stable=True)
-        sorted_dst = next0[order]
+    if dst0.numel() > 0:
+        order = torch.argsort(dst0, stable=True)
+        sorted_dst = dst0[order]
         sorted_src = src0[order]
         edge_pos = torch.arange(sorted_dst.numel(), dtype=torch.long, device=device)
         segment_start = torch.cumsum(upn, dim=0) - upn
@@ -35,3 +48,185 @@ def build_upstream_matrix_torch(I1NEXT, NSEQALL, NSEQRIV, device):
 
     upstream_mask = upst >= 0
     return upst, upn, upstream_mask
+
+
+def build_gather_slots_torch(dst0, nseqall, device):
+    """
+    CSR form of build_gather_matrix_torch for high fan-in cells, stored by slot:
+    slots[k] = (rows, edges) with the k-th edge of every row that has more than k
+    edges. Rows are unique within a slot, so each slot is a plain gather/put, and
+    the total work is the number of edges instead of nseqall * max fan-in.
+    """
+    upst, upn, upstream_mask = build_gather_matrix_torch(dst0, nseqall, device)
+    slots = []
+    for k in range(upst.shape[1]):
+        rows = torch.nonzero(upstream_mask[:, k], as_tuple=True)[0]
+        if rows.numel() == 0:
+            break
+        slots.append((rows, upst[rows, k].contiguous()))
+    return slots, upn
+
+
+def build_path_incidence_torch(PTH_UPST, PTH_DOWN, I2MASK, NSEQALL, device):
+    """
+    Valid bifurcation paths and their path-to-cell incidence.
+
+    A path is valid when both ends are in the domain and neither is a
+    kinematic/dam cell (I2MASK > 0). Returns the valid-path mask, the 0-based
+    valid path ids, their upstream/downstream cells and ends0 = [upstream
+    cells, downstream cells]: the COO rows of the nseq x npath incidence
+    matrix with +1 on the upstream and -1 on the downstream end.
+    """
+    nseqall = int(NSEQALL)
+    iseqp1 = PTH_UPST.raw().to(device=device, dtype=torch.long)
+    jseqp1 = PTH_DOWN.raw().to(device=device, dtype=torch.long)
+    valid = (iseqp1 > 0) & (jseqp1 > 0) & (iseqp1 <= nseqall) & (jseqp1 <= nseqall)
+    cand = valid.nonzero(as_tuple=True)[0]
+    if cand.numel() > 0:
+        mask_raw = I2MASK.raw().to(device)
+        valid[cand] = (mask_raw[iseqp1[cand] - 1, 0] <= 0) & (mask_raw[jseqp1[cand] - 1, 0] <= 0)
+    path0 = valid.nonzero(as_tuple=True)[0]
+    iseqp0 = iseqp1[path0] - 1
+    jseqp0 = jseqp1[path0] - 1
+    return valid, path0, iseqp0, jseqp0, torch.cat([iseqp0, jseqp0])
+
+
+def river_sequence_levels_torch(I2NEXTX, I2NEXTY, MASK):
+    """
+    Level-synchronous Kahn sort of the river grids (CALC_1D_SEQ order).
+
+    Inputs are the raw (NX, NY) next-xy maps and the boolean river mask
+    (downstream inside the map, grid in this region). Layer 0 holds the grids
+    without upstream, IY-stable. A grid joins layer k+1 when its last upstream
+    is in layer k, and is placed by the position of that upstream, as in the
+    serial Fortran loop. Integer updates only, so the order is exact.
+
+    Returns the 0-based IX, IY of the river sequence, the layer offsets
+    (layer k = sequence[LEV[k]:LEV[k+1]]) and the (NX, NY) upstream count.
+    """
+    nx, ny = MASK.shape
+    device = MASK.device
+    nextx = I2NEXTX.reshape(-1).to(dtype=torch.long)
+    nexty = I2NEXTY.reshape(-1).to(dtype=torch.long)
+    hasnext = nextx > 0
+
+    ix0, iy0 = torch.where(MASK)
+    order = torch.argsort(iy0, stable=True)
+    cell = ix0[order] * ny + iy0[order]
+    down = torch.full((nx * ny,), -1, dtype=torch.long, device=device)
+    down[cell] = (nextx[cell] - 1) * ny + (nexty[cell] - 1)
+
+    nupst = torch.zeros(nx * ny, dtype=torch.long, device=device)
+    nupst.index_put_((down[cell],), torch.ones_like(cell), accumulate=True)
+    upnow = torch.zeros_like(nupst)
+
+    frontier = cell[nupst[cell] == 0]
+    layers = [frontier]
+    while frontier.numel() > 0:
+        dst = down[frontier]
+        upnow.index_put_((dst,), torch.ones_like(dst), accumulate=True)
+        # ! a grid is completed by the last frontier grid that drains into it
+        pos = torch.argsort(dst, stable=True)
+        dst_sorted = dst[pos]
+        last = torch.ones_like(dst_sorted, dtype=torch.bool)
+        last[:-1] = dst_sorted[1:] != dst_sorted[:-1]
+        cand, cand_pos = dst_sorted[last], pos[last]
+        done = (upnow[cand] == nupst[cand]) & hasnext[cand]
+        frontier = cand[done][torch.argsort(cand_pos[done])]
+        if frontier.numel() > 0:
+            layers.append(frontier)
+
+    seq = torch.cat(layers)
+    lev = torch.zeros(len(layers) + 1, dtype=torch.long, device=device)
+    lev[1:] = torch.cumsum(torch.tensor([l.numel() for l in layers], dtype=torch.long, device=device), dim=0)
+    return seq // ny, seq % ny, lev, nupst.reshape(nx, ny)
+
+
+def pack_largest_first(sizes, nbins):
+    """
+    Greedy largest-first bin packing: each item goes to the bin with the
+    smallest load so far (ties to the lower bin). Deterministic for a given
+    ``sizes``; returns the 0-based bin of every item and the bin loads.
+    """
+    order = sorted(range(len(sizes)), key=lambda k: (-sizes[k], k))
+    load = [0] * nbins
+    heap = [(0, b) for b in range(nbins)]
+    bin_of = [0] * len(sizes)
+    for k in order:
+        if sizes[k] == 0:
+            break
+        _, b = heapq.heappop(heap)
+        bin_of[k] = b
+        load[b] += sizes[k]
+        heapq.heappush(heap, (load[b], b))
+    return bin_of, load
+
+
+def partition_basins_torch(I2NEXTX, I2NEXTY, IMIS, REGIONALL, PTH_XY=None):
+    """
+    Split the river network into REGIONALL regions made of whole river basins.
+
+    Inputs are the raw (NX, NY) next-xy maps (1-based, <0 at mouths, IMIS on
+    ocean). Each valid grid is labelled with its river mouth by pointer
+    jumping; basins linked by a bifurcation channel (PTH_XY rows of
+    1-based IX, IY, JX, JY) are merged so no path crosses a region. Basins are
+    bin-packed largest first into the region with the fewest grids.
+
+    Returns the 1-based (NX, NY) region map (IMIS outside the domain) and the
+    number of grids in each region.
+    """
+    nx, ny = I2NEXTX.shape
+    nextx = I2NEXTX.reshape(-1).to(dtype=torch.long)
+    nexty = I2NEXTY.reshape(-1).to(dtype=torch.long)
+    valid = nextx != IMIS
+    self0 = torch.arange(nx * ny, dtype=torch.long, device=I2NEXTX.device)
+    down = torch.where(nextx > 0, (nextx - 1) * ny + (nexty - 1), self0)
+    down = torch.where(valid & (down >= 0) & (down < nx * ny), down, self0)
+
+    # ! pointer jumping: every grid ends at its river mouth
+    root = down
+    while True:
+        jump = root[root]
+        if torch.equal(jump, root):
+            break
+        root = jump
+
+    basin, basin_id = torch.unique(root[valid], return_inverse=True)
+    nbasin = basin.numel()
+    basin_of = torch.full((nx * ny,), -1, dtype=torch.long, device=I2NEXTX.device)
+    basin_of[valid] = basin_id
+
+    # ! merge basins connected by bifurcation channels (union-find)
+    parent = list(range(nbasin))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    if PTH_XY is not None and len(PTH_XY) > 0:
+        pth = torch.as_tensor(PTH_XY, dtype=torch.long, device=I2NEXTX.device).reshape(-1, 4)
+        inside = (pth[:, 0] >= 1) & (pth[:, 0] <= nx) & (pth[:, 1] >= 1) & (pth[:, 1] <= ny) & \
+                 (pth[:, 2] >= 1) & (pth[:, 2] <= nx) & (pth[:, 3] >= 1) & (pth[:, 3] <= ny)
+        pth = pth[inside]
+        b_up = basin_of[(pth[:, 0] - 1) * ny + (pth[:, 1] - 1)].tolist()
+        b_dn = basin_of[(pth[:, 2] - 1) * ny + (pth[:, 3] - 1)].tolist()
+        for bu, bd in zip(b_up, b_dn):
+            if bu < 0 or bd < 0:
+                continue
+            ru, rd = find(bu), find(bd)
+            if ru != rd:
+                parent[max(ru, rd)] = min(ru, rd)
+    group = torch.tensor([find(i) for i in range(nbasin)], dtype=torch.long, device=I2NEXTX.device)
+
+    # ! greedy largest-first bin packing of basin groups into regions
+    gsize = torch.bincount(group, weights=torch.bincount(basin_id, minlength=nbasin).to(torch.float64),
+                           minlength=nbasin).to(torch.long)
+    bin_of_group, load = pack_largest_first(gsize.tolist(), REGIONALL)
+    region_of_group = torch.tensor(bin_of_group, dtype=torch.long, device=I2NEXTX.device) + 1
+
+    region = torch.full((nx * ny,), IMIS, dtype=torch.long, device=I2NEXTX.device)
+    region[valid] = region_of_group[group[basin_id]]
+    regiongrid = torch.tensor(load, dtype=torch.long, device=I2NEXTX.device)
+    return region.reshape(nx, ny), regiongrid
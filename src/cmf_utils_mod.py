@@ -21,6 +21,8 @@ Licensed under the Apache License, Version 2.0.
 ! -- SPLITDATE : splite date (YYYYMMDD) to (YYYY,MM,DD)
 ! -- SPLITHOUR : split hour (HHMM) to (HH,MM)
 ! -- IMDAYS    : function to calculate days in a monty IMDAYS(IYEAR,IMON)
+! -- DATE2DAYS : days of (YYYY,MM,DD) since 0001/01/01 (closed form, respects LLEAPYR)
+! -- DAYS2DATE : inverse of DATE2DAYS
 !
 ! endian conversion
 !-- CONV_END    : Convert 2D Array endian (REAL4)
@@ -34,6 +36,7 @@ Licensed under the Apache License, Version 2.0.
 !-- CMF_CheckNaN: check the value is NaN or not
 """
 import  os
+import bisect
 from fortran_tensor_3D import Ftensor_3D
 from fortran_tensor_2D import Ftensor_2D
 from fortran_tensor_1D import Ftensor_1D
@@ -67,6 +70,50 @@ def IMDAYS(IYEAR, IMON, LLEAPYR):
     return IMDAYS
 
 
+_NDCUM = (0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334, 365)   # days before each month (no leap day)
+
+
+def _ISLEAP(IYEAR, LLEAPYR):
+    return LLEAPYR and ((IYEAR % 400 == 0) or (IYEAR % 100 != 0 and IYEAR % 4 == 0))
+
+
+def DATE2DAYS(IYEAR, IMON, IDAY, LLEAPYR):
+    """
+    ! days from 0001/01/01 to (IYEAR,IMON,IDAY), Gregorian calendar or 365-day years (LLEAPYR=False)
+    """
+    IY = IYEAR - 1
+    NDAYS = IY * 365
+    if LLEAPYR:
+        NDAYS = NDAYS + IY // 4 - IY // 100 + IY // 400
+    NDAYS = NDAYS + _NDCUM[IMON - 1] + IDAY - 1
+    if IMON > 2 and _ISLEAP(IYEAR, LLEAPYR):
+        NDAYS = NDAYS + 1
+    return NDAYS
+
+
+def DAYS2DATE(NDAYS, LLEAPYR):
+    """
+    ! (IYEAR,IMON,IDAY) of NDAYS days after 0001/01/01, inverse of DATE2DAYS
+    """
+    if LLEAPYR:
+        N400, ND = divmod(NDAYS, 146097)            # !! 400-year cycle
+        N100, ND = divmod(ND, 36524)
+        N4, ND = divmod(ND, 1461)
+        N1, ND = divmod(ND, 365)
+        IYEAR = N400 * 400 + N100 * 100 + N4 * 4 + N1 + 1
+        if N1 == 4 or N100 == 4:                    # !! last day of a leap year closing the cycle
+            return IYEAR - 1, 12, 31
+        if _ISLEAP(IYEAR, LLEAPYR) and ND >= 59:
+            if ND == 59:
+                return IYEAR, 2, 29
+            ND = ND - 1
+    else:
+        IYEAR, ND = divmod(NDAYS, 365)
+        IYEAR = IYEAR + 1
+    IMON = bisect.bisect_right(_NDCUM, ND)
+    return IYEAR, IMON, ND - _NDCUM[IMON - 1] + 1
+
+
 class CMF_UTILS_MOD:
     def __init__(self,Datatype,  CC_NMLIST, CM_NMLISTT):
         # *** 2. default value
@@ -86,7 +133,7 @@ class CMF_UTILS_MOD:
 
     def DATE2MIN(self, YYYYMMDD,HHMM,YYYY0,log_filename):
         #-----------------------------------------------------------------------------------------
-        DATE2MIN = 0
+        YYYYMMDD, HHMM, YYYY0 = int(YYYYMMDD), int(HHMM), int(YYYY0)
         YYYY, MM, DD = SPLITDATE(YYYYMMDD)
 
         HH = HHMM // 100  # hour
@@ -110,21 +157,10 @@ class CMF_UTILS_MOD:
                 log_file.write(f"DATE2MIN: MI:    Date Problem: {YYYYMMDD, HHMM}\n")
                 raise ValueError(f"DATE2MIN: MI:    Date Problem {YYYYMMDD}, {HHMM}")
 
-            IY = YYYY0
-            while IY < YYYY:
-                for IM in range(1, 13):
-                    DATE2MIN = DATE2MIN + IMDAYS(IY, IM, self.LLEAPYR) * self.D2MIN
-                IY = IY + 1
+        NDAYS = DATE2DAYS(YYYY, MM, DD, self.LLEAPYR) - DATE2DAYS(YYYY0, 1, 1, self.LLEAPYR)
+        DATE2MIN = NDAYS * self.D2MIN + HH * 60 + MI
 
-            IM = 1
-            while IM < MM:
-                DATE2MIN = DATE2MIN + IMDAYS(IY, IM, self.LLEAPYR) * self.D2MIN
-                IM = IM + 1
-
-            DATE2MIN = DATE2MIN + (DD - 1) * self.D2MIN
-            DATE2MIN = DATE2MIN + HH * 60 + MI
-
-            return DATE2MIN
+        return DATE2MIN
 
     # ==========================================================
     def SPLITDATE(self,YYYYMMDD):
@@ -192,27 +228,12 @@ class CMF_UTILS_MOD:
         return D2VAR[:, 1]
     def MIN2DATE(self, IMIN, YYYY0, MM0, DD0):
 
-        """!  Return YYYYMMDD and HHMM for IMIN"""
-
-        NDAYS = IMIN // self.D2MIN  # days  in IMIN : 1440 = (minutes in a day)
-        MI = IMIN % self.D2MIN
-        HH = int(MI // 60)  # hours in IMIN
-        MI = MI % 60  # mins  in IMIN
-
-        YYYY = YYYY0.clone()
-        MM = MM0.clone()
-        DD = DD0.clone()
-        NDM = IMDAYS(YYYY, MM, self.LLEAPYR)  # number of days in a month
-
-        for ID in range(1, NDAYS + 1):
-            DD += 1
-            if DD > NDM:
-                MM += 1
-                DD = 1
-                if MM > 12:
-                    MM = 1
-                    YYYY += 1
-                NDM = IMDAYS(YYYY, MM, self.LLEAPYR)
+        """!  Return YYYYMMDD and HHMM for IMIN (host ints, no day-by-day loop)"""
+
+        NDAYS, MI = divmod(int(IMIN), self.D2MIN)  # days  in IMIN : 1440 = (minutes in a day)
+        HH, MI = divmod(MI, 60)  # hours, mins in IMIN
+
+        YYYY, MM, DD = DAYS2DATE(DATE2DAYS(int(YYYY0), int(MM0), int(DD0), self.LLEAPYR) + NDAYS, self.LLEAPYR)
 
         HHMM = HH * 100 + MI
         YYYYMMDD = YYYY * 10000 + MM * 100 + DD
@@ -13,9 +13,12 @@ Licensed under the Apache License, Version 2.0.
 ! -- CMF_DRV_INPUT    : Set namelist & logfile
 ! -- CMF_DRV_INIT     : Initialize        CaMa-Flood
 ! -- CMF_DRV_END      : Finalize          CaMa-Flood
+! -- main_region      : one process per basin region (REGIONALL > 1)
 """
+import os
 from cmf_drv_control_mod import CMF_DRV_INPUT,CMF_DRV_INIT,CMF_DRV_END
 import cmf_drv_advance_mod
+from cmf_ctrl_physics_mod import CMF_PHYSICS_WATBAL_FLUSH
 import torch
 from fortran_tensor_3D import Ftensor_3D
 from parkind1 import Parkind1
@@ -25,6 +28,7 @@ from  run_yml_1 import run_config_1
 from  run_yml_2 import run_config_2
 from  run_yml_3 import run_config_3
 from cmf_utils_mod import CMF_UTILS_MOD
+from cmf_ctrl_mpi_mod import CMF_MPI_INIT, CMF_MPI_END, CMF_MPI_REGION_CONFIG, CMF_MPI_YEAR_END
 
 
 def _to_int(x):
@@ -94,10 +98,27 @@ def main_cmAI (config):
 
 # ----------------------------------------------------------------------------------------------------------------------
 
-    #   !*** 3a. finalize CaMa-Flood
+    #   !*** 3a. finalize CaMa-Flood (flush water balance rows still buffered on device)
+    CMF_PHYSICS_WATBAL_FLUSH(CC_NMLIST, CC_VAR, config['RDIR'] + config['LOGOUT'])
     CMF_DRV_END     (config,CC_NMLIST,CF_NMLIST,CM_NMLIST,CO_NMLIST,CT_NMLIST)
 
     return config
+
+
+def main_region(RANK, config):
+    """
+    One process per region (REGIONALL > 1). Regions hold whole river basins (CALC_REGION), so they
+    only meet to reduce the adaptive time step, the water balance and the output/restart maps.
+    """
+    torch.use_deterministic_algorithms(True)
+    config = CMF_MPI_REGION_CONFIG(config, RANK + 1)
+    CMF_MPI_INIT(config)
+    while config["IYR"] <= config["YEND"]:
+        config = run_config_2(config)
+        config = main_cmAI(config)
+        config = CMF_MPI_YEAR_END(config, run_config_3)
+    CMF_MPI_END()
+    return config
 # ----------------------------------------------------------------------------------------------------------------------
 if __name__ == '__main__':
 
@@ -114,9 +135,17 @@ if __name__ == '__main__':
     if args.exp is not None:
         config["EXP"] = args.exp.rstrip("/\\") + "/"
 
-    config = run_config_1(config)
-    while config["IYR"] <= config["YEND"]:
-        config = run_config_2(config)
-        config = main_cmAI(config)
-        config = run_config_3(config)
+    if int(config.get("REGIONALL", 1)) > 1:
+        config = run_config_1(config)
+        if "WORLD_SIZE" in os.environ:          # launched by torchrun (several nodes): one region per rank
+            config["CMPIINIT"] = "env://"
+            main_region(int(os.environ["RANK"]), config)
+        else:
+            torch.multiprocessing.spawn(main_region, args=(config,), nprocs=int(config["REGIONALL"]))
+    else:
+        config = run_config_1(config)
+        while config["IYR"] <= config["YEND"]:
+            config = run_config_2(config)
+            config = main_cmAI(config)
+            config = run_config_3(config)
 # ----------------------------------------------------------------------------------------------------------------------
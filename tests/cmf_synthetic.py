@@ -0,0 +1,144 @@
+"""
+Synthetic river network, map and state for the backend checks (no map files needed).
+
+synthetic_map() returns a CM_NMLIST-like namespace of NBASIN tree-shaped basins with NCELL river
+cells each, in CaMa sequence order (rivers first, every cell drains to a later cell of its basin,
+then one mouth per basin). synthetic_state() returns the matching CC_VARS-like namespace.
+synthetic_nextxy() returns raw (NX, NY) next-xy maps for the map-building checks.
+"""
+from types import SimpleNamespace
+import numpy as np
+import torch
+
+from fortran_tensor_1D import Ftensor_1D
+from fortran_tensor_2D import Ftensor_2D
+from fortran_tensor_3D import Ftensor_3D
+from cmf_ctrl_vars_mod import CMF_WORKSPACE
+
+NLFP = 10
+
+STATE_FIELDS = (
+    "P2RIVSTO", "P2FLDSTO", "P2GDWSTO", "D2RIVDPH", "D2RIVDPH_PRE", "D2FLDDPH", "D2FLDDPH_PRE", "D2FLDFRC",
+    "D2FLDARE", "D2SFCELV", "D2SFCELV_PRE", "D2DWNELV_PRE", "D2STORGE", "D2RIVOUT", "D2FLDOUT", "D2RIVOUT_PRE",
+    "D2FLDOUT_PRE", "D2FLDSTO_PRE", "D2RIVVEL", "D2RIVINF", "D2FLDINF", "D2PTHOUT", "D2PTHINF", "D2OUTFLW",
+    "D2RUNOFF", "D2ROFSUB", "D2GDWRTN", "D2STGREF",
+    "D2RIVOUT_aAVG", "D2FLDOUT_aAVG", "D2RIVVEL_aAVG", "D2OUTFLW_aAVG", "D2PTHOUT_aAVG", "D2GDWRTN_aAVG",
+    "D2RUNOFF_aAVG", "D2ROFSUB_aAVG", "D2STORGE_aMAX", "D2OUTFLW_aMAX", "D2RIVDPH_aMAX",
+)
+
+
+def _col(values):
+    return Ftensor_2D(torch.as_tensor(values, dtype=torch.float64).reshape(-1, 1).clone())
+
+
+def synthetic_nmlist(**overrides):
+    nml = dict(DT=600.0, PGRV=9.8, PMANFLD=0.1, PDSTMTH=10000.0, PCADP=0.7, NLFP=NLFP, RSTGTOL=0.0,
+               LFLDOUT=True, LPTHOUT=False, LROSPLIT=False, LGDWDLY=False, LWEVAP=False, LSLOPEMOUTH=False,
+               LACTIVE=False, NCPUCHUNK=1, CINFLOW="scatter", COUTFLW_CPU="tensor", LDAMOUT=False,
+               LSEDOUT=False)
+    nml.update(overrides)
+    return SimpleNamespace(**nml)
+
+
+def synthetic_map(NBASIN=6, NCELL=7, NPATH=0, seed=0):
+    rng = np.random.default_rng(seed)
+    nriv = NBASIN * NCELL
+    nseq = nriv + NBASIN
+    nxt = np.zeros(nriv, dtype=np.int64)
+    pos = np.zeros(nseq)                                    # !! position along the basin, 0 at the source
+    for b in range(NBASIN):
+        for k in range(NCELL):
+            i = b * NCELL + k
+            nxt[i] = (b * NCELL + int(rng.integers(k + 1, NCELL)) if k < NCELL - 1 else nriv + b) + 1
+            pos[i] = k
+        pos[nriv + b] = NCELL
+
+    rivlen = 2000.0 + 3000.0 * rng.random(nseq)
+    rivwth = 20.0 + 80.0 * rng.random(nseq)
+    rivhgt = 1.0 + 4.0 * rng.random(nseq)
+    grarea = 5.0e6 + 5.0e7 * rng.random(nseq)
+    elevtn = 5.0 * (NCELL - pos) + rng.random(nseq)
+    fldgrd = 0.05 + 0.5 * rng.random((nseq, NLFP))
+    dwth_inc = grarea / rivlen / NLFP
+    rivstomax = rivlen * rivwth * rivhgt
+    dsto = rivlen[:, None] * (rivwth[:, None] + dwth_inc[:, None] * (np.arange(NLFP) + 0.5)) * fldgrd * dwth_inc[:, None]
+    fldstomax = rivstomax[:, None] + np.cumsum(dsto, axis=1)
+
+    CM = SimpleNamespace(
+        NSEQALL=nseq, NSEQRIV=nriv, NSEQMAX=nseq, NPTHOUT=NPATH, NPTHLEV=1,
+        DFRCINC=torch.tensor(1.0 / NLFP, dtype=torch.float64),
+        I1NEXT=Ftensor_1D(torch.as_tensor(nxt, dtype=torch.int32), start_index=1),
+        I2MASK=Ftensor_2D(torch.zeros((nseq, 1), dtype=torch.int32)),
+        D2RIVELV=_col(elevtn - rivhgt), D2RIVWTH=_col(rivwth), D2RIVHGT=_col(rivhgt),
+        D2RIVMAN=_col(np.full(nseq, 0.03)), D2RIVLEN=_col(rivlen), D2ELEVTN=_col(elevtn),
+        D2NXTDST=_col(rivlen), D2DWNELV=_col(elevtn), D2GRAREA=_col(grarea), D2RIVSTOMAX=_col(rivstomax),
+        D2FLDSTOMAX=Ftensor_3D(torch.as_tensor(fldstomax).reshape(nseq, 1, NLFP).clone()),
+        D2FLDGRD=Ftensor_3D(torch.as_tensor(fldgrd).reshape(nseq, 1, NLFP).clone()),
+    )
+    if NPATH > 0:
+        # !! bifurcation channels between neighbouring basins (upstream end in basin b, downstream in b+1)
+        upst = np.array([(p % NBASIN) * NCELL + int(rng.integers(NCELL)) for p in range(NPATH)]) + 1
+        down = np.array([((p + 1) % NBASIN) * NCELL + int(rng.integers(NCELL)) for p in range(NPATH)]) + 1
+        CM.PTH_UPST = Ftensor_1D(torch.as_tensor(upst, dtype=torch.int32), start_index=1)
+        CM.PTH_DOWN = Ftensor_1D(torch.as_tensor(down, dtype=torch.int32), start_index=1)
+        CM.PTH_DST = Ftensor_1D(torch.as_tensor(1000.0 + 1000.0 * rng.random(NPATH)), start_index=1)
+        CM.PTH_ELV = Ftensor_2D(torch.as_tensor(elevtn[upst - 1] - 1.0).reshape(NPATH, 1).clone())
+        CM.PTH_WTH = Ftensor_2D(torch.as_tensor(10.0 + 10.0 * rng.random(NPATH)).reshape(NPATH, 1).clone())
+        CM.PTH_MAN = Ftensor_1D(torch.tensor([0.03], dtype=torch.float64), start_index=1)
+    return CM
+
+
+def synthetic_state(CM, WET=(), seed=1):
+    """
+    CC_VARS-like namespace; the basins in WET get river storage (below bankfull) and runoff, the others stay dry.
+    """
+    rng = np.random.default_rng(seed)
+    nseq, nriv = CM.NSEQALL, CM.NSEQRIV
+    nbasin = nseq - nriv
+    ncell = nriv // nbasin
+    CC_VARS = SimpleNamespace(**{name: _col(np.zeros(nseq)) for name in STATE_FIELDS})
+    CC_VARS.WORKSPACE = CMF_WORKSPACE("cpu")
+    CC_VARS.NADD_adp = 0.0
+    CC_VARS.NSTOVER = 0
+    npth, nlev = CM.NPTHOUT, CM.NPTHLEV
+    CC_VARS.D1PTHFLW = Ftensor_2D(torch.zeros((npth, nlev), dtype=torch.float64))
+    CC_VARS.D1PTHFLW_PRE = Ftensor_2D(torch.zeros((npth, nlev), dtype=torch.float64))
+    CC_VARS.D1PTHFLW_aAVG = Ftensor_2D(torch.zeros((npth, nlev), dtype=torch.float64))
+    CC_VARS.D1PTHFLWSUM = Ftensor_1D(torch.zeros(max(npth, nseq), dtype=torch.float64), start_index=1)
+    CC_VARS.D2STGREF.raw().fill_(-1.0)
+
+    basin = np.concatenate([np.repeat(np.arange(nbasin), ncell), np.arange(nbasin)])
+    wet = np.isin(basin, np.asarray(WET, dtype=np.int64))
+    rivstomax = CM.D2RIVSTOMAX.raw()[:, 0].numpy()
+    rivsto = np.where(wet, rivstomax * (0.3 + 0.6 * rng.random(nseq)), 0.0)
+    rivdph = rivsto / CM.D2RIVLEN.raw()[:, 0].numpy() / CM.D2RIVWTH.raw()[:, 0].numpy()
+    for name, value in (("P2RIVSTO", rivsto), ("D2STORGE", rivsto), ("D2RIVDPH", rivdph), ("D2RIVDPH_PRE", rivdph),
+                        ("D2RUNOFF", np.where(wet, 5.0 * rng.random(nseq), 0.0))):
+        getattr(CC_VARS, name).raw()[:, 0] = torch.as_tensor(value)
+    CC_VARS.D2SFCELV.raw().copy_(CM.D2RIVELV.raw() + CC_VARS.D2RIVDPH.raw())
+    return CC_VARS, basin
+
+
+def synthetic_nextxy(nx, ny, seed):
+    """
+    Every land grid drains to a random lower-ranked land neighbour (1-based next-xy), or is a river mouth
+    (-9) when it has none. About a tenth of the grids are ocean (-9999).
+    """
+    rng = np.random.default_rng(seed)
+    rank = rng.permutation(nx * ny).reshape(nx, ny)
+    land = rng.random((nx, ny)) > 0.1
+    nextx = np.full((nx, ny), -9999, dtype=np.int32)
+    nexty = np.full((nx, ny), -9999, dtype=np.int32)
+    for ix in range(nx):
+        for iy in range(ny):
+            if not land[ix, iy]:
+                continue
+            lower = [(jx, jy) for jx in range(max(ix - 1, 0), min(ix + 2, nx))
+                     for jy in range(max(iy - 1, 0), min(iy + 2, ny))
+                     if land[jx, jy] and rank[jx, jy] < rank[ix, iy]]
+            if lower:
+                jx, jy = lower[int(rng.integers(len(lower)))]
+                nextx[ix, iy], nexty[ix, iy] = jx + 1, jy + 1
+            else:
+                nextx[ix, iy] = nexty[ix, iy] = -9
+    return nextx, nexty
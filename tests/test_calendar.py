@@ -0,0 +1,42 @@
+"""
+Closed-form DATE2DAYS / DAYS2DATE against datetime (Gregorian, LLEAPYR=.true.) and against a day-by-day 365-day
+calendar (LLEAPYR=.false.), for every day of the years 1-2199.
+"""
+import datetime
+import pytest
+
+pytest.importorskip("torch")
+
+from cmf_utils_mod import DATE2DAYS, DAYS2DATE, IMDAYS
+
+YEAR1, YEAR2 = 1, 2199
+
+
+def test_leap_calendar_matches_datetime():
+    day = datetime.date(YEAR1, 1, 1)
+    last = datetime.date(YEAR2, 12, 31)
+    one = datetime.timedelta(days=1)
+    while day <= last:
+        ndays = day.toordinal() - 1
+        assert DATE2DAYS(day.year, day.month, day.day, True) == ndays, day
+        assert DAYS2DATE(ndays, True) == (day.year, day.month, day.day), day
+        day += one
+
+
+@pytest.mark.parametrize("year", [4, 100, 400, 1600, 1900, 2000, 2100])
+def test_leap_calendar_year_ends(year):
+    for month, day in ((2, 28), (2, IMDAYS(year, 2, True)), (3, 1), (12, 31)):
+        ndays = datetime.date(year, month, day).toordinal() - 1
+        assert DATE2DAYS(year, month, day, True) == ndays
+        assert DAYS2DATE(ndays, True) == (year, month, day)
+
+
+def test_noleap_calendar_day_by_day():
+    ndays = 0
+    for year in range(YEAR1, YEAR2 + 1):
+        for month in range(1, 13):
+            for day in range(1, IMDAYS(year, month, False) + 1):
+                assert DATE2DAYS(year, month, day, False) == ndays, (year, month, day)
+                assert DAYS2DATE(ndays, False) == (year, month, day), ndays
+                ndays += 1
+    assert ndays == (YEAR2 - YEAR1 + 1) * 365
@@ -0,0 +1,107 @@
+"""
+CONV_RESOL (runoff without input matrix, CMF_CONVRES_INIT) in its SAME, FINE, COARSE and NEAREST modes: a
+constant field is preserved, K=1 modes take the input cell holding the map cell centre, FINE conserves the
+area-weighted mass, and an input grid that does not cover the map domain is rejected.
+"""
+from types import SimpleNamespace
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+
+from fortran_tensor_1D import Ftensor_1D
+from fortran_tensor_2D import Ftensor_2D
+from fortran_tensor_3D import Ftensor_3D
+from parkind1 import Parkind1
+from cmf_ctrl_forcing_mod import CMF_FORCING_NMLIST_MOD
+
+NX, NY = 12, 8
+WEST, EAST, SOUTH, NORTH = 100.0, 112.0, 20.0, 28.0          # !! 1-degree map grid
+RMIS = 1.0e20
+
+#   mode, NXIN, NYIN, input extent (None: the map extent)
+CASES = [
+    ("SAME", NX, NY, None),
+    ("SAME", NX + 4, NY + 2, (98.0, 114.0, 19.0, 29.0)),
+    ("FINE", 3 * NX, 2 * NY, None),
+    ("FINE", 3 * NX + 6, 2 * NY, (99.0, 113.0, 20.0, 28.0)),
+    ("COARSE", NX // 2, NY // 4, None),
+    ("COARSE", NX // 2 + 1, NY // 4 + 1, (98.0, 112.0, 16.0, 28.0)),
+    ("NEAREST", 5, 3, None),
+    ("NEAREST", 7, 5, (95.0, 116.0, 17.0, 30.5)),
+]
+
+
+def _setup(nxin, nyin, extent, tmp_path):
+    Datatype = Parkind1()
+    CC_NMLIST = SimpleNamespace(NX=NX, NY=NY, NXIN=nxin, NYIN=nyin, WEST=WEST, EAST=EAST, SOUTH=SOUTH, NORTH=NORTH,
+                                RMIS=RMIS, LROSPLIT=False, LWEVAP=False, LINPCDF=False)
+    ix, iy = np.meshgrid(np.arange(1, NX + 1), np.arange(1, NY + 1), indexing="ij")
+    nseq = NX * NY
+    CM = SimpleNamespace(NSEQALL=nseq, NSEQMAX=nseq,
+                         I1SEQX=Ftensor_1D(torch.as_tensor(ix.ravel(), dtype=torch.int32), start_index=1),
+                         I1SEQY=Ftensor_1D(torch.as_tensor(iy.ravel(), dtype=torch.int32), start_index=1),
+                         D2GRAREA=Ftensor_2D(torch.ones((nseq, 1), dtype=torch.float64)))
+    FRC = CMF_FORCING_NMLIST_MOD({"device": "cpu"}, Datatype, CC_NMLIST)
+    FRC.DROFUNIT = torch.tensor(1.0, dtype=Datatype.JPRB)
+    if extent is not None:
+        FRC.WESTIN, FRC.EASTIN, FRC.SOUTHIN, FRC.NORTHIN = extent
+    config = {"RDIR": str(tmp_path) + "/", "LOGOUT": "log.txt", "device": "cpu"}
+    return Datatype, CC_NMLIST, CM, FRC, config, ix.ravel() - 1, iy.ravel() - 1
+
+
+def _put(FRC, CC_NMLIST, CM, config, Datatype, field):
+    PBUFF = torch.zeros((CC_NMLIST.NXIN, CC_NMLIST.NYIN, 2), dtype=Datatype.JPRB)
+    PBUFF[:, :, 0] = torch.as_tensor(field)
+    CC_VAR = SimpleNamespace(D2RUNOFF=Ftensor_2D(torch.zeros((CM.NSEQMAX, 1), dtype=Datatype.JPRB)),
+                             D2ROFSUB=Ftensor_2D(torch.zeros((CM.NSEQMAX, 1), dtype=Datatype.JPRB)))
+    FRC.CMF_FORCING_PUT(CC_NMLIST, CM, Ftensor_3D(PBUFF), config, Datatype, CC_VAR)
+    return CC_VAR.D2RUNOFF.raw()[:, 0].numpy() / CM.D2GRAREA.raw()[:, 0].numpy()
+
+
+@pytest.mark.parametrize("mode, nxin, nyin, extent", CASES)
+def test_convres_preserves_constant_field(mode, nxin, nyin, extent, tmp_path):
+    Datatype, CC_NMLIST, CM, FRC, config, _, _ = _setup(nxin, nyin, extent, tmp_path)
+    FRC.CMF_FORCING_INIT(CC_NMLIST, None, None, config["RDIR"] + config["LOGOUT"], CM, Datatype)
+    assert FRC.INPCNV["mode"] == mode
+    out = _put(FRC, CC_NMLIST, CM, config, Datatype, np.full((nxin, nyin), 3.5))
+    assert np.allclose(out, 3.5, rtol=1e-12, atol=0.0)
+
+
+@pytest.mark.parametrize("mode, nxin, nyin, extent", [case for case in CASES if case[0] != "FINE"])
+def test_convres_takes_input_cell_of_cell_centre(mode, nxin, nyin, extent, tmp_path):
+    Datatype, CC_NMLIST, CM, FRC, config, ix, iy = _setup(nxin, nyin, extent, tmp_path)
+    FRC.CMF_FORCING_INIT(CC_NMLIST, None, None, config["RDIR"] + config["LOGOUT"], CM, Datatype)
+    westin, eastin, southin, northin = extent if extent is not None else (WEST, EAST, SOUTH, NORTH)
+    lon = WEST + (ix + 0.5) * (EAST - WEST) / NX
+    lat = NORTH - (iy + 0.5) * (NORTH - SOUTH) / NY
+    ixin = np.floor((lon - westin) / ((eastin - westin) / nxin)).astype(np.int64)
+    iyin = np.floor((northin - lat) / ((northin - southin) / nyin)).astype(np.int64)
+    field = np.arange(nxin)[:, None] * 1000.0 + np.arange(nyin)[None, :]
+    out = _put(FRC, CC_NMLIST, CM, config, Datatype, field)
+    assert np.array_equal(out, field[ixin, iyin])
+
+
+@pytest.mark.parametrize("nxin, nyin", [(3 * NX, 2 * NY), (2 * NX, 4 * NY)])
+def test_convres_fine_conserves_mass(nxin, nyin, tmp_path):
+    Datatype, CC_NMLIST, CM, FRC, config, ix, iy = _setup(nxin, nyin, None, tmp_path)
+    rx, ry = nxin // NX, nyin // NY
+    latin = NORTH - (np.arange(nyin) + 0.5) * (NORTH - SOUTH) / nyin
+    areain = np.broadcast_to(np.cos(np.deg2rad(latin))[None, :], (nxin, nyin))
+    # !! map cell area = the sum of its input cell areas
+    grarea = areain.reshape(NX, rx, NY, ry).sum(axis=(1, 3))[ix, iy]
+    CM.D2GRAREA = Ftensor_2D(torch.as_tensor(grarea).reshape(-1, 1).clone())
+    FRC.CMF_FORCING_INIT(CC_NMLIST, None, None, config["RDIR"] + config["LOGOUT"], CM, Datatype)
+    assert FRC.INPCNV["mode"] == "FINE"
+
+    field = np.random.default_rng(0).random((nxin, nyin))
+    out = _put(FRC, CC_NMLIST, CM, config, Datatype, field)
+    assert np.isclose((out * grarea).sum(), (field * areain).sum(), rtol=1e-12, atol=0.0)
+
+
+@pytest.mark.parametrize("nxin, nyin, extent", [(NX, NY, (101.0, 113.0, 20.0, 28.0)),
+                                                (24, 16, (100.0, 112.0, 21.0, 29.0))])
+def test_convres_rejects_input_grid_not_covering_map(nxin, nyin, extent, tmp_path):
+    Datatype, CC_NMLIST, CM, FRC, config, _, _ = _setup(nxin, nyin, extent, tmp_path)
+    with pytest.raises(ValueError):
+        FRC.CMF_FORCING_INIT(CC_NMLIST, None, None, config["RDIR"] + config["LOGOUT"], CM, Datatype)
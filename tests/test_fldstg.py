@@ -0,0 +1,59 @@
+"""
+CPU (Numba) and CUDA (tensor) FLDSTG backends on a synthetic map, with and without RSTGTOL.
+The tensor body runs on the CPU here, so no GPU is needed.
+"""
+from types import SimpleNamespace
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+pytest.importorskip("numba")
+
+from parkind1 import Parkind1
+from cmf_calc_fldstg_cpu import CMF_CALC_FLDSTG_CPU
+from cmf_calc_fldstg_cuda import CMF_CALC_FLDSTG_TORCH
+from cmf_synthetic import NLFP, synthetic_map, synthetic_state
+
+STATE = ("P2RIVSTO", "P2FLDSTO", "D2RIVDPH", "D2FLDDPH", "D2FLDFRC", "D2FLDARE", "D2SFCELV", "D2STORGE", "D2STGREF")
+GLB = ("P0GLBSTOPRE2", "P0GLBSTONEW2", "P0GLBRIVSTO", "P0GLBFLDSTO", "P0GLBFLDARE")
+
+
+def _state(CM):
+    """
+    synthetic_state with total storage from 0.2 to 3 times bankfull, so that part of the cells is flooded.
+    """
+    CC_VARS, _ = synthetic_state(CM)
+    rivstomax = CM.D2RIVSTOMAX.raw()[:, 0]
+    CC_VARS.P2RIVSTO.raw()[:, 0] = rivstomax * torch.as_tensor(0.2 + 2.8 * np.random.default_rng(1).random(CM.NSEQALL))
+    return CC_VARS
+
+
+@pytest.mark.parametrize("rstgtol", [0.0, 0.01])
+def test_fldstg_cpu_matches_tensor_backend(rstgtol):
+    Datatype = Parkind1()
+    CM = synthetic_map(NBASIN=8, NCELL=7)
+    nseq = CM.NSEQALL
+    CC_NMLIST = SimpleNamespace(NLFP=NLFP, RSTGTOL=rstgtol)
+    cpu, ref = _state(CM), _state(CM)
+
+    nskip = 0
+    for step in range(6):
+        # !! a third of the cells moves well beyond RSTGTOL, the rest stays well within it
+        factor = torch.where(torch.arange(nseq) % 3 == step % 3,
+                             torch.tensor(1.3, dtype=torch.float64), torch.tensor(1.0005, dtype=torch.float64))
+        for CC_VARS in (cpu, ref):
+            CC_VARS.P2RIVSTO.raw()[:, 0] *= factor
+            CC_VARS.P2FLDSTO.raw()[:, 0] *= factor
+        CMF_CALC_FLDSTG_CPU(CM, CC_NMLIST, cpu, "cpu", Datatype)
+        CMF_CALC_FLDSTG_TORCH(CM, CC_NMLIST, ref, "cpu", Datatype)
+
+        for name in STATE:
+            assert torch.allclose(getattr(cpu, name).raw(), getattr(ref, name).raw(), rtol=1e-10, atol=1e-9), name
+        for name in GLB:
+            assert float(getattr(cpu, name)) == pytest.approx(float(getattr(ref, name)), rel=1e-12), name
+        if rstgtol > 0.0:
+            total = cpu.P2RIVSTO.raw() + cpu.P2FLDSTO.raw()
+            nskip += int(torch.sum(cpu.D2STGREF.raw() != total))
+
+    if rstgtol > 0.0:
+        assert nskip > 0                        # !! the skip branch was exercised
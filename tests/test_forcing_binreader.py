@@ -0,0 +1,66 @@
+"""
+CMF_FORCING_BINREADER: records handed out synchronously or from the prefetch queue equal a direct read of the daily
+plain binary files (runoff and sub-surface, full grid or input box), across a file boundary; a record beyond the
+end of a file raises when it is requested, not when it is only queued.
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("torch")
+
+from cmf_forcing_prefetch_mod import CMF_FORCING_BINREADER
+
+NXIN, NYIN, NREC = 7, 5, 4
+
+
+def _files(tmp_path):
+    rng = np.random.default_rng(0)
+    files = {}
+    for prefix in ("Roff", "Rsub"):
+        for day in ("20000101", "20000102"):
+            path = str(tmp_path / f"{prefix}____{day}.one")
+            rng.random((NREC, NYIN, NXIN)).astype(np.float32).tofile(path)
+            files[prefix, day] = path
+    return files
+
+
+def _direct(path, irec, box):
+    ix0, ix1, iy0, iy1 = box
+    return np.fromfile(path, dtype=np.float32).reshape(NREC, NYIN, NXIN)[irec - 1].T[ix0:ix1, iy0:iy1]
+
+
+@pytest.mark.parametrize("ninppref", [0, 1, 3])
+@pytest.mark.parametrize("box", [None, (1, 6, 2, 5)])
+@pytest.mark.parametrize("lrosplit", [False, True])
+def test_binreader_matches_direct_read(ninppref, box, lrosplit, tmp_path):
+    files = _files(tmp_path)
+    keys = [(files["Roff", day], files["Rsub", day] if lrosplit else None, irec)
+            for day in ("20000101", "20000102") for irec in range(1, NREC + 1)]
+    reader = CMF_FORCING_BINREADER(NXIN, NYIN, ninppref, box)
+    try:
+        for i, key in enumerate(keys):
+            record = reader.GET(key, keys[i + 1:])
+            for path, data in zip(key[:2], record):
+                if path is None:
+                    assert data is None
+                    continue
+                assert np.array_equal(data.numpy(), _direct(path, key[2], box or (0, NXIN, 0, NYIN))), key
+            assert len(reader.PEND) <= ninppref
+        # !! the same key again is the record handed out last
+        assert reader.GET(keys[-1]) is record
+    finally:
+        reader.CLOSE()
+
+
+@pytest.mark.parametrize("ninppref", [0, 2])
+def test_binreader_raises_beyond_end_of_file(ninppref, tmp_path):
+    files = _files(tmp_path)
+    path = files["Roff", "20000101"]
+    reader = CMF_FORCING_BINREADER(NXIN, NYIN, ninppref)
+    try:
+        # !! queued, but not requested: no error yet
+        reader.GET((path, None, NREC), [(path, None, NREC + 1)])
+        with pytest.raises(ValueError):
+            reader.GET((path, None, NREC + 1))
+    finally:
+        reader.CLOSE()
@@ -0,0 +1,82 @@
+"""
+CMF_FORCING_CDFREADER: time blocks (NCDFBLK, aligned to the time chunks), the decoding of packed variables and the
+two-file LRU of open datasets return the same records as a plain netCDF4 read, across monthly file boundaries.
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("torch")
+netCDF4 = pytest.importorskip("netCDF4")
+
+from cmf_forcing_cdf_mod import CDF_FILENAME, CDF_FILESTART, CDF_SPLIT, CMF_FORCING_CDFREADER
+
+NXIN, NYIN, NTCHK = 6, 4, 3
+RMIS = 1.0e20
+FILL = -32767
+NREC = {1: 7, 2: 5, 3: 6}                       # !! records per monthly file
+
+
+def _files(tmp_path):
+    template = str(tmp_path / "runoff_{YYYY}{MM}.nc")
+    rng = np.random.default_rng(0)
+    for month, nrec in NREC.items():
+        with netCDF4.Dataset(CDF_FILENAME(template, 2000, month, 1), "w") as nc:
+            nc.createDimension("time", None)
+            nc.createDimension("lat", NYIN)
+            nc.createDimension("lon", NXIN)
+            qs = nc.createVariable("Qs", "i2", ("time", "lat", "lon"), chunksizes=(NTCHK, NYIN, NXIN),
+                                   fill_value=FILL)
+            qs.scale_factor = 0.01
+            qs.add_offset = 5.0
+            qsb = nc.createVariable("Qsb", "f4", ("time", "lat", "lon"), chunksizes=(NTCHK, NYIN, NXIN))
+            packed = rng.integers(-3000, 3000, size=(nrec, NYIN, NXIN)).astype(np.int16)
+            packed[rng.random(packed.shape) < 0.1] = FILL                  # !! missing cells
+            qs.set_auto_maskandscale(False)
+            qs[:] = packed
+            qsb[:] = rng.random((nrec, NYIN, NXIN)).astype(np.float32)
+    return template
+
+
+def _plain(cfile, cvar, irec, box):
+    ix0, ix1, iy0, iy1 = box
+    with netCDF4.Dataset(cfile) as nc:
+        data = nc.variables[cvar][irec]
+    data = np.ma.filled(np.ma.asarray(data, dtype=np.float64), RMIS)
+    return data.T[ix0:ix1, iy0:iy1]
+
+
+@pytest.mark.parametrize("ncdfblk", [1, 4, 8])
+@pytest.mark.parametrize("box", [None, (1, 5, 0, 3)])
+def test_cdfreader_matches_plain_read(ncdfblk, box, tmp_path):
+    template = _files(tmp_path)
+    assert CDF_SPLIT(template) == "MON"
+    reader = CMF_FORCING_CDFREADER(["Qs", "Qsb"], ncdfblk, RMIS, box)
+    # !! forward through the three months, then back to the first one (reopened after the LRU dropped it)
+    reads = [(month, irec) for month in (1, 2, 3) for irec in range(NREC[month])] + [(1, 5), (1, 0), (3, 2)]
+    try:
+        for month, irec in reads:
+            cfile = CDF_FILENAME(template, *CDF_FILESTART("MON", 2000, month, 17))
+            qs, qsb = reader.GET(cfile, irec)
+            assert len(reader.FILES) <= 2
+            ref_box = box or (0, NXIN, 0, NYIN)
+            ref_qs = _plain(cfile, "Qs", irec, ref_box)
+            assert np.array_equal(qs.numpy() == RMIS, ref_qs == RMIS), (month, irec)
+            assert np.allclose(qs.numpy(), ref_qs, rtol=1e-6, atol=1e-5), (month, irec)
+            assert np.array_equal(qsb.numpy(), _plain(cfile, "Qsb", irec, ref_box).astype(np.float32)), (month, irec)
+            _, irec0, irec1, _ = reader.BLOCK
+            assert irec0 % NTCHK == 0 and irec1 - irec0 >= min(ncdfblk, NREC[month] - irec0)
+    finally:
+        reader.CLOSE()
+
+
+def test_cdfreader_raises_outside_file(tmp_path):
+    template = _files(tmp_path)
+    cfile = CDF_FILENAME(template, 2000, 2, 1)
+    reader = CMF_FORCING_CDFREADER(["Qs", None], 4, RMIS)
+    try:
+        qs, qsb = reader.GET(cfile, NREC[2] - 1)
+        assert qsb is None
+        with pytest.raises(ValueError):
+            reader.GET(cfile, NREC[2])
+    finally:
+        reader.CLOSE()
@@ -0,0 +1,115 @@
+"""
+CMF_MAPCACHE_SAVE / CMF_MAPCACHE_LOAD round trip on the synthetic map: every restored attribute equals the freshly
+built one (Ftensor kind, start indices, dtype, values, scalars), and a changed map file or setting gives a new key.
+"""
+from types import SimpleNamespace
+import os
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+
+from fortran_tensor_1D import Ftensor_1D
+from fortran_tensor_2D import Ftensor_2D
+from fortran_tensor_3D import Ftensor_3D
+from parkind1 import Parkind1
+from cmf_ctrl_mapcache_mod import (_MAP_FILES, CMF_MAPCACHE_KEY, CMF_MAPCACHE_LOAD, CMF_MAPCACHE_SAVE,
+                                   CMF_MAPCACHE_SNAPSHOT)
+from cmf_synthetic import synthetic_map
+
+
+def _nmlist(**overrides):
+    nml = dict(NX=8, NY=6, NLFP=10, WEST=-180.0, EAST=180.0, SOUTH=-90.0, NORTH=90.0, IMIS=-9999, REGIONALL=1,
+               REGIONTHIS=1, LFPLAIN=True, LPTHOUT=True, LMEANSL=False, LGDWDLY=False, LMAPEND=False,
+               PMANRIV=0.03, PMANFLD=0.1)
+    nml.update(overrides)
+    return SimpleNamespace(**nml)
+
+
+def _map_files(tmp_path):
+    files = {}
+    for name in _MAP_FILES + ("CPTHOUT",):
+        path = tmp_path / "map" / f"{name[1:].lower()}.bin"
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(name.encode() * 16)
+        files[name] = str(path)
+    return files
+
+
+def _cm(tmp_path, files, lmaphash=False):
+    return SimpleNamespace(CMAPCACHE=str(tmp_path / "cache"), LMAPHASH=lmaphash, **files)
+
+
+def _build(CM):
+    """
+    Stand-in for CMF_RIVMAP_INIT / CMF_TOPO_INIT: the synthetic map plus the other attribute kinds they set.
+    """
+    vars(CM).update(vars(synthetic_map(NPATH=3)))
+    CM.I1SEQLEV = torch.tensor([0, 5, 9, 12], dtype=torch.int64)
+    CM.I2VECTOR = Ftensor_2D(torch.arange(48, dtype=torch.int32).reshape(8, 6), start_row=1, start_col=1)
+    CM.I1UPST = Ftensor_2D(torch.ones((48, 4), dtype=torch.int32), start_row=1, start_col=0)
+    CM.D1LON = Ftensor_1D(torch.linspace(-170.0, 170.0, 8, dtype=torch.float32), start_index=1)
+    CM.NUPST0 = Ftensor_3D(torch.zeros((2, 3, 4), dtype=torch.int16), start_depth=0, start_row=1, start_col=1)
+    CM.REGIONGRID = 7
+    CM.DMOUTH = 2.5
+    CM.LMAPOK = True
+
+
+def _start(value):
+    if isinstance(value, Ftensor_1D):
+        return ("Ftensor_1D", value.start_index)
+    if isinstance(value, Ftensor_2D):
+        return ("Ftensor_2D", value.start_row, value.start_col)
+    if isinstance(value, Ftensor_3D):
+        return ("Ftensor_3D", value.start_depth, value.start_row, value.start_col)
+    return ("tensor",)
+
+
+def test_mapcache_round_trip(tmp_path):
+    Datatype = Parkind1()
+    CC_NMLIST = _nmlist()
+    files = _map_files(tmp_path)
+    log = str(tmp_path / "log.txt")
+
+    fresh = _cm(tmp_path, files)
+    assert not CMF_MAPCACHE_LOAD(fresh, CC_NMLIST, log, Datatype, "cpu")
+    snapshot = CMF_MAPCACHE_SNAPSHOT(fresh)
+    _build(fresh)
+    CMF_MAPCACHE_SAVE(fresh, snapshot, log)
+
+    cached = _cm(tmp_path, files)
+    assert CMF_MAPCACHE_LOAD(cached, CC_NMLIST, log, Datatype, "cpu")
+    built = {name: value for name, value in vars(fresh).items() if name not in snapshot and not name.startswith("_")}
+    assert set(built) <= set(vars(cached))
+    for name, value in built.items():
+        restored = getattr(cached, name)
+        if isinstance(value, (bool, int, float)):
+            assert type(restored) is type(value) and restored == value, name
+            continue
+        assert _start(restored) == _start(value), name
+        raw, raw_restored = (value.raw(), restored.raw()) if hasattr(value, "raw") else (value, restored)
+        assert raw_restored.dtype == raw.dtype, name
+        assert torch.equal(raw_restored, raw), name
+
+
+def test_mapcache_key_changes(tmp_path):
+    Datatype = Parkind1()
+    files = _map_files(tmp_path)
+    key = CMF_MAPCACHE_KEY(_cm(tmp_path, files), _nmlist(), Datatype)
+    assert CMF_MAPCACHE_KEY(_cm(tmp_path, files), _nmlist(), Datatype) == key
+
+    # !! changed setting
+    assert CMF_MAPCACHE_KEY(_cm(tmp_path, files), _nmlist(NLFP=20), Datatype) != key
+    assert CMF_MAPCACHE_KEY(_cm(tmp_path, files), _nmlist(PMANRIV=0.04), Datatype) != key
+    # !! changed file stamp (mtime), same content
+    st = os.stat(files["CRIVLEN"])
+    os.utime(files["CRIVLEN"], ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    key_touched = CMF_MAPCACHE_KEY(_cm(tmp_path, files), _nmlist(), Datatype)
+    assert key_touched != key
+    # !! LMAPHASH: the key follows the content, not the stamp
+    key_hash = CMF_MAPCACHE_KEY(_cm(tmp_path, files, True), _nmlist(), Datatype)
+    os.utime(files["CRIVLEN"], ns=(st.st_atime_ns, st.st_mtime_ns + 2 * 10 ** 9))
+    assert CMF_MAPCACHE_KEY(_cm(tmp_path, files, True), _nmlist(), Datatype) == key_hash
+    with open(files["CRIVLEN"], "r+b") as f:
+        f.write(b"X")
+    assert CMF_MAPCACHE_KEY(_cm(tmp_path, files, True), _nmlist(), Datatype) != key_hash
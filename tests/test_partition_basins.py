@@ -0,0 +1,49 @@
+"""
+partition_basins_torch (CALC_REGION): every grid in exactly one region, whole basins per region, bifurcation-linked
+basins together, and REGIONGRID equal to the grid count of each region.
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+
+from cmf_topology_utils import partition_basins_torch
+from cmf_synthetic import synthetic_nextxy
+
+IMIS = -9999
+
+
+def _mouth(nextx, nexty, ix, iy):
+    while nextx[ix, iy] > 0:
+        ix, iy = nextx[ix, iy] - 1, nexty[ix, iy] - 1
+    return ix, iy
+
+
+@pytest.mark.parametrize("regionall", [1, 3, 8])
+@pytest.mark.parametrize("npath", [0, 6])
+def test_partition_keeps_basins_whole(regionall, npath):
+    nx, ny = 40, 31
+    nextx, nexty = synthetic_nextxy(nx, ny, seed=regionall)
+    valid = nextx != IMIS
+    rng = np.random.default_rng(npath)
+    land = np.argwhere(valid)
+    pth = [[int(a[0]) + 1, int(a[1]) + 1, int(b[0]) + 1, int(b[1]) + 1]
+           for a, b in zip(land[rng.integers(len(land), size=npath)], land[rng.integers(len(land), size=npath)])]
+
+    region, regiongrid = partition_basins_torch(torch.from_numpy(nextx), torch.from_numpy(nexty), IMIS, regionall,
+                                                pth or None)
+    region = region.numpy()
+
+    # ! every valid grid in exactly one region, the rest IMIS
+    assert np.all((region[valid] >= 1) & (region[valid] <= regionall))
+    assert np.all(region[~valid] == IMIS)
+    # ! REGIONGRID is the grid count of each region
+    assert regiongrid.tolist() == np.bincount(region[valid] - 1, minlength=regionall).tolist()
+    # ! a grid and its river mouth share a region: basins are not split
+    for ix, iy in land:
+        assert region[ix, iy] == region[_mouth(nextx, nexty, ix, iy)]
+    # ! both ends of a bifurcation channel share a region
+    for ix, iy, jx, jy in pth:
+        assert region[ix - 1, iy - 1] == region[jx - 1, jy - 1]
+    if regionall > 1 and npath == 0:
+        assert len(np.unique(region[valid])) > 1
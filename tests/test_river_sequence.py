@@ -0,0 +1,51 @@
+"""
+river_sequence_levels_torch (level-synchronous CALC_1D_SEQ) against the former serial registration loop,
+on synthetic next-xy maps with several basins, confluences and ocean cells.
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+
+from cmf_topology_utils import river_sequence_levels_torch
+from cmf_synthetic import synthetic_nextxy
+
+
+def _serial_1d_seq(nextx, nexty, mask):
+    """
+    The former CALC_1D_SEQ loop (0-based): count upstream, register the upmost grids IY-stable, then
+    register a downstream grid as soon as its last upstream has been visited, layer by layer.
+    """
+    nx, ny = mask.shape
+    nupst = np.zeros((nx, ny), dtype=np.int64)
+    upnow = np.zeros((nx, ny), dtype=np.int64)
+    cells = [(ix, iy) for iy in range(ny) for ix in range(nx) if mask[ix, iy]]
+    for ix, iy in cells:
+        nupst[nextx[ix, iy] - 1, nexty[ix, iy] - 1] += 1
+    seq = [(ix, iy) for ix, iy in cells if nupst[ix, iy] == 0]
+    lev = [0, len(seq)]
+    iseq1, iseq2 = 0, len(seq)
+    while iseq2 > iseq1:
+        for ix, iy in seq[iseq1:iseq2]:
+            jx, jy = nextx[ix, iy] - 1, nexty[ix, iy] - 1
+            upnow[jx, jy] += 1
+            if upnow[jx, jy] == nupst[jx, jy] and nextx[jx, jy] > 0:
+                seq.append((jx, jy))
+        iseq1, iseq2 = iseq2, len(seq)
+        if iseq2 > iseq1:
+            lev.append(iseq2)
+    return seq, lev, nupst
+
+
+@pytest.mark.parametrize("nx, ny, seed", [(12, 9, 0), (40, 31, 1), (64, 64, 2)])
+def test_river_sequence_levels_matches_serial(nx, ny, seed):
+    nextx, nexty = synthetic_nextxy(nx, ny, seed)
+    mask = nextx > 0
+    seq, lev, nupst = _serial_1d_seq(nextx, nexty, mask)
+
+    ix0, iy0, lev_t, nupst_t = river_sequence_levels_torch(torch.from_numpy(nextx), torch.from_numpy(nexty),
+                                                           torch.from_numpy(mask))
+
+    assert list(zip(ix0.tolist(), iy0.tolist())) == seq
+    assert lev_t.tolist() == lev
+    assert np.array_equal(nupst_t.numpy(), nupst)
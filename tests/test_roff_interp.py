@@ -0,0 +1,82 @@
+"""
+ROFF_INTERP through the CSR input-matrix operator (CMF_INPMAT_INIT_CSR) against the former dense INPMAT loop, on a
+small random INPX/INPY/INPA table with empty slots, out-of-range and zero-weight entries, and RMIS input cells.
+"""
+from types import SimpleNamespace
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+
+from fortran_tensor_1D import Ftensor_1D
+from fortran_tensor_2D import Ftensor_2D
+from fortran_tensor_3D import Ftensor_3D
+from parkind1 import Parkind1
+from cmf_utils_mod import CMF_UTILS_MOD
+from cmf_ctrl_forcing_mod import CMF_FORCING_NMLIST_MOD
+
+NX, NY, NXIN, NYIN, INPN = 6, 5, 9, 7, 4
+RMIS = 1.0e20
+
+
+def _inpmat(rng):
+    inpx = rng.integers(1, NXIN + 1, size=(NX, NY, INPN)).astype(np.int32)
+    inpy = rng.integers(1, NYIN + 1, size=(NX, NY, INPN)).astype(np.int32)
+    inpa = (1.0e6 * rng.random((NX, NY, INPN))).astype(np.float32)
+    slot = rng.random((NX, NY, INPN))
+    inpx[slot < 0.2] = 0                                            # !! empty slot
+    inpx[(slot >= 0.2) & (slot < 0.25)] = NXIN + 1                  # !! outside the input grid
+    inpy[(slot >= 0.25) & (slot < 0.3)] = NYIN + 2
+    inpa[(slot >= 0.3) & (slot < 0.4)] = 0.0                        # !! zero weight
+    return inpx, inpy, inpa
+
+
+def _dense_inpmat_loop(inpx, inpy, inpa, field, drofunit):
+    """
+    The former ROFF_INTERP: for every cell and slot, add PBUFFIN*INPA/DROFUNIT of the valid, non-missing input cell.
+    """
+    out = np.zeros((NX, NY))
+    for ix in range(NX):
+        for iy in range(NY):
+            for inpi in range(INPN):
+                ixin, iyin = int(inpx[ix, iy, inpi]), int(inpy[ix, iy, inpi])
+                if ixin > 0 and ixin <= NXIN and iyin <= NYIN:
+                    if field[ixin - 1, iyin - 1] != RMIS:
+                        out[ix, iy] += field[ixin - 1, iyin - 1] * float(inpa[ix, iy, inpi]) / drofunit
+    return out
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_roff_interp_csr_matches_dense_loop(seed, tmp_path):
+    Datatype = Parkind1()
+    rng = np.random.default_rng(seed)
+    inpx, inpy, inpa = _inpmat(rng)
+    cinpmat = tmp_path / "inpmat.bin"
+    with open(cinpmat, "wb") as f:
+        f.write(np.concatenate([inpx.transpose(2, 1, 0), inpy.transpose(2, 1, 0)]).tobytes())
+        f.write(inpa.transpose(2, 1, 0).tobytes())
+
+    CC_NMLIST = SimpleNamespace(NX=NX, NY=NY, NXIN=NXIN, NYIN=NYIN, INPN=INPN, RMIS=RMIS, DMIS=RMIS, LLEAPYR=True,
+                                LROSPLIT=False, LWEVAP=False)
+    ix, iy = np.meshgrid(np.arange(1, NX + 1), np.arange(1, NY + 1), indexing="ij")
+    nseq = NX * NY
+    CM = SimpleNamespace(NSEQALL=nseq, NSEQMAX=nseq,
+                         I1SEQX=Ftensor_1D(torch.as_tensor(ix.ravel(), dtype=torch.int32), start_index=1),
+                         I1SEQY=Ftensor_1D(torch.as_tensor(iy.ravel(), dtype=torch.int32), start_index=1))
+    config = {"RDIR": str(tmp_path) + "/", "LOGOUT": "log.txt", "device": "cpu"}
+    FRC = CMF_FORCING_NMLIST_MOD(config, Datatype, CC_NMLIST)
+    FRC.LINTERP, FRC.CINPMAT = True, str(cinpmat)
+    FRC.CMF_FORCING_INIT(CC_NMLIST, None, CMF_UTILS_MOD(Datatype, CC_NMLIST, CM),
+                         config["RDIR"] + config["LOGOUT"], CM, Datatype)
+
+    field = 100.0 * rng.random((NXIN, NYIN))
+    field[rng.random((NXIN, NYIN)) < 0.2] = RMIS                    # !! missing input cells
+    PBUFF = torch.zeros((NXIN, NYIN, 2), dtype=Datatype.JPRB)
+    PBUFF[:, :, 0] = torch.as_tensor(field)
+    CC_VAR = SimpleNamespace(D2RUNOFF=Ftensor_2D(torch.zeros((nseq, 1), dtype=Datatype.JPRB)),
+                             D2ROFSUB=Ftensor_2D(torch.zeros((nseq, 1), dtype=Datatype.JPRB)))
+    FRC.CMF_FORCING_PUT(CC_NMLIST, CM, Ftensor_3D(PBUFF), config, Datatype, CC_VAR)
+
+    ref = _dense_inpmat_loop(inpx, inpy, inpa, field, float(FRC.DROFUNIT))[ix.ravel() - 1, iy.ravel() - 1]
+    assert (ref > 0.0).sum() > nseq // 2
+    assert np.allclose(CC_VAR.D2RUNOFF.raw()[:, 0].numpy(), ref, rtol=1e-12, atol=0.0)
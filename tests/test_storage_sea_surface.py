@@ -0,0 +1,81 @@
+"""
+Layer-vectorised STORAGE_SEA_SURFACE (CMF_PROG_INIT) against the former per-grid loop, on a river
+sequence built by river_sequence_levels_torch from synthetic next-xy maps.
+"""
+from types import SimpleNamespace
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+
+from fortran_tensor_1D import Ftensor_1D
+from fortran_tensor_2D import Ftensor_2D
+from parkind1 import Parkind1
+from cmf_ctrl_vars_mod import CMF_CTRL_VARS_MOD
+from cmf_topology_utils import river_sequence_levels_torch
+from cmf_synthetic import _col, synthetic_nextxy, synthetic_nmlist
+
+
+def _sequence_map(nx, ny, seed):
+    """
+    CM_NMLIST-like map in CALC_1D_SEQ order: river grids by layer (I1SEQLEV), then the river mouths.
+    Beds lie around sea level, so part of the channels start below the downstream water surface.
+    """
+    nextx, nexty = synthetic_nextxy(nx, ny, seed)
+    ix0, iy0, lev, _ = river_sequence_levels_torch(torch.from_numpy(nextx), torch.from_numpy(nexty),
+                                                   torch.from_numpy(nextx > 0))
+    mouth = [(ix, iy) for iy in range(ny) for ix in range(nx) if nextx[ix, iy] == -9]
+    seq = list(zip(ix0.tolist(), iy0.tolist())) + mouth
+    vector = {cell: iseq + 1 for iseq, cell in enumerate(seq)}
+    nriv, nseq = int(ix0.numel()), len(seq)
+    nxt = [vector[(nextx[ix, iy] - 1, nexty[ix, iy] - 1)] for ix, iy in seq[:nriv]]
+
+    rng = np.random.default_rng(seed)
+    rivlen = 2000.0 + 3000.0 * rng.random(nseq)
+    rivwth = 20.0 + 80.0 * rng.random(nseq)
+    rivhgt = 1.0 + 4.0 * rng.random(nseq)
+    rivelv = rng.uniform(-4.0, 3.0, nseq)
+    return SimpleNamespace(
+        NSEQALL=nseq, NSEQRIV=nriv, NSEQMAX=nseq, NPTHOUT=0, NPTHLEV=1, I1SEQLEV=lev,
+        I1NEXT=Ftensor_1D(torch.as_tensor(nxt, dtype=torch.int32), start_index=1),
+        D2RIVELV=_col(rivelv), D2RIVHGT=_col(rivhgt), D2RIVLEN=_col(rivlen), D2RIVWTH=_col(rivwth),
+        D2RIVSTOMAX=_col(rivlen * rivwth * rivhgt), D2DWNELV=_col(rivelv + rng.uniform(0.0, 6.0, nseq)),
+    )
+
+
+def _serial_river_grids(CM, VARS, Datatype):
+    """
+    The former per-grid loop over the river grids, downstream to upstream, on fresh Ftensor_2D arrays;
+    the river-mouth depths are taken from VARS.
+    """
+    nriv = CM.NSEQRIV
+    RIVDPH_PRE = Ftensor_2D(VARS.D2RIVDPH_PRE.raw().clone(), start_row=1, start_col=1)
+    RIVDPH_PRE.raw()[:nriv] = 0.0
+    DDPH = Ftensor_2D(torch.zeros_like(VARS.DDPH.raw()), start_row=1, start_col=1)
+    P2RIVSTO = Ftensor_2D(torch.zeros_like(VARS.P2RIVSTO.raw()), start_row=1, start_col=1)
+    for IESQ_ in reversed(range(nriv)):
+        IESQ = IESQ_ + 1
+        JSEQ = CM.I1NEXT[IESQ]
+        DSEAELV = CM.D2RIVELV[JSEQ, 1] + RIVDPH_PRE[JSEQ, 1]
+        DDPH[IESQ, 1] = torch.maximum(DSEAELV - CM.D2RIVELV[IESQ, 1], torch.tensor(0, dtype=Datatype.JPRB))
+        DDPH[IESQ, 1] = torch.minimum(DDPH[IESQ, 1], CM.D2RIVHGT[IESQ, 1])
+        P2RIVSTO[IESQ, 1] = (DDPH[IESQ, 1] * CM.D2RIVLEN[IESQ, 1] * CM.D2RIVWTH[IESQ, 1])
+        P2RIVSTO[IESQ, 1] = torch.minimum(P2RIVSTO[IESQ, 1], CM.D2RIVSTOMAX[IESQ, 1] * torch.tensor(1, dtype=Datatype.JPRD))
+        RIVDPH_PRE[IESQ, 1] = DDPH[IESQ, 1]
+    return P2RIVSTO, DDPH, RIVDPH_PRE
+
+
+@pytest.mark.parametrize("nx, ny, seed", [(12, 9, 0), (48, 40, 1)])
+def test_storage_sea_surface_matches_serial(nx, ny, seed, tmp_path):
+    Datatype = Parkind1()
+    CM = _sequence_map(nx, ny, seed)
+    VARS = CMF_CTRL_VARS_MOD(Datatype.JPRB, Datatype.JPRD)
+    VARS.CMF_PROG_INIT(CM, synthetic_nmlist(LDAMOUT=False, LLEVEE=False), str(tmp_path / "log.txt"), "cpu", Datatype)
+
+    P2RIVSTO, DDPH, RIVDPH_PRE = _serial_river_grids(CM, VARS, Datatype)
+
+    nriv = CM.NSEQRIV
+    assert CM.I1SEQLEV.numel() > 3 and bool((DDPH.raw()[:nriv] > 0.0).any()), "no layered or submerged river grids"
+    assert torch.equal(VARS.P2RIVSTO.raw()[:nriv], P2RIVSTO.raw()[:nriv])
+    assert torch.equal(VARS.DDPH.raw()[:nriv], DDPH.raw()[:nriv])
+    assert torch.equal(VARS.D2RIVDPH_PRE.raw(), RIVDPH_PRE.raw())
@@ -0,0 +1,73 @@
+"""
+LACTIVE (per-cell active set in the fused CPU substep) gives the same state, bit for bit, as the full pass:
+dry basins that start to receive runoff, and a long basin wetted at a single cell, whose dry headwaters are
+skipped while the reach downstream of the wet cell is computed.
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+pytest.importorskip("numba")
+
+from parkind1 import Parkind1
+from cmf_calc_substep_cpu import CMF_CALC_SUBSTEP_CPU, _GLB_NAMES
+from cmf_synthetic import STATE_FIELDS, synthetic_map, synthetic_nmlist, synthetic_state
+
+NSTEP, WAKE = 10, 5            # !! substeps; basin 1 gets runoff before substep WAKE
+
+
+def _run(CM, CC_VARS, lactive, nchunk, wake=None):
+    Datatype = Parkind1()
+    CC_NMLIST = synthetic_nmlist(LACTIVE=lactive, NCPUCHUNK=nchunk, LPTHOUT=CM.NPTHOUT > 0)
+    glb, skip = [], []
+    for it in range(NSTEP):
+        if it == WAKE and wake is not None:
+            CC_VARS.D2RUNOFF.raw()[torch.as_tensor(wake), 0] = 2.0
+        CC_VARS = CMF_CALC_SUBSTEP_CPU(CC_NMLIST, CM, CC_VARS, "cpu", Datatype)
+        glb.append([float(getattr(CC_VARS, name)) for name in _GLB_NAMES])
+        if lactive:
+            skip.append(CC_NMLIST._SUBSTEP_CPU_CACHE["active"]["skip"].copy())
+    state = {name: getattr(CC_VARS, name).raw().clone() for name in STATE_FIELDS if name != "D2STGREF"}
+    state["D2DWNELV"] = CM.D2DWNELV.raw().clone()
+    if CM.NPTHOUT > 0:
+        state["D1PTHFLW"] = CC_VARS.D1PTHFLW.raw().clone()
+    return state, glb, skip
+
+
+def _compare(full, glb_full, active, glb_active):
+    for name in full:
+        assert torch.equal(full[name], active[name]), name
+    assert glb_full == glb_active
+
+
+@pytest.mark.parametrize("nchunk", [1, 3])
+def test_lactive_matches_full_pass(nchunk):
+    results = []
+    for lactive in (False, True):
+        CM = synthetic_map()
+        CC_VARS, basin = synthetic_state(CM, WET=(0, 2, 3))
+        results.append(_run(CM, CC_VARS, lactive, nchunk, wake=basin == 1))
+    (full, glb_full, _), (active, glb_active, skip) = results
+    assert sum(int(s.sum()) for s in skip) > 0                  # !! dry cells were skipped
+    _compare(full, glb_full, active, glb_active)
+
+
+@pytest.mark.parametrize("npath", [0, 4])
+def test_lactive_skips_dry_cells_of_a_wet_basin(npath):
+    results = []
+    for lactive in (False, True):
+        CM = synthetic_map(NBASIN=2, NCELL=40, NPATH=npath)
+        CC_VARS, basin = synthetic_state(CM)
+        CC_VARS.D2RUNOFF.raw()[20, 0] = 3.0                     # !! one wet cell in the middle of basin 0
+        results.append(_run(CM, CC_VARS, lactive, 1))
+    (full, glb_full, _), (active, glb_active, skip) = results
+
+    nxt = CM.I1NEXT.raw().numpy() - 1
+    downstream, i = [], 20
+    while i < CM.NSEQRIV:
+        i = int(nxt[i])
+        downstream.append(i)
+    assert not skip[-1][[20] + downstream].any()                # !! the wet cell and its reach are computed
+    assert skip[-1][np.asarray(basin) == 0].any()               # !! dry headwaters of the same basin are not
+    assert float(full["P2RIVSTO"][downstream[0], 0]) > 0.0
+    _compare(full, glb_full, active, glb_active)
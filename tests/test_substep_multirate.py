@@ -0,0 +1,82 @@
+"""
+LMULTIRATE (CMF_CALC_SUBSTEP_CPU_MULTIRATE): every basin group takes the NT = 2**k of its own CALC_ADPSTP limit,
+and the global storage budget closes over the outer step as in the single-rate fused substep at the global NT.
+"""
+import math
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+pytest.importorskip("numba")
+
+from parkind1 import Parkind1
+from cmf_calc_substep_cpu import CMF_CALC_SUBSTEP_CPU, CMF_CALC_SUBSTEP_CPU_MULTIRATE
+from cmf_synthetic import synthetic_map, synthetic_nmlist, synthetic_state
+
+DT_DEF, NSTEP = 1200.0, 3
+
+
+def _nt_basin(CM, CC_NMLIST, CC_VARS, basin):
+    """
+    CALC_ADPSTP NT of every basin, rounded up to a power of two
+    """
+    nriv = CM.NSEQRIV
+    rivdph = CC_VARS.D2RIVDPH.raw()[:, 0].numpy()
+    nxtdst = CM.D2NXTDST.raw()[:, 0].numpy()
+    nt = {}
+    for b in np.unique(basin).tolist():
+        dtmin = math.inf
+        for i in np.nonzero(basin == b)[0].tolist():
+            ddst = nxtdst[i] if i < nriv else CC_NMLIST.PDSTMTH
+            dtmin = min(dtmin, CC_NMLIST.PCADP * ddst * (CC_NMLIST.PGRV * max(rivdph[i], 0.01)) ** (-0.5))
+        nt[b] = 1 << math.ceil(math.log2(int(DT_DEF / dtmin - 0.01) + 1))
+    return nt
+
+
+def _budget(CM, CC_VARS, sto0, nstep):
+    """
+    storage change + water leaving through the river mouths - runoff added, relative to the storage
+    """
+    nriv, nseq = CM.NSEQRIV, CM.NSEQALL
+    sto = float((CC_VARS.P2RIVSTO.raw()[:nseq] + CC_VARS.P2FLDSTO.raw()[:nseq]).sum())
+    out = float(CC_VARS.D2OUTFLW_aAVG.raw()[nriv:nseq].sum())
+    rof = float(CC_VARS.D2RUNOFF.raw()[:nseq].sum()) * DT_DEF * nstep
+    return (sto - sto0 + out - rof) / sto0, out
+
+
+def test_multirate_nt_per_basin_and_budget():
+    Datatype = Parkind1()
+
+    CM = synthetic_map()
+    CC_VARS, basin = synthetic_state(CM, WET=(0, 2, 3))
+    CC_NMLIST = synthetic_nmlist()
+    sto0 = float((CC_VARS.P2RIVSTO.raw() + CC_VARS.P2FLDSTO.raw()).sum())
+    ntmax_single = 1
+    for step in range(NSTEP):
+        nt = _nt_basin(CM, CC_NMLIST, CC_VARS, basin)
+        expected = {}
+        for b, ntb in nt.items():
+            expected[ntb] = expected.get(ntb, 0) + int((basin == b).sum())
+        CC_VARS, ntmax, ncell_class = CMF_CALC_SUBSTEP_CPU_MULTIRATE(CC_NMLIST, CM, CC_VARS, "cpu", Datatype, DT_DEF)
+        assert ncell_class == expected, step
+        assert ntmax == max(nt.values())
+        ntmax_single = max(ntmax_single, ntmax)
+        # !! outer-step P0GLB terms close like a single substep (CALC_WATBAL)
+        err = (float(CC_VARS.P0GLBSTOPRE) - float(CC_VARS.P0GLBSTONXT)
+               + float(CC_VARS.P0GLBRIVINF) - float(CC_VARS.P0GLBRIVOUT))
+        assert abs(err) <= 1e-10 * float(CC_VARS.P0GLBSTOPRE), step
+    assert len(ncell_class) > 1                                     # !! several rate classes
+    assert CC_VARS.NADD_adp == DT_DEF * NSTEP
+    err_multi, out_multi = _budget(CM, CC_VARS, sto0, NSTEP)
+
+    # !! single rate: every cell at the largest NT of the run
+    CM = synthetic_map()
+    CC_VARS, _ = synthetic_state(CM, WET=(0, 2, 3))
+    CC_NMLIST = synthetic_nmlist(DT=DT_DEF / ntmax_single)
+    for _ in range(NSTEP * ntmax_single):
+        CC_VARS = CMF_CALC_SUBSTEP_CPU(CC_NMLIST, CM, CC_VARS, "cpu", Datatype)
+    err_single, out_single = _budget(CM, CC_VARS, sto0, NSTEP)
+
+    assert out_multi > 0.0 and out_single > 0.0
+    assert abs(err_multi) <= 1e-10
+    assert abs(err_single) <= 1e-10
@@ -0,0 +1,72 @@
+"""
+Staged substep of the default path (OUTFLW -> PTHOUT -> INFLOW -> VARS_PRE -> STONXT -> FLDSTG -> AVEMAX,
+as in CMF_PHYSICS_ADVANCE with LCPUFUSED=False) against the fused CPU substep, with and without bifurcations.
+"""
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("numba")
+
+from parkind1 import Parkind1
+from cmf_calc_outflw_mod import CMF_CALC_OUTFLW, CMF_CALC_INFLOW
+from cmf_calc_pthout_mod import CMF_CALC_PTHOUT
+from cmf_calc_stonxt_mod import CMF_CALC_STONXT
+from cmf_calc_fldstg_cpu import CMF_CALC_FLDSTG_CPU
+from cmf_calc_diag_mod import CMF_DIAG_AVEMAX_ADPSTP
+from cmf_calc_substep_cpu import CMF_CALC_SUBSTEP_CPU, _GLB_NAMES
+from cmf_synthetic import STATE_FIELDS, synthetic_map, synthetic_nmlist, synthetic_state
+
+NSTEP = 6
+
+
+def _vars_pre(CC_NMLIST, CC_VARS):
+    """
+    CALC_VARS_PRE of CMF_PHYSICS_ADVANCE
+    """
+    CC_VARS.D2RIVOUT_PRE.raw().copy_(CC_VARS.D2RIVOUT.raw())
+    CC_VARS.D2RIVDPH_PRE.raw().copy_(CC_VARS.D2RIVDPH.raw())
+    CC_VARS.D2FLDOUT_PRE.raw().copy_(CC_VARS.D2FLDOUT.raw())
+    CC_VARS.D2FLDSTO_PRE.raw().copy_(CC_VARS.P2FLDSTO.raw())
+    if CC_NMLIST.LPTHOUT:
+        CC_VARS.D1PTHFLW_PRE.raw().copy_(CC_VARS.D1PTHFLW.raw())
+    return CC_VARS
+
+
+def _staged(CC_NMLIST, CM, CC_VARS, Datatype):
+    CC_VARS = CMF_CALC_OUTFLW(CC_NMLIST, CM, CC_VARS, "cpu", Datatype)
+    if CC_NMLIST.LPTHOUT:
+        CC_VARS = CMF_CALC_PTHOUT(CC_NMLIST, CM, CC_VARS, "cpu", Datatype)
+    CC_VARS = CMF_CALC_INFLOW(CC_NMLIST, CM, CC_VARS, "cpu", Datatype)
+    CC_VARS = _vars_pre(CC_NMLIST, CC_VARS)
+    CC_VARS = CMF_CALC_STONXT(CC_NMLIST, CM, CC_VARS, "cpu", Datatype)
+    CM, CC_VARS = CMF_CALC_FLDSTG_CPU(CM, CC_NMLIST, CC_VARS, "cpu", Datatype)
+    return CMF_DIAG_AVEMAX_ADPSTP(CC_NMLIST, CC_VARS, CM, "cpu")
+
+
+def _fused(CC_NMLIST, CM, CC_VARS, Datatype):
+    return CMF_CALC_SUBSTEP_CPU(CC_NMLIST, CM, CC_VARS, "cpu", Datatype)
+
+
+def _run(step, npath):
+    Datatype = Parkind1()
+    CM = synthetic_map(NPATH=npath)
+    CC_VARS, _ = synthetic_state(CM, WET=range(CM.NSEQALL - CM.NSEQRIV))
+    CC_NMLIST = synthetic_nmlist(LPTHOUT=npath > 0)
+    glb = []
+    for _ in range(NSTEP):
+        CC_VARS = step(CC_NMLIST, CM, CC_VARS, Datatype)
+        glb.append([float(getattr(CC_VARS, name)) for name in _GLB_NAMES])
+    state = {name: getattr(CC_VARS, name).raw() for name in STATE_FIELDS if name != "D2STGREF"}
+    state.update(D1PTHFLW=CC_VARS.D1PTHFLW.raw(), D1PTHFLW_aAVG=CC_VARS.D1PTHFLW_aAVG.raw(),
+                 D2DWNELV=CM.D2DWNELV.raw(), NADD_adp=torch.tensor(CC_VARS.NADD_adp))
+    return state, torch.tensor(glb, dtype=torch.float64)
+
+
+@pytest.mark.parametrize("npath", [0, 4])
+def test_staged_substep_matches_fused(npath):
+    staged, glb_staged = _run(_staged, npath)
+    fused, glb_fused = _run(_fused, npath)
+    for name in staged:
+        assert torch.allclose(staged[name].to(torch.float64), fused[name].to(torch.float64),
+                              rtol=1e-9, atol=1e-9), name
+    assert torch.allclose(glb_staged, glb_fused, rtol=1e-9, atol=1e-9)